@@ -13,6 +13,8 @@
 
 from gbpservice.network.neutronv2 import client
 
+DEFAULT_PAGE_SIZE = 500
+
 
 class API(object):
     """API for interacting with the neutron 2.x API."""
@@ -23,6 +25,16 @@ class API(object):
         obj_creator = getattr(neutron, action)
         return obj_creator(attrs)[resource]
 
+    def _create_resources(self, context, resource, attrs_list):
+        """Create several resources with a single bulk POST."""
+        if not attrs_list:
+            return []
+        resources = resource + 's'
+        action = 'create_' + resource
+        neutron = client.get_client(context)
+        obj_creator = getattr(neutron, action)
+        return obj_creator({resources: attrs_list})[resources]
+
     def _show_resource(self, context, resource, resource_id):
         action = 'show_' + resource
         neutron = client.get_client(context)
@@ -36,6 +48,23 @@ class API(object):
         obj_lister = getattr(neutron, action)
         return obj_lister(**filters)[resources]
 
+    def _iter_resources(self, context, resource, filters={},
+                        page_size=DEFAULT_PAGE_SIZE):
+        """Yield the resources page by page.
+
+        The neutron client follows the pagination links (marker and limit)
+        of the server, which returns everything in one page when pagination
+        is disabled.
+        """
+        resources = resource + 's'
+        action = 'list_' + resources
+        neutron = client.get_client(context)
+        obj_lister = getattr(neutron, action)
+        for page in obj_lister(retrieve_all=False, limit=page_size,
+                               **filters):
+            if page[resources]:
+                yield page[resources]
+
     def _update_resource(self, context, resource, resource_id, attrs):
         action = 'update_' + resource
         neutron = client.get_client(context)
@@ -57,6 +86,9 @@ class API(object):
     def list_networks(self, context, filters={}):
         return self._list_resources(context, 'network', filters)
 
+    def iter_networks(self, context, filters={}, page_size=DEFAULT_PAGE_SIZE):
+        return self._iter_resources(context, 'network', filters, page_size)
+
     def update_network(self, context, net_id, network):
         return self._update_resource(context, 'network', net_id, network)
 
@@ -66,12 +98,18 @@ class API(object):
     def create_subnet(self, context, subnet):
         return self._create_resource(context, 'subnet', subnet)
 
+    def create_subnets(self, context, subnets):
+        return self._create_resources(context, 'subnet', subnets)
+
     def show_subnet(self, context, subnet_id):
         return self._show_resource(context, 'subnet', subnet_id)
 
     def list_subnets(self, context, filters={}):
         return self._list_resources(context, 'subnet', filters)
 
+    def iter_subnets(self, context, filters={}, page_size=DEFAULT_PAGE_SIZE):
+        return self._iter_resources(context, 'subnet', filters, page_size)
+
     def update_subnet(self, context, subnet_id, subnet):
         return self._update_resource(context, 'subnet', subnet_id, subnet)
 
@@ -81,12 +119,18 @@ class API(object):
     def create_port(self, context, port):
         return self._create_resource(context, 'port', port)
 
+    def create_ports(self, context, ports):
+        return self._create_resources(context, 'port', ports)
+
     def show_port(self, context, port_id):
         return self._show_resource(context, 'port', port_id)
 
     def list_ports(self, context, filters={}):
         return self._list_resources(context, 'port', filters)
 
+    def iter_ports(self, context, filters={}, page_size=DEFAULT_PAGE_SIZE):
+        return self._iter_resources(context, 'port', filters, page_size)
+
     def update_port(self, context, port_id, port):
         return self._update_resource(context, 'port', port_id, port)
 
@@ -102,6 +146,11 @@ class API(object):
     def list_security_groups(self, context, filters={}):
         return self._list_resources(context, 'security_group', filters)
 
+    def iter_security_groups(self, context, filters={},
+                             page_size=DEFAULT_PAGE_SIZE):
+        return self._iter_resources(context, 'security_group', filters,
+                                    page_size)
+
     def update_security_group(self, context, sg_id, sg):
         return self._update_resource(context, 'security_group', sg_id, sg)
 
@@ -111,12 +160,20 @@ class API(object):
     def create_security_group_rule(self, context, rule):
         return self._create_resource(context, 'security_group_rule', rule)
 
+    def create_security_group_rules(self, context, rules):
+        return self._create_resources(context, 'security_group_rule', rules)
+
     def show_security_group_rule(self, context, rule_id):
         return self._show_resource(context, 'security_group_rule', rule_id)
 
     def list_security_group_rules(self, context, filters={}):
         return self._list_resources(context, 'security_group_rule', filters)
 
+    def iter_security_group_rules(self, context, filters={},
+                                  page_size=DEFAULT_PAGE_SIZE):
+        return self._iter_resources(context, 'security_group_rule', filters,
+                                    page_size)
+
     # REVISIT(yi): update_security_group_rule not supported in neutron yet
     # def update_security_group_rule(self, context, rule_id, rule):
     #     return self._update_resource(context,
@@ -136,6 +193,9 @@ class API(object):
     def list_routers(self, context, filters={}):
         return self._list_resources(context, 'router', filters)
 
+    def iter_routers(self, context, filters={}, page_size=DEFAULT_PAGE_SIZE):
+        return self._iter_resources(context, 'router', filters, page_size)
+
     def update_router(self, context, router_id, router):
         return self._update_resource(context, 'router', router_id, router)
 
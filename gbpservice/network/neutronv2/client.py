@@ -11,6 +11,8 @@
 #    under the License.
 #
 
+import time
+
 from neutronclient.common import exceptions as neutron_client_exc
 from neutronclient.v2_0 import client as clientv20
 from oslo_concurrency import lockutils
@@ -60,11 +62,18 @@ neutron_opts = [
     cfg.StrOpt('ca_certificates_file',
                help='Location of CA certificates file to use for '
                     'neutron client requests.'),
+    cfg.IntOpt('client_cache_ttl',
+               default=300,
+               help='Number of seconds a neutron client is reused for the '
+                    'same token. Set to 0 to create a new client for every '
+                    'call'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(neutron_opts, 'neutron')
 
+CLIENT_CACHE_SIZE = 256
+
 
 class AdminTokenStore(object):
 
@@ -80,6 +89,35 @@ class AdminTokenStore(object):
         return cls._instance
 
 
+class ClientCache(object):
+    """Neutron clients by connection parameters, token included."""
+
+    _clients = {}
+
+    @classmethod
+    def get(cls, params, factory):
+        ttl = CONF.neutron.client_cache_ttl
+        if ttl <= 0:
+            return factory()
+        key = tuple(sorted(params.items()))
+        now = time.time()
+        entry = cls._clients.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+        client = factory()
+        if len(cls._clients) >= CLIENT_CACHE_SIZE:
+            cls._clients = dict((k, v) for k, v in cls._clients.items()
+                                if v[0] > now)
+            if len(cls._clients) >= CLIENT_CACHE_SIZE:
+                cls._clients = {}
+        cls._clients[key] = (now + ttl, client)
+        return client
+
+    @classmethod
+    def clear(cls):
+        cls._clients = {}
+
+
 def _get_client(token=None, admin=False):
     params = {
         'endpoint_url': CONF.neutron.neutron_server_url,
@@ -101,7 +139,11 @@ def _get_client(token=None, admin=False):
             params['tenant_name'] = CONF.neutron.admin_tenant_name
         params['password'] = CONF.neutron.admin_password
         params['auth_url'] = CONF.neutron.admin_auth_url
-    return clientv20.Client(**params)
+    if admin:
+        return ClientCache.get(
+            dict(params, admin=True),
+            lambda: ClientWrapper(clientv20.Client(**params)))
+    return ClientCache.get(params, lambda: clientv20.Client(**params))
 
 
 class ClientWrapper(clientv20.Client):
@@ -132,17 +174,20 @@ class ClientWrapper(clientv20.Client):
 
 
 def _update_token(new_token):
+    token_store = AdminTokenStore.get()
+    # Only take the lock when the token was actually refreshed
+    if token_store.admin_auth_token == new_token:
+        return
     with lockutils.lock('neutron_admin_auth_token_lock'):
-        token_store = AdminTokenStore.get()
         token_store.admin_auth_token = new_token
 
 
 def get_client(context, admin=False):
     if admin or (context.is_admin and not context.auth_token):
-        with lockutils.lock('neutron_admin_auth_token_lock'):
-            orig_token = AdminTokenStore.get().admin_auth_token
-        client = _get_client(orig_token, admin=True)
-        return ClientWrapper(client)
+        # A new admin token gives a new client, the cached ones are reused
+        # as long as the token doesn't change
+        orig_token = AdminTokenStore.get().admin_auth_token
+        return _get_client(orig_token, admin=True)
 
     # We got a user token that we can use as-is
     if context.auth_token:
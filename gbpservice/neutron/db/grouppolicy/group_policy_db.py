@@ -59,7 +59,7 @@ class PolicyTarget(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
     policy_target_group_id = sa.Column(sa.String(36),
                                        sa.ForeignKey(
                                            'gp_policy_target_groups.id'),
-                                       nullable=True)
+                                       nullable=True, index=True)
 
 
 class PTGToPRSProvidingAssociation(model_base.BASEV2):
@@ -101,7 +101,7 @@ class PolicyTargetGroup(model_base.BASEV2, models_v2.HasId,
                                       backref='policy_target_group')
     l2_policy_id = sa.Column(sa.String(36),
                              sa.ForeignKey('gp_l2_policies.id'),
-                             nullable=True)
+                             nullable=True, index=True)
     network_service_policy_id = sa.Column(
         sa.String(36), sa.ForeignKey('gp_network_service_policies.id'),
         nullable=True)
@@ -128,7 +128,7 @@ class L2Policy(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
                                             backref='l2_policy')
     l3_policy_id = sa.Column(sa.String(36),
                              sa.ForeignKey('gp_l3_policies.id'),
-                             nullable=True)
+                             nullable=True, index=True)
     shared = sa.Column(sa.Boolean)
 
 
@@ -150,6 +150,9 @@ class ESToL3PAssociation(model_base.BASEV2):
 class L3Policy(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
     """Represents a L3 Policy with a non-overlapping IP address space."""
     __tablename__ = 'gp_l3_policies'
+    __table_args__ = (
+        sa.Index('ix_gp_l3_policies_tenant_id_name', 'tenant_id', 'name'),
+    )
     type = sa.Column(sa.String(15))
     __mapper_args__ = {
         'polymorphic_on': type,
@@ -356,6 +359,9 @@ class EPToESAssociation(model_base.BASEV2):
 
 class ExternalSegment(model_base.BASEV2, BaseSharedGbpResource):
     __tablename__ = 'gp_external_segments'
+    __table_args__ = (
+        sa.Index('ix_gp_external_segments_name', 'name'),
+    )
     type = sa.Column(sa.String(15))
     __mapper_args__ = {
         'polymorphic_on': type,
@@ -0,0 +1,40 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""nvsd_sc_insertions
+"""
+
+# revision identifiers, used by Alembic.
+revision = '0a5443eed171'
+down_revision = '4452c32a4a25'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('nvsd_sc_instance_insertions',
+                    sa.Column('instance_id',
+                              sa.String(length=36),
+                              nullable=False),
+                    sa.Column('status',
+                              sa.String(length=16),
+                              nullable=False),
+                    sa.Column('status_details',
+                              sa.String(length=255),
+                              nullable=True),
+                    sa.PrimaryKeyConstraint('instance_id'))
+
+
+def downgrade():
+    op.drop_table('nvsd_sc_instance_insertions')
@@ -0,0 +1,35 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""sc_instance_ptg_indexes
+"""
+
+# revision identifiers, used by Alembic.
+revision = '18e6ab53a405'
+down_revision = 'd08627f64e37'
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index(op.f('ix_sc_instances_provider_ptg_id'), 'sc_instances',
+                    ['provider_ptg_id'], unique=False)
+    op.create_index(op.f('ix_sc_instances_consumer_ptg_id'), 'sc_instances',
+                    ['consumer_ptg_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_sc_instances_consumer_ptg_id'),
+                  table_name='sc_instances')
+    op.drop_index(op.f('ix_sc_instances_provider_ptg_id'),
+                  table_name='sc_instances')
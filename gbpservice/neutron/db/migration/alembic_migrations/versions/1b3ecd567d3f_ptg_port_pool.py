@@ -0,0 +1,40 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""ptg_port_pool
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1b3ecd567d3f'
+down_revision = '5a24894af57c'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'gpm_ptg_pooled_ports',
+        sa.Column('port_id', sa.String(length=36), nullable=False),
+        sa.Column('policy_target_group_id', sa.String(length=36),
+                  nullable=False),
+        sa.ForeignKeyConstraint(['port_id'], ['ports.id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('port_id')
+    )
+    op.create_index(op.f('ix_gpm_ptg_pooled_ports_policy_target_group_id'),
+                    'gpm_ptg_pooled_ports', ['policy_target_group_id'])
+
+
+def downgrade():
+    op.drop_table('gpm_ptg_pooled_ports')
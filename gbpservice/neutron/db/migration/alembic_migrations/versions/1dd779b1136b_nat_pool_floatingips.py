@@ -0,0 +1,45 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""nat_pool_floatingips
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1dd779b1136b'
+down_revision = '1b3ecd567d3f'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'gpm_nat_pool_floatingips',
+        sa.Column('tenant_id', sa.String(length=255), nullable=True),
+        sa.Column('floatingip_id', sa.String(length=36), nullable=False),
+        sa.Column('nat_pool_id', sa.String(length=36), nullable=False),
+        sa.Column('floating_ip_address', sa.String(length=64),
+                  nullable=False),
+        sa.Column('available', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(['floatingip_id'], ['floatingips.id'],
+                                ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['nat_pool_id'], ['gp_nat_pools.id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('floatingip_id')
+    )
+    op.create_index(op.f('ix_gpm_nat_pool_floatingips_nat_pool_id'),
+                    'gpm_nat_pool_floatingips', ['nat_pool_id'])
+
+
+def downgrade():
+    op.drop_table('gpm_nat_pool_floatingips')
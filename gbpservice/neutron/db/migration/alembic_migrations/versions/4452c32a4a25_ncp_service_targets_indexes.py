@@ -0,0 +1,33 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""ncp_service_targets_indexes
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4452c32a4a25'
+down_revision = '18e6ab53a405'
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index('ix_ncp_service_targets_instance_node_position',
+                    'ncp_service_targets',
+                    ['servicechain_instance_id', 'servicechain_node_id',
+                     'position'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ncp_service_targets_instance_node_position',
+                  table_name='ncp_service_targets')
@@ -0,0 +1,55 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""gbp_lookup_indexes
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5a24894af57c'
+down_revision = '0a5443eed171'
+
+import itertools
+
+from alembic import op
+from neutron.db import migration
+
+
+INDEXES = [
+    ('gp_policy_targets', ['policy_target_group_id']),
+    ('gp_policy_target_groups', ['l2_policy_id']),
+    ('gp_l2_policies', ['l3_policy_id']),
+    ('gp_l3_policies', ['tenant_id', 'name']),
+    ('gp_external_segments', ['name']),
+    ('gpm_ptgs_servicechain_mapping', ['provider_ptg_id']),
+    ('gpm_ptgs_servicechain_mapping', ['consumer_ptg_id']),
+]
+
+
+def _index_name(table, columns):
+    return op.f('ix_%s_%s' % (table, '_'.join(columns)))
+
+
+def upgrade():
+    for table, columns in INDEXES:
+        op.create_index(_index_name(table, columns), table, columns,
+                        unique=False)
+
+
+def downgrade():
+    # MySQL uses the indexes on the foreign key columns for the constraints
+    # and refuses to drop them, so the constraints are dropped meanwhile
+    for table, indexes in itertools.groupby(reversed(INDEXES),
+                                            lambda x: x[0]):
+        with migration.remove_fks_from_table(table):
+            for x, columns in indexes:
+                op.drop_index(_index_name(table, columns), table_name=table)
@@ -0,0 +1,64 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""gbp_default_mappings
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5d28643bb749'
+down_revision = '6257c37eb7c0'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'gpm_default_l3_policies',
+        sa.Column('tenant_id', sa.String(length=255), nullable=False),
+        sa.Column('l3_policy_id', sa.String(length=36), nullable=False),
+        sa.ForeignKeyConstraint(['l3_policy_id'], ['gp_l3_policies.id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('tenant_id'),
+        sa.UniqueConstraint('l3_policy_id')
+    )
+    op.create_table(
+        'gpm_default_external_segments',
+        sa.Column('tenant_id', sa.String(length=255), nullable=False),
+        sa.Column('external_segment_id', sa.String(length=36),
+                  nullable=False),
+        sa.ForeignKeyConstraint(['external_segment_id'],
+                                ['gp_external_segments.id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('tenant_id')
+    )
+    op.create_index(
+        op.f('ix_gpm_default_external_segments_external_segment_id'),
+        'gpm_default_external_segments', ['external_segment_id'])
+    op.create_table(
+        'gpm_ptg_default_sgs',
+        sa.Column('policy_target_group_id', sa.String(length=36),
+                  nullable=False),
+        sa.Column('security_group_id', sa.String(length=36),
+                  nullable=False),
+        sa.ForeignKeyConstraint(['security_group_id'], ['securitygroups.id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('policy_target_group_id'),
+        sa.UniqueConstraint('security_group_id')
+    )
+
+
+def downgrade():
+    op.drop_table('gpm_ptg_default_sgs')
+    op.drop_table('gpm_default_external_segments')
+    op.drop_table('gpm_default_l3_policies')
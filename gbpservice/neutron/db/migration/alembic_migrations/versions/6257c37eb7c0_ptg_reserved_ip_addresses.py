@@ -0,0 +1,45 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""ptg_reserved_ip_addresses
+"""
+
+# revision identifiers, used by Alembic.
+revision = '6257c37eb7c0'
+down_revision = '1dd779b1136b'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'gpm_ptg_reserved_ip_addresses',
+        sa.Column('subnet_id', sa.String(length=36), nullable=False),
+        sa.Column('ip_address', sa.String(length=64), nullable=False),
+        sa.Column('policy_target_group_id', sa.String(length=36),
+                  nullable=False),
+        sa.ForeignKeyConstraint(['subnet_id'], ['subnets.id'],
+                                ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['policy_target_group_id'],
+                                ['gp_policy_target_groups.id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('subnet_id', 'ip_address')
+    )
+    op.create_index(
+        op.f('ix_gpm_ptg_reserved_ip_addresses_policy_target_group_id'),
+        'gpm_ptg_reserved_ip_addresses', ['policy_target_group_id'])
+
+
+def downgrade():
+    op.drop_table('gpm_ptg_reserved_ip_addresses')
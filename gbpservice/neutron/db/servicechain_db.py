@@ -90,10 +90,10 @@ class ServiceChainInstance(model_base.BASEV2, models_v2.HasId,
     provider_ptg_id = sa.Column(sa.String(36),
                              # FixMe(Magesh) Issue with cascade on Delete
                              # sa.ForeignKey('gp_policy_target_groups.id'),
-                             nullable=True)
+                             nullable=True, index=True)
     consumer_ptg_id = sa.Column(sa.String(36),
                              # sa.ForeignKey('gp_policy_target_groups.id'),
-                             nullable=True)
+                             nullable=True, index=True)
     classifier_id = sa.Column(sa.String(36),
                               # sa.ForeignKey('gp_policy_classifiers.id'),
                               nullable=True)
@@ -381,20 +381,21 @@ class ServiceChainDbPlugin(schain.ServiceChainPluginBase,
                 instance_db.specs.append(assoc)
 
     def _get_instances_from_policy_target(self, context, policy_target):
+        ptg_id = policy_target.get('policy_target_group_id')
+        if not ptg_id:
+            return []
         with context.session.begin(subtransactions=True):
-            ptg_id = policy_target['policy_target_group_id']
-            scis_p = self.get_servicechain_instances(
-                context, {'provider_ptg_id': [ptg_id]})
-            scis_c = self.get_servicechain_instances(
-                context, {'consumer_ptg_id': [ptg_id]})
-            # Don't return duplicates
-            result = []
-            seen = set()
-            for sci in scis_p + scis_c:
-                if sci['id'] not in seen:
-                    seen.add(sci['id'])
-                    result.append(sci)
-            return result
+            # Both PTG columns are indexed, for the common case of a PTG
+            # which is not part of any chain this boils down to a single
+            # index lookup returning no rows.
+            # Scoped to the tenant for non admin contexts, like the
+            # get_servicechain_instances call this replaces
+            query = self._model_query(context, ServiceChainInstance)
+            query = query.filter(
+                sa.or_(ServiceChainInstance.provider_ptg_id == ptg_id,
+                       ServiceChainInstance.consumer_ptg_id == ptg_id))
+            query = query.options(orm.joinedload('specs'))
+            return [self._make_sc_instance_dict(sci) for sci in query.all()]
 
     @log.log
     def create_servicechain_spec(self, context, servicechain_spec,
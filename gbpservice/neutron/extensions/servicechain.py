@@ -293,6 +293,14 @@ class ServiceChainPluginBase(service_base.ServicePluginBase):
         """
         pass
 
+    def update_chains_pts_added(self, context, policy_targets):
+        """ Auto scaling function.
+
+        Override this method to react to policy targets bulk creation.
+        """
+        for policy_target in policy_targets:
+            self.update_chains_pt_added(context, policy_target)
+
     def update_chains_pt_removed(self, context, policy_target):
         """ Auto scaling function.
 
@@ -18,14 +18,21 @@ from neutron import manager
 from neutron.plugins.ml2 import driver_api as api
 from oslo_log import log
 
+from gbpservice.neutron.plugins.ml2.drivers.grouppolicy import update_filter
 
 LOG = log.getLogger(__name__)
 
+# Attributes the APIC GBP driver reacts to on updates
+PORT_ATTRIBUTES = ('binding:host_id',)
+SUBNET_ATTRIBUTES = ('gateway_ip',)
+
 
 class APICMechanismGBPDriver(api.MechanismDriver):
 
     def initialize(self):
         self._apic_gbp = None
+        self.update_filter = update_filter.UpdateFilter(
+            port=PORT_ATTRIBUTES, subnet=SUBNET_ATTRIBUTES)
 
     @property
     def apic_gbp(self):
@@ -43,9 +50,15 @@ class APICMechanismGBPDriver(api.MechanismDriver):
                 context._plugin_context, context.current)
 
     def update_port_postcommit(self, context):
+        if not self.update_filter.changed('port', context.original,
+                                          context.current):
+            return
         self.apic_gbp.process_port_changed(context._plugin_context,
                                            context.original, context.current)
 
     def update_subnet_postcommit(self, context):
+        if not self.update_filter.changed('subnet', context.original,
+                                          context.current):
+            return
         self.apic_gbp.process_subnet_changed(context._plugin_context,
                                              context.original, context.current)
@@ -15,16 +15,21 @@
 
 from neutron.plugins.ml2 import driver_api as api
 
+from gbpservice.neutron.plugins.ml2.drivers.grouppolicy import update_filter
 from gbpservice.neutron.services.grouppolicy.drivers.nuage import driver
 
 
 NOVA_PORT_OWNER_PREF = 'compute:'
+# A port getting bound always changes its VIF type
+PORT_ATTRIBUTES = ('binding:vif_type',)
 
 
 class NuageMechanismGBPDriver(api.MechanismDriver):
 
     def initialize(self):
         self._nuage_gbp = None
+        self.update_filter = update_filter.UpdateFilter(
+            port=PORT_ATTRIBUTES)
 
     @property
     def nuage_gbp(self):
@@ -34,6 +39,9 @@ class NuageMechanismGBPDriver(api.MechanismDriver):
         return self._nuage_gbp
 
     def update_port_postcommit(self, context):
+        if not self.update_filter.changed('port', context.original,
+                                          context.current):
+            return
         port = context.current
         port_prefix = NOVA_PORT_OWNER_PREF
         # Check two things prior to proceeding with
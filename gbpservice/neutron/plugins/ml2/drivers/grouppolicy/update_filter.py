@@ -0,0 +1,49 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+
+from oslo_log import log
+
+
+LOG = log.getLogger(__name__)
+
+
+class UpdateFilter(object):
+    """Filter the resource updates forwarded to a GBP policy driver.
+
+    Built with the attributes the policy driver reacts to per resource
+    type, it only lets through the updates changing at least one of them.
+    Skipped and forwarded updates are counted per resource type.
+    """
+
+    def __init__(self, **attributes):
+        self.attributes = attributes
+        self.skipped = collections.Counter()
+        self.forwarded = collections.Counter()
+
+    def changed(self, resource, original, current):
+        """Return whether the update is relevant, and account for it."""
+        if original is not None and not [
+                x for x in self.attributes[resource]
+                if original.get(x) != current.get(x)]:
+            LOG.debug("Skipping %(resource)s %(id)s update, no relevant "
+                      "attribute changed", {'resource': resource,
+                                            'id': current.get('id')})
+            self.skipped[resource] += 1
+            return False
+        self.forwarded[resource] += 1
+        return True
+
+    def get_counters(self):
+        return {'skipped': dict(self.skipped),
+                'forwarded': dict(self.forwarded)}
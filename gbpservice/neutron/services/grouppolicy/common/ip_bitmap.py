@@ -0,0 +1,89 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import netaddr
+
+# Only the first addresses of bigger (IPv6) pools are tracked
+MAX_SIZE = 1 << 16
+
+
+class IPBitmap(object):
+    """Compact bitmap of the used addresses of a CIDR.
+
+    Addresses are allocated lowest first, so the allocation is
+    deterministic. The bitmap scan resumes from the lowest byte which may
+    have free bits, which makes sequential allocations O(1).
+    """
+
+    def __init__(self, cidr, used=None):
+        network = netaddr.IPNetwork(cidr)
+        self.cidr = str(network.cidr)
+        self._version = network.version
+        self._first = network.first
+        self._size = min(network.size, MAX_SIZE)
+        self._bits = bytearray((self._size + 7) // 8)
+        # The padding bits of the last byte are never free
+        for index in range(self._size, len(self._bits) * 8):
+            self._bits[index // 8] |= 1 << (index % 8)
+        self._free = self._size
+        self._hint = 0
+        for address in used or []:
+            self.reserve(address)
+
+    @property
+    def free(self):
+        return self._free
+
+    def _index(self, address):
+        address = netaddr.IPAddress(address)
+        index = int(address) - self._first
+        if address.version == self._version and 0 <= index < self._size:
+            return index
+
+    def reserve(self, address):
+        """Mark the address as used, returns whether it was free."""
+        index = self._index(address)
+        if index is None:
+            return False
+        byte, mask = index // 8, 1 << (index % 8)
+        if self._bits[byte] & mask:
+            return False
+        self._bits[byte] |= mask
+        self._free -= 1
+        return True
+
+    def release(self, address):
+        index = self._index(address)
+        if index is None:
+            return
+        byte, mask = index // 8, 1 << (index % 8)
+        if self._bits[byte] & mask:
+            self._bits[byte] &= ~mask
+            self._free += 1
+            self._hint = min(self._hint, byte)
+
+    def allocate(self):
+        """Return the lowest free address, None if the CIDR is full."""
+        if not self._free:
+            return None
+        byte = self._hint
+        while self._bits[byte] == 0xff:
+            byte += 1
+        self._hint = byte
+        value = self._bits[byte]
+        bit = 0
+        while value & (1 << bit):
+            bit += 1
+        self._bits[byte] |= 1 << bit
+        self._free -= 1
+        return str(netaddr.IPAddress(self._first + byte * 8 + bit,
+                                     self._version))
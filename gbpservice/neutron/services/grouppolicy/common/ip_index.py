@@ -0,0 +1,71 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+
+import netaddr
+
+
+class CIDRIndex(object):
+    """Sorted interval index of the addresses covered by a list of CIDRs.
+
+    Overlapping and adjacent CIDRs are merged when the index is built, so
+    each IP version keeps disjoint integer ranges sorted by their first
+    address. Building the index is O(n log n), overlap and containment
+    queries are a binary search.
+    """
+
+    def __init__(self, cidrs=None):
+        ranges = {}
+        for cidr in cidrs or []:
+            version, first, last = self._range(cidr)
+            ranges.setdefault(version, []).append((first, last))
+        self._firsts = {}
+        self._lasts = {}
+        for version, intervals in ranges.items():
+            firsts, lasts = [], []
+            for first, last in sorted(intervals):
+                if lasts and first <= lasts[-1] + 1:
+                    lasts[-1] = max(lasts[-1], last)
+                else:
+                    firsts.append(first)
+                    lasts.append(last)
+            self._firsts[version] = firsts
+            self._lasts[version] = lasts
+
+    @staticmethod
+    def _range(cidr):
+        network = netaddr.IPNetwork(cidr)
+        return network.version, network.first, network.last
+
+    def _lookup(self, version, address):
+        """Return the position of the last range starting at or before
+        the address, -1 if there is none.
+        """
+        return bisect.bisect_right(self._firsts.get(version, []), address) - 1
+
+    def overlaps(self, cidr):
+        """Whether the CIDR (or address) shares any address with the index."""
+        version, first, last = self._range(cidr)
+        # The range starting last before the end of the CIDR is the only
+        # one which can reach its beginning.
+        pos = self._lookup(version, last)
+        return pos >= 0 and self._lasts[version][pos] >= first
+
+    def overlaps_any(self, cidrs):
+        return any(self.overlaps(x) for x in cidrs)
+
+    def contains(self, cidr):
+        """Whether all the addresses of the CIDR (or address) are indexed."""
+        version, first, last = self._range(cidr)
+        pos = self._lookup(version, first)
+        return pos >= 0 and self._lasts[version][pos] >= last
@@ -0,0 +1,75 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import copy
+import time
+
+from oslo_config import cfg
+
+from gbpservice.neutron.services.grouppolicy import config  # noqa
+
+PORT_PT = 'port_pt'
+SUBNET_PTG = 'subnet_ptg'
+L2P_NETWORK = 'l2p_network'
+NETWORK_L2P = 'network_l2p'
+
+
+class MappingCache(object):
+    """Per process cache of the GBP to Neutron resource mappings.
+
+    Only relationships that can't change during the lifetime of the
+    resources are cached (the PT of a port, the PTG ID of a subnet, the
+    network of an L2 policy), and only the attributes tied to those
+    identities should be relied upon. Mutable resources, like the PTGs with
+    their sharing and rule sets, are never cached. The plugin invalidates
+    the entries when the resources are updated or deleted, the TTL bounds
+    how long the entries stay stale on the other servers. Missing mappings
+    are never cached, and the callers get their own copy of the cached
+    values.
+    """
+
+    def __init__(self):
+        self._maps = {}
+
+    def get(self, kind, key, loader):
+        """Return the mapping of key, calling loader on a cache miss."""
+        entry = self._maps.get(kind, {}).get(key)
+        now = time.time()
+        if entry and entry[0] > now:
+            return copy.deepcopy(entry[1])
+        value = loader()
+        ttl = cfg.CONF.group_policy.mapping_cache_ttl
+        if value is not None and ttl > 0:
+            self._maps.setdefault(kind, {})[key] = (now + ttl,
+                                                    copy.deepcopy(value))
+        return value
+
+    def invalidate(self, kind, *keys):
+        entries = self._maps.get(kind, {})
+        for key in keys:
+            entries.pop(key, None)
+
+    def clear(self):
+        self._maps = {}
+
+    def policy_target_changed(self, *pts):
+        self.invalidate(PORT_PT, *[x['port_id'] for x in pts])
+
+    def policy_target_group_changed(self, *ptgs):
+        self.invalidate(SUBNET_PTG, *[s for x in ptgs for s in x['subnets']])
+
+    def l2_policy_changed(self, *l2ps):
+        self.invalidate(L2P_NETWORK, *[x['id'] for x in l2ps])
+        self.invalidate(NETWORK_L2P, *[x['network_id'] for x in l2ps])
+
+
+cache = MappingCache()
@@ -26,6 +26,11 @@ group_policy_opts = [
                        "entrypoints to be loaded from the "
                        "gbpservice.neutron.group_policy.extension_drivers "
                        "namespace.")),
+    cfg.IntOpt('mapping_cache_ttl',
+               default=60,
+               help=_("Number of seconds the mapping drivers may cache the "
+                      "association of ports, subnets and networks to group "
+                      "policy resources. 0 disables the cache.")),
 ]
 
 
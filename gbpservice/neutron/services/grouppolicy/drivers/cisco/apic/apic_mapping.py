@@ -10,6 +10,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import functools
+
 import netaddr
 
 from apicapi import apic_manager
@@ -35,6 +37,28 @@ from gbpservice.neutron.services.grouppolicy.drivers import (
 LOG = logging.getLogger(__name__)
 
 
+def apic_transaction(f):
+    """Gather the APIC changes of a driver call in a single transaction.
+
+    The transaction is attached to the plugin context of the request, so
+    that all the helpers invoked during the call add their MOs to it. It is
+    committed in one bulk request once the outermost call returns.
+    """
+
+    @functools.wraps(f)
+    def wrapper(self, context, *args, **kwargs):
+        plugin_context = context._plugin_context
+        if getattr(plugin_context, '_apic_transaction', None) is not None:
+            return f(self, context, *args, **kwargs)
+        with self.apic_manager.apic.transaction(None) as trs:
+            plugin_context._apic_transaction = trs
+            try:
+                return f(self, context, *args, **kwargs)
+            finally:
+                plugin_context._apic_transaction = None
+    return wrapper
+
+
 class L2PolicyMultiplePolicyTargetGroupNotSupportedOnApicDriver(
         gpexc.GroupPolicyBadRequest):
     message = _("An L2 policy can't have multiple policy target groups on "
@@ -137,11 +161,39 @@ class ApicMappingDriver(api.ResourceMappingDriver):
                 return
         else:
             pt = kwargs['policy_target']
-            ptg = self.gbp_plugin.get_policy_target_group(
+            ptg = self._get_ptg(
                 context, pt['policy_target_group_id'])
             network = self._l2p_id_to_network(context, ptg['l2_policy_id'])
-
-        return {'port_id': port_id,
+        return self._build_gbp_details(port, ptg, network)
+
+    def get_gbp_details_list(self, context, **kwargs):
+        """Retrieve the GBP details of several devices at once.
+
+        Details are returned in the order of the requested devices, None
+        replaces the ones that don't belong to a policy target group.
+        """
+        port_ids = [self._core_plugin._device_to_port_id(device)
+                    for device in kwargs.get('devices', [])]
+        if not port_ids:
+            return []
+        ports = dict((x['id'], x) for x in self._core_plugin.get_ports(
+            context, filters={'id': port_ids}))
+        ptgs = self._port_ids_to_ptgs(context, port_ids)
+        network_ids = set(x['network_id'] for x in ptgs.values())
+        networks = dict((x['id'], x) for x in self._core_plugin.get_networks(
+            context, filters={'id': list(network_ids)})) if network_ids else {}
+        details = []
+        for port_id in port_ids:
+            ptg = ptgs.get(port_id)
+            if port_id not in ports or not ptg:
+                details.append(None)
+                continue
+            details.append(self._build_gbp_details(
+                ports[port_id], ptg, networks[ptg['network_id']]))
+        return details
+
+    def _build_gbp_details(self, port, ptg, network):
+        return {'port_id': port['id'],
                 'mac_address': port['mac_address'],
                 'ptg_id': ptg['id'],
                 'segmentation_id': network[pn.SEGMENTATION_ID],
@@ -214,12 +266,13 @@ class ApicMappingDriver(api.ResourceMappingDriver):
     def create_policy_rule_set_precommit(self, context):
         pass
 
+    @apic_transaction
     def create_policy_rule_set_postcommit(self, context):
         # Create APIC policy_rule_set
         tenant = self._tenant_by_sharing_policy(context.current)
         contract = self.name_mapper.policy_rule_set(context,
                                                     context.current['id'])
-        with self.apic_manager.apic.transaction(None) as trs:
+        with self._transaction(context._plugin_context) as trs:
             self.apic_manager.create_contract(
                 contract, owner=tenant, transaction=trs)
             rules = self.gbp_plugin.get_policy_rules(
@@ -228,6 +281,7 @@ class ApicMappingDriver(api.ResourceMappingDriver):
             self._apply_policy_rule_set_rules(
                 context, context.current, rules, transaction=trs)
 
+    @apic_transaction
     def create_policy_target_postcommit(self, context):
         # The path needs to be created at bind time, this will be taken
         # care by the GBP ML2 apic driver.
@@ -238,6 +292,7 @@ class ApicMappingDriver(api.ResourceMappingDriver):
     def create_policy_target_group_precommit(self, context):
         pass
 
+    @apic_transaction
     def create_policy_target_group_postcommit(self, context):
         super(ApicMappingDriver, self).create_policy_target_group_postcommit(
             context)
@@ -249,7 +304,7 @@ class ApicMappingDriver(api.ResourceMappingDriver):
         l2_policy_object = context._plugin.get_l2_policy(
             context._plugin_context, context.current['l2_policy_id'])
         bd_owner = self._tenant_by_sharing_policy(l2_policy_object)
-        with self.apic_manager.apic.transaction(None) as trs:
+        with self._transaction(context._plugin_context) as trs:
             self.apic_manager.ensure_epg_created(tenant, epg,
                                                  bd_owner=bd_owner,
                                                  bd_name=l2_policy)
@@ -334,6 +389,7 @@ class ApicMappingDriver(api.ResourceMappingDriver):
         # Delete Neutron's port
         super(ApicMappingDriver, self).delete_policy_target_postcommit(context)
 
+    @apic_transaction
     def delete_policy_target_group_postcommit(self, context):
         if context.current['subnets']:
             subnets = self._subnet_ids_to_objects(context._plugin_context,
@@ -372,6 +428,11 @@ class ApicMappingDriver(api.ResourceMappingDriver):
     def update_policy_rule_set_precommit(self, context):
         self._reject_shared_update(context, 'policy_rule_set')
 
+    @apic_transaction
+    def update_policy_rule_set_postcommit(self, context):
+        super(ApicMappingDriver, self).update_policy_rule_set_postcommit(
+            context)
+
     def update_policy_target_postcommit(self, context):
         # TODO(ivar): redo binding procedure if the PTG is modified,
         # not doable unless driver extension framework is in place
@@ -386,6 +447,7 @@ class ApicMappingDriver(api.ResourceMappingDriver):
             raise gpexc.PolicyTargetGroupSubnetRemovalNotSupported()
         self._reject_shared_update(context, 'policy_target_group')
 
+    @apic_transaction
     def update_policy_target_group_postcommit(self, context):
         # TODO(ivar): refactor parent to avoid code duplication
         orig_provided_policy_rule_sets = context.original[
@@ -415,7 +477,7 @@ class ApicMappingDriver(api.ResourceMappingDriver):
         new_subnets = list(set(curr_subnets) - set(orig_subnets))
         removed_subnets = list(set(orig_subnets) - set(curr_subnets))
 
-        with self.apic_manager.apic.transaction(None) as trs:
+        with self._transaction(context._plugin_context) as trs:
             self._manage_ptg_policy_rule_sets(
                 context._plugin_context, context.current,
                 new_provided_policy_rule_sets, new_consumed_policy_rule_sets,
@@ -428,7 +490,8 @@ class ApicMappingDriver(api.ResourceMappingDriver):
                 context._plugin_context, removed_subnets)
 
             self._manage_ptg_subnets(context._plugin_context, context.current,
-                                     new_subnets, removed_subnets)
+                                     new_subnets, removed_subnets,
+                                     transaction=trs)
         self._update_default_security_group(
             context._plugin_context, context.current['id'],
             context.current['tenant_id'], subnets=new_subnets)
@@ -612,7 +675,7 @@ class ApicMappingDriver(api.ResourceMappingDriver):
 
     def process_subnet_changed(self, context, old, new):
         if old['gateway_ip'] != new['gateway_ip']:
-            ptg = self._subnet_to_ptg(context, new['id'])
+            ptg = self._get_ptg_by_subnet(context, new['id'])
             if ptg:
                 # Is GBP owned, reflect on APIC
                 self._manage_ptg_subnets(context, ptg, [new], [old])
@@ -665,7 +728,8 @@ class ApicMappingDriver(api.ResourceMappingDriver):
                 rule_owner = self._tenant_by_sharing_policy(rule)
                 classifier = context._plugin.get_policy_classifier(
                     context._plugin_context, rule['policy_classifier_id'])
-                with self.apic_manager.apic.transaction(transaction) as trs:
+                with self._transaction(context._plugin_context,
+                                       transaction) as trs:
                     if classifier['direction'] in in_dir:
                         # PRS and subject are the same thing in this case
                         self.apic_manager.manage_contract_subject_in_filter(
@@ -679,7 +743,6 @@ class ApicMappingDriver(api.ResourceMappingDriver):
                             transaction=trs, unset=unset,
                             rule_owner=rule_owner)
 
-    @lockutils.synchronized('apic-portlock')
     def _manage_policy_target_port(self, plugin_context, pt):
         port = self._core_plugin.get_port(plugin_context, pt['port_id'])
         if port.get('binding:host_id'):
@@ -690,7 +753,7 @@ class ApicMappingDriver(api.ResourceMappingDriver):
                 # TODO(ivar): change APICAPI to not expect a resource context
                 plugin_context._plugin = self.gbp_plugin
                 plugin_context._plugin_context = plugin_context
-                ptg_object = self.gbp_plugin.get_policy_target_group(
+                ptg_object = self._get_ptg(
                     plugin_context, port_details['ptg_id'])
                 tenant_id = self._tenant_by_sharing_policy(ptg_object)
                 epg = self.name_mapper.policy_target_group(
@@ -698,12 +761,15 @@ class ApicMappingDriver(api.ResourceMappingDriver):
                 bd = self.name_mapper.l2_policy(
                     plugin_context, port_details['l2_policy_id'])
                 seg = port_details['segmentation_id']
-                # Create a static path attachment for the host/epg/switchport
-                with self.apic_manager.apic.transaction() as trs:
-                    self.apic_manager.ensure_path_created_for_port(
-                        tenant_id, epg, port['binding:host_id'], seg,
-                        bd_name=bd,
-                        transaction=trs)
+                # Create a static path attachment for the host/epg/switchport.
+                # The path is committed while holding its lock, so that it
+                # can't be removed by a concurrent last-path deletion.
+                with self._path_lock(port['binding:host_id'], seg):
+                    with self.apic_manager.apic.transaction() as trs:
+                        self.apic_manager.ensure_path_created_for_port(
+                            tenant_id, epg, port['binding:host_id'], seg,
+                            bd_name=bd,
+                            transaction=trs)
 
     def _manage_ptg_policy_rule_sets(
             self, plugin_context, ptg, added_provided, added_consumed,
@@ -718,7 +784,7 @@ class ApicMappingDriver(api.ResourceMappingDriver):
         consumed = [added_consumed, removed_consumed]
         methods = [self.apic_manager.set_contract_for_epg,
                    self.apic_manager.unset_contract_for_epg]
-        with self.apic_manager.apic.transaction(transaction) as trs:
+        with self._transaction(plugin_context, transaction) as trs:
             for x in xrange(len(provided)):
                 for c in self.gbp_plugin.get_policy_rule_sets(
                         plugin_context, filters={'id': provided[x]}):
@@ -777,12 +843,18 @@ class ApicMappingDriver(api.ResourceMappingDriver):
         subnets = [added_subnets, removed_subnets]
         methods = [self.apic_manager.ensure_subnet_created_on_apic,
                    self.apic_manager.ensure_subnet_deleted_on_apic]
-        with self.apic_manager.apic.transaction(transaction) as trs:
+        with self._transaction(plugin_context, transaction) as trs:
             for x in xrange(len(subnets)):
                 for s in subnets[x]:
                     methods[x](mapped_tenant, mapped_l2p, self._gateway_ip(s),
                                transaction=trs)
 
+    def _transaction(self, plugin_context, transaction=None):
+        # Join the transaction of the ongoing GBP operation if there's one,
+        # a new transaction is committed on exit otherwise
+        return self.apic_manager.apic.transaction(
+            transaction or getattr(plugin_context, '_apic_transaction', None))
+
     def _get_active_path_count(self, plugin_context, port_info):
         return (plugin_context.session.query(models.PortBindingLevel).
             join(models.NetworkSegment).
@@ -792,18 +864,23 @@ class ApicMappingDriver(api.ResourceMappingDriver):
             filter(models.PortBindingLevel.port_id != port_info['port_id']).
             count())
 
-    @lockutils.synchronized('apic-portlock')
+    def _path_lock(self, host, segmentation_id):
+        # Static paths are shared by the ports bound to the same segment on
+        # the same host, only the operations on those need serializing
+        return lockutils.lock('apic-portlock-%s-%s' % (host, segmentation_id))
+
     def _delete_port_path(self, context, atenant_id, ptg, port_info):
-        if not self._get_active_path_count(context, port_info):
-            self.apic_manager.ensure_path_deleted_for_port(
-                atenant_id, ptg, port_info['host'])
+        with self._path_lock(port_info['host'], port_info['segmentation_id']):
+            if not self._get_active_path_count(context, port_info):
+                self.apic_manager.ensure_path_deleted_for_port(
+                    atenant_id, ptg, port_info['host'])
 
     def _delete_path_if_last(self, context, port_info):
         if not self._get_active_path_count(context, port_info):
             # TODO(ivar): change APICAPI to not expect a resource context
             context._plugin = self.gbp_plugin
             context._plugin_context = context
-            ptg_object = self.gbp_plugin.get_policy_target_group(
+            ptg_object = self._get_ptg(
                 context, port_info['ptg_id'])
             atenant_id = self._tenant_by_sharing_policy(ptg_object)
             epg = self.name_mapper.policy_target_group(context,
@@ -854,38 +931,20 @@ class ApicMappingDriver(api.ResourceMappingDriver):
         network = self._l2p_id_to_network(context, ptg['l2_policy_id'])
         return ptg, network
 
-    def _port_id_to_pt(self, context, port_id):
-        pt = (context.session.query(gpdb.PolicyTargetMapping).
-              filter_by(port_id=port_id).first())
-        if pt:
-            db_utils = gpdb.GroupPolicyMappingDbPlugin()
-            return db_utils._make_policy_target_dict(pt)
-
-    def _port_id_to_ptg(self, context, port_id):
-        pt = self._port_id_to_pt(context, port_id)
-        if pt:
-            return self.gbp_plugin.get_policy_target_group(
-                context, pt['policy_target_group_id'])
-        return
-
-    def _l2p_id_to_network(self, context, l2p_id):
-        l2_policy = self.gbp_plugin.get_l2_policy(context, l2p_id)
-        return self._core_plugin.get_network(context, l2_policy['network_id'])
-
-    def _network_id_to_l2p(self, context, network_id):
-        l2ps = self.gbp_plugin.get_l2_policies(
-            context, filters={'network_id': [network_id]})
-        return l2ps[0] if l2ps else None
-
-    def _subnet_to_ptg(self, context, subnet_id):
-        ptg = (context.session.query(gpdb.PolicyTargetGroupMapping).
-               join(gpdb.PolicyTargetGroupMapping.subnets).
-               filter(gpdb.PTGToSubnetAssociation.subnet_id ==
-                      subnet_id).
-               first())
-        if ptg:
-            db_utils = gpdb.GroupPolicyMappingDbPlugin()
-            return db_utils._make_policy_target_group_dict(ptg)
+    def _port_ids_to_ptgs(self, context, port_ids):
+        # Resolve the PTG and network of all the ports in a single query
+        ptg_db = gpdb.PolicyTargetGroupMapping
+        query = (context.session.query(
+            gpdb.PolicyTargetMapping.port_id, ptg_db.id, ptg_db.l2_policy_id,
+            ptg_db.tenant_id, ptg_db.shared, gpdb.L2PolicyMapping.network_id).
+            join(ptg_db, ptg_db.id ==
+                 gpdb.PolicyTargetMapping.policy_target_group_id).
+            join(gpdb.L2PolicyMapping,
+                 gpdb.L2PolicyMapping.id == ptg_db.l2_policy_id).
+            filter(gpdb.PolicyTargetMapping.port_id.in_(port_ids)))
+        return dict((row[0], {'id': row[1], 'l2_policy_id': row[2],
+                              'tenant_id': row[3], 'shared': row[4],
+                              'network_id': row[5]}) for row in query)
 
     def _plug_l3p_to_es(self, context, external_segment):
         l3_policy = self.name_mapper.l3_policy(context, context.current['id'])
@@ -1001,13 +1060,6 @@ class ApicMappingDriver(api.ResourceMappingDriver):
                 if len(allocations) > 1:
                     raise OnlyOneAddressIsAllowedPerExternalSegment()
 
-    def _get_ptg_by_subnet(self, plugin_context, subnet_id):
-        ptgass = (plugin_context.session.query(gpdb.PTGToSubnetAssociation).
-                  filter_by(subnet_id=subnet_id).first())
-        if ptgass:
-            return self.gbp_plugin.get_policy_target_group(
-                plugin_context, ptgass['policy_target_group_id'])
-
     def _reject_shared_update(self, context, type):
         if context.original.get('shared') != context.current.get('shared'):
             raise SharedAttributeUpdateNotSupportedOnApic(type=type)
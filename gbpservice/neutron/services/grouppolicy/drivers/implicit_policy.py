@@ -13,6 +13,7 @@
 from neutron.common import log
 from neutron.db import model_base
 from oslo_config import cfg
+from oslo_db import exception as db_exc
 from oslo_log import log as logging
 import sqlalchemy as sa
 
@@ -73,6 +74,28 @@ class OwnedL3Policy(model_base.BASEV2):
                              nullable=False, primary_key=True)
 
 
+class DefaultL3Policy(model_base.BASEV2):
+    """The default L3 Policy of a tenant."""
+
+    __tablename__ = 'gpm_default_l3_policies'
+    tenant_id = sa.Column(sa.String(255), nullable=False, primary_key=True)
+    l3_policy_id = sa.Column(sa.String(36),
+                             sa.ForeignKey('gp_l3_policies.id',
+                                           ondelete='CASCADE'),
+                             nullable=False, unique=True)
+
+
+class DefaultExternalSegment(model_base.BASEV2):
+    """The default External Segment of a tenant."""
+
+    __tablename__ = 'gpm_default_external_segments'
+    tenant_id = sa.Column(sa.String(255), nullable=False, primary_key=True)
+    external_segment_id = sa.Column(sa.String(36),
+                                    sa.ForeignKey('gp_external_segments.id',
+                                                  ondelete='CASCADE'),
+                                    nullable=False, index=True)
+
+
 class ImplicitPolicyDriver(api.PolicyDriver):
     """Implicit Policy driver for Group Policy plugin.
 
@@ -130,6 +153,13 @@ class ImplicitPolicyDriver(api.PolicyDriver):
         l3p_id = context.current['l3_policy_id']
         self._cleanup_l3_policy(context, l3p_id)
 
+    @log.log
+    def delete_l3_policy_precommit(self, context):
+        session = context._plugin_context.session
+        with session.begin(subtransactions=True):
+            session.query(DefaultL3Policy).filter_by(
+                l3_policy_id=context.current['id']).delete()
+
     @log.log
     def create_external_segment_precommit(self, context):
         # REVISIT(ivar): find a better way to retrieve the default ES
@@ -140,6 +170,23 @@ class ImplicitPolicyDriver(api.PolicyDriver):
             if [x for x in ess if x['id'] != context.current['id']]:
                 raise exc.DefaultExternalSegmentAlreadyExists(
                     es_name=self._default_es_name)
+            # The new ES may be preferred over the known defaults
+            self._clear_default_external_segments(
+                context._plugin_context.session)
+
+    @log.log
+    def update_external_segment_precommit(self, context):
+        if (context.current['name'] != context.original['name'] or
+                context.current['shared'] != context.original['shared']):
+            self._clear_default_external_segments(
+                context._plugin_context.session)
+
+    @log.log
+    def delete_external_segment_precommit(self, context):
+        session = context._plugin_context.session
+        with session.begin(subtransactions=True):
+            session.query(DefaultExternalSegment).filter_by(
+                external_segment_id=context.current['id']).delete()
 
     @log.log
     def create_external_policy_postcommit(self, context):
@@ -173,57 +220,89 @@ class ImplicitPolicyDriver(api.PolicyDriver):
         context.set_l2_policy_id(l2p_id)
 
     def _cleanup_l2_policy(self, context, l2p_id):
-        if self._l2_policy_is_owned(context._plugin_context.session, l2p_id):
+        self._cleanup_l2_policies(context, [l2p_id])
+
+    def _cleanup_l2_policies(self, context, l2p_ids):
+        owned = self._get_owned_l2_policy_ids(
+            context._plugin_context.session, l2p_ids)
+        for l2p_id in owned:
             context._plugin.delete_l2_policy(context._plugin_context, l2p_id)
 
     def _use_implicit_l3_policy(self, context):
-        filter = {'tenant_id': [context.current['tenant_id']],
+        session = context._plugin_context.session
+        tenant_id = context.current['tenant_id']
+        l3p_id = self._get_default_l3_policy_id(session, tenant_id)
+        if not l3p_id:
+            l3p_id = self._create_default_l3_policy(context)
+        context.current['l3_policy_id'] = l3p_id
+        context.set_l3_policy_id(l3p_id)
+
+    def _create_default_l3_policy(self, context):
+        session = context._plugin_context.session
+        tenant_id = context.current['tenant_id']
+        # Look for a default L3P not recorded yet
+        filter = {'tenant_id': [tenant_id],
                   'name': [self._default_l3p_name]}
         l3ps = context._plugin.get_l3_policies(context._plugin_context, filter)
-        l3p = l3ps and l3ps[0]
-        if not l3p:
-            # REVISIT(rkukura): Concurrency could result in multiple
-            # default L3Ps for the same tenant. A DB table mapping
-            # tenant_id to default l3_policy_id may be needed to
-            # ensure a single default L3 policy is used per tenant.
-            attrs = {'l3_policy':
-                     {'tenant_id': context.current['tenant_id'],
-                      'name': self._default_l3p_name,
-                      'description': _("Implicitly created L3 policy"),
-                      'ip_version': self._default_ip_version,
-                      'ip_pool': self._default_ip_pool,
-                      'shared': context.current.get('shared', False),
-                      'subnet_prefix_length':
-                      self._default_subnet_prefix_length}}
-            l3p = context._plugin.create_l3_policy(context._plugin_context,
-                                                   attrs)
-            self._mark_l3_policy_owned(context._plugin_context.session,
-                                       l3p['id'])
-        context.current['l3_policy_id'] = l3p['id']
-        context.set_l3_policy_id(l3p['id'])
+        if l3ps:
+            return self._set_default_l3_policy(session, tenant_id,
+                                               l3ps[0]['id'])
+        attrs = {'l3_policy':
+                 {'tenant_id': tenant_id,
+                  'name': self._default_l3p_name,
+                  'description': _("Implicitly created L3 policy"),
+                  'ip_version': self._default_ip_version,
+                  'ip_pool': self._default_ip_pool,
+                  'shared': context.current.get('shared', False),
+                  'subnet_prefix_length':
+                  self._default_subnet_prefix_length}}
+        l3p = context._plugin.create_l3_policy(context._plugin_context,
+                                               attrs)
+        self._mark_l3_policy_owned(session, l3p['id'])
+        l3p_id = self._set_default_l3_policy(session, tenant_id, l3p['id'])
+        if l3p_id != l3p['id']:
+            # Another default L3P was created concurrently
+            context._plugin.delete_l3_policy(context._plugin_context,
+                                             l3p['id'])
+        return l3p_id
 
     def _use_implicit_external_segment(self, context):
         if not self._default_es_name:
             return
 
-        filter = {'name': [self._default_es_name]}
-        ess = context._plugin.get_external_segments(context._plugin_context,
-                                                    filter)
-        # Multiple default ES may exist, this can happen when a per-tenant
-        # default ES gets his shared attribute flipped. Always prefer the
-        # specific tenant's ES if any.
-        for es in ess:
-            if es['tenant_id'] == context.current['tenant_id']:
-                default = es
-                break
-        else:
-            default = ess and ess[0]
-        if default:
-            # Set default ES
-            context.set_external_segment(default['id'])
+        session = context._plugin_context.session
+        tenant_id = context.current['tenant_id']
+        es_id = self._get_default_external_segment_id(session, tenant_id)
+        if not es_id:
+            filter = {'name': [self._default_es_name]}
+            ess = context._plugin.get_external_segments(
+                context._plugin_context, filter)
+            # Multiple default ES may exist, this can happen when a
+            # per-tenant default ES gets his shared attribute flipped.
+            # Always prefer the specific tenant's ES if any.
+            for es in ess:
+                if es['tenant_id'] == tenant_id:
+                    default = es
+                    break
+            else:
+                default = ess and ess[0]
+            if not default:
+                return
+            es_id = default['id']
+            # Admins see the ESs of the other tenants too
+            if default['tenant_id'] == tenant_id or default['shared']:
+                self._set_default_external_segment(session, tenant_id,
+                                                   es_id)
+        # Set default ES
+        context.set_external_segment(es_id)
 
     def _cleanup_l3_policy(self, context, l3p_id):
-        if self._l3_policy_is_owned(context._plugin_context.session, l3p_id):
+        self._cleanup_l3_policies(context, [l3p_id])
+
+    def _cleanup_l3_policies(self, context, l3p_ids):
+        owned = self._get_owned_l3_policy_ids(
+            context._plugin_context.session, l3p_ids)
+        for l3p_id in owned:
             context._plugin.delete_l3_policy(context._plugin_context, l3p_id,
                                              check_unused=True)
 
@@ -232,19 +311,65 @@ class ImplicitPolicyDriver(api.PolicyDriver):
             owned = OwnedL2Policy(l2_policy_id=l2p_id)
             session.add(owned)
 
-    def _l2_policy_is_owned(self, session, l2p_id):
+    def _get_owned_l2_policy_ids(self, session, l2p_ids):
+        """Return the subset of l2p_ids owned by the driver."""
+        l2p_ids = set(x for x in l2p_ids if x)
+        if not l2p_ids:
+            return set()
         with session.begin(subtransactions=True):
-            return (session.query(OwnedL2Policy).
-                    filter_by(l2_policy_id=l2p_id).
-                    first() is not None)
+            return set(x.l2_policy_id for x in
+                       session.query(OwnedL2Policy.l2_policy_id).filter(
+                           OwnedL2Policy.l2_policy_id.in_(l2p_ids)))
 
     def _mark_l3_policy_owned(self, session, l3p_id):
         with session.begin(subtransactions=True):
             owned = OwnedL3Policy(l3_policy_id=l3p_id)
             session.add(owned)
 
-    def _l3_policy_is_owned(self, session, l3p_id):
+    def _get_owned_l3_policy_ids(self, session, l3p_ids):
+        """Return the subset of l3p_ids owned by the driver."""
+        l3p_ids = set(x for x in l3p_ids if x)
+        if not l3p_ids:
+            return set()
+        with session.begin(subtransactions=True):
+            return set(x.l3_policy_id for x in
+                       session.query(OwnedL3Policy.l3_policy_id).filter(
+                           OwnedL3Policy.l3_policy_id.in_(l3p_ids)))
+
+    def _get_default_l3_policy_id(self, session, tenant_id):
+        with session.begin(subtransactions=True):
+            default = (session.query(DefaultL3Policy).
+                       filter_by(tenant_id=tenant_id).first())
+            return default and default.l3_policy_id
+
+    def _set_default_l3_policy(self, session, tenant_id, l3p_id):
+        """Set the default L3P of the tenant unless there's one already.
+
+        Returns the ID of the tenant default L3P.
+        """
+        try:
+            with session.begin(subtransactions=True):
+                session.add(DefaultL3Policy(tenant_id=tenant_id,
+                                            l3_policy_id=l3p_id))
+            return l3p_id
+        except db_exc.DBDuplicateEntry:
+            return self._get_default_l3_policy_id(session, tenant_id)
+
+    def _get_default_external_segment_id(self, session, tenant_id):
+        with session.begin(subtransactions=True):
+            default = (session.query(DefaultExternalSegment).
+                       filter_by(tenant_id=tenant_id).first())
+            return default and default.external_segment_id
+
+    def _set_default_external_segment(self, session, tenant_id, es_id):
+        try:
+            with session.begin(subtransactions=True):
+                session.add(DefaultExternalSegment(tenant_id=tenant_id,
+                                                   external_segment_id=es_id))
+        except db_exc.DBDuplicateEntry:
+            # Set concurrently, the lookup is the same
+            pass
+
+    def _clear_default_external_segments(self, session):
         with session.begin(subtransactions=True):
-            return (session.query(OwnedL3Policy).
-                    filter_by(l3_policy_id=l3p_id).
-                    first() is not None)
+            session.query(DefaultExternalSegment).delete()
@@ -26,6 +26,19 @@ od_driver_opts = [
     cfg.StrOpt('odl_port',
                default='8080',
                help=_("OpenDaylight Controller Rest API port number")),
+    cfg.IntOpt('odl_pool_maxsize',
+               default=10,
+               help=_("Maximum number of connections to the OpenDaylight "
+                      "Controller kept alive in the connection pool")),
+    cfg.IntOpt('odl_max_retries',
+               default=3,
+               help=_("Number of times an idempotent request (GET, PUT, "
+                      "DELETE) is retried when the OpenDaylight Controller "
+                      "can't be reached or is temporarily unavailable")),
+    cfg.FloatOpt('odl_retry_backoff',
+                 default=0.5,
+                 help=_("Seconds to wait before the first retry of a "
+                        "request, doubled at every following retry")),
 ]
 
 
@@ -10,7 +10,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+import threading
+import time
+
 import requests
+from requests import adapters
 from requests import auth
 
 from oslo_config import cfg
@@ -40,6 +45,54 @@ cfg.CONF.import_opt(
     'gbpservice.neutron.services.grouppolicy.drivers.odl.config',
     group='odl_driver'
 )
+cfg.CONF.import_opt(
+    'odl_pool_maxsize',
+    'gbpservice.neutron.services.grouppolicy.drivers.odl.config',
+    group='odl_driver'
+)
+cfg.CONF.import_opt(
+    'odl_max_retries',
+    'gbpservice.neutron.services.grouppolicy.drivers.odl.config',
+    group='odl_driver'
+)
+cfg.CONF.import_opt(
+    'odl_retry_backoff',
+    'gbpservice.neutron.services.grouppolicy.drivers.odl.config',
+    group='odl_driver'
+)
+
+# Only these methods are safe to be repeated when the outcome of a request
+# is unknown
+IDEMPOTENT_METHODS = ('get', 'put', 'delete')
+RETRY_STATUS_CODES = (502, 503, 504)
+
+
+class _RequestBatch(object):
+    """Requests buffered by OdlManager.batch(), in issue order."""
+
+    def __init__(self):
+        self.requests = []
+        self.tenants = set()
+        self._unregister = None
+
+    def add(self, method, url, headers, obj=None):
+        if method == 'put':
+            # A PUT replaces the whole object, so it supersedes any
+            # previous PUT of the same object still waiting to be sent.
+            self.requests = [x for x in self.requests
+                             if not (x[0] == 'put' and x[1] == url)]
+        self.requests.append((method, url, headers, obj))
+
+    def add_unregister(self, url, headers, endpoints):
+        # The unregister RPC takes lists of L2 and L3 addresses, so all the
+        # endpoints removed within the batch are merged in a single call.
+        if self._unregister is None:
+            self._unregister = {'l2': [], 'l3': []}
+            self.requests.append(('post', url, headers,
+                                  {'input': self._unregister}))
+        for ep in endpoints:
+            self._unregister['l2'].extend(ep.get('l2', []))
+            self._unregister['l3'].extend(ep.get('l3', []))
 
 
 class OdlManager(object):
@@ -65,6 +118,18 @@ class OdlManager(object):
         self._password = cfg.CONF.odl_driver.odl_password
         self._host = cfg.CONF.odl_driver.odl_host
         self._port = cfg.CONF.odl_driver.odl_port
+        self._max_retries = cfg.CONF.odl_driver.odl_max_retries
+        self._retry_backoff = cfg.CONF.odl_driver.odl_retry_backoff
+        self._auth = auth.HTTPBasicAuth(self._username, self._password)
+        self._local = threading.local()
+        # A single pooled session is shared by all the requests, so that
+        # connections to the controller are kept alive and reused.
+        self._session = requests.Session()
+        adapter = adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=cfg.CONF.odl_driver.odl_pool_maxsize)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
         self._headers = {
             'Content-type': 'application/yang.data+json',
             'Accept': 'application/yang.data+json',
@@ -130,9 +195,35 @@ class OdlManager(object):
         else:
             return obj
 
+    @contextlib.contextmanager
+    def batch(self):
+        """Coalesce all the ODL requests issued within the block.
+
+        Requests are buffered until the outermost batch is left, then sent
+        in the same order over the pooled session. Tenant existence is only
+        verified once per batch, repeated writes of the same object are
+        only sent once and all the endpoint unregistrations are merged in a
+        single call. Batches are local to the calling thread. When the block
+        raises, the buffered requests are discarded.
+        """
+        if getattr(self._local, 'batch', None) is not None:
+            yield
+            return
+        self._local.batch = batch = _RequestBatch()
+        try:
+            yield
+        finally:
+            self._local.batch = None
+        for request in batch.requests:
+            self._sendjson(*request)
+
     def _sendjson(self, method, url, headers, obj=None):
         """Send json to the ODL controller."""
 
+        batch = getattr(self._local, 'batch', None)
+        if batch is not None:
+            batch.add(method, url, headers, obj)
+            return
         medium = self._convert2ascii(obj) if obj else None
         url = self._convert2ascii(url)
         data = (
@@ -144,24 +235,20 @@ class OdlManager(object):
                   {'method': method, 'url': url})
         LOG.debug("(%(data)s)", {'data': data})
         LOG.debug("=========================================================")
-        r = requests.request(
+        r = self._request(
             method,
             url=url,
             headers=headers,
-            data=data,
-            auth=auth.HTTPBasicAuth(self._username,
-                                    self._password)
+            data=data
         )
         r.raise_for_status()
 
     def _is_tenant_created(self, tenant_id):
         url = self._convert2ascii(self._policy_url % {'tenant_id': tenant_id})
-        r = requests.request(
+        r = self._request(
             'get',
             url=url,
-            headers=self._headers,
-            auth=auth.HTTPBasicAuth(self._username,
-                                    self._password)
+            headers=self._headers
         )
         if r.status_code == 200:
             return True
@@ -170,12 +257,45 @@ class OdlManager(object):
         else:
             r.raise_for_status()
 
+    def _request(self, method, **kwargs):
+        """Issue a request through the pooled session.
+
+        Idempotent requests are retried with exponential backoff when the
+        controller can't be reached or answers with a transient error.
+        """
+        retries = (self._max_retries if method.lower() in IDEMPOTENT_METHODS
+                   else 0)
+        attempt = 0
+        while True:
+            try:
+                r = self._session.request(method, auth=self._auth, **kwargs)
+                if (r.status_code not in RETRY_STATUS_CODES or
+                        attempt >= retries):
+                    return r
+                LOG.warn(_("ODL request %(method)s %(url)s failed with "
+                           "status %(status)s, retrying"),
+                         {'method': method, 'url': kwargs.get('url'),
+                          'status': r.status_code})
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= retries:
+                    raise
+                LOG.warn(_("ODL request %(method)s %(url)s failed: "
+                           "%(error)s, retrying"),
+                         {'method': method, 'url': kwargs.get('url'),
+                          'error': e})
+            time.sleep(self._retry_backoff * (2 ** attempt))
+            attempt += 1
+
     def register_endpoints(self, endpoints):
         for ep in endpoints:
             data = {"input": ep}
             self._sendjson('post', self._reg_ep_url, self._headers, data)
 
     def unregister_endpoints(self, endpoints):
+        batch = getattr(self._local, 'batch', None)
+        if batch is not None:
+            batch.add_unregister(self._unreg_ep_url, self._headers, endpoints)
+            return
         for ep in endpoints:
             data = {"input": ep}
             self._sendjson('post', self._unreg_ep_url, self._headers, data)
@@ -283,5 +403,10 @@ class OdlManager(object):
         tenant = {
             "id": tenant_id
         }
+        batch = getattr(self._local, 'batch', None)
+        if batch is not None:
+            if tenant_id in batch.tenants:
+                return
+            batch.tenants.add(tenant_id)
         if not self._is_tenant_created(tenant_id):
             self.create_update_tenant(tenant_id, tenant)
@@ -10,12 +10,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import functools
+import time
 import uuid
 
 from neutron.common import constants
 from neutron import manager
 from oslo_concurrency import lockutils  # noqa
 from oslo_log import log as logging
+from oslo_utils import excutils
 
 from gbpservice.neutron.db.grouppolicy import group_policy_mapping_db as gpdb
 from gbpservice.neutron.services.grouppolicy.common import constants as g_const
@@ -27,6 +31,22 @@ from gbpservice.neutron.services.grouppolicy.drivers.odl import odl_manager
 
 LOG = logging.getLogger(__name__)
 
+# Upper bound on the number of generated contracts kept in memory
+CONTRACT_CACHE_SIZE = 1024
+# Unchanged contracts are pushed again after this many seconds, in case the
+# controller lost its configuration (e.g. after a restart)
+CONTRACT_PUSH_TTL = 300
+
+
+def odl_batch(f):
+    """Coalesce the ODL requests issued by a driver call."""
+
+    @functools.wraps(f)
+    def wrapper(self, *args, **kwargs):
+        with self.odl_manager.batch():
+            return f(self, *args, **kwargs)
+    return wrapper
+
 
 class ExternalSegmentNotSupportedOnOdlDriver(gpexc.GroupPolicyBadRequest):
     message = _("External Segment currently not supported on ODL GBP "
@@ -120,6 +140,13 @@ class OdlMappingDriver(api.ResourceMappingDriver):
         super(OdlMappingDriver, self).initialize()
         self.odl_manager = OdlMappingDriver.get_odl_manager()
         self._gbp_plugin = None
+        # rule set ID -> (rule set version, subject)
+        self._subject_cache = {}
+        # sorted (rule set ID, version) pairs -> contract
+        self._contract_cache = collections.OrderedDict()
+        # (tenant ID, contract ID) -> (fingerprint of the last pushed
+        # contract, expiration time)
+        self._pushed_contracts = {}
         OdlMappingDriver.me = self
 
     @property
@@ -192,6 +219,7 @@ class OdlMappingDriver(api.ResourceMappingDriver):
     def delete_nat_pool_precommit(self, context):
         raise ExternalSegmentNotSupportedOnOdlDriver()
 
+    @odl_batch
     def create_policy_target_postcommit(self, context):
         super(OdlMappingDriver, self).create_policy_target_postcommit(context)
         pt = self._get_pt_detail(context)
@@ -208,6 +236,7 @@ class OdlMappingDriver(api.ResourceMappingDriver):
     def update_policy_target_precommit(self, context):
         raise UpdatePTNotSupportedOnOdlDriver()
 
+    @odl_batch
     def delete_policy_target_postcommit(self, context):
         pt = self._get_pt_detail(context)
         ep = {
@@ -237,6 +266,7 @@ class OdlMappingDriver(api.ResourceMappingDriver):
         }
         self.odl_manager.delete_l3_context(tenant_id, l3ctx)
 
+    @odl_batch
     def create_l2_policy_postcommit(self, context):
         super(OdlMappingDriver, self).create_l2_policy_postcommit(context)
         tenant_id = uuid.UUID(context.current['tenant_id']).urn[9:]
@@ -264,6 +294,7 @@ class OdlMappingDriver(api.ResourceMappingDriver):
     def update_l2_policy_precommit(self, context):
         raise UpdateL2PolicyNotSupportedOnOdlDriver()
 
+    @odl_batch
     def delete_l2_policy_postcommit(self, context):
         super(OdlMappingDriver, self).delete_l2_policy_postcommit(context)
         tenant_id = uuid.UUID(context.current['tenant_id']).urn[9:]
@@ -282,6 +313,17 @@ class OdlMappingDriver(api.ResourceMappingDriver):
         self.odl_manager.delete_l2_flood_domain(tenant_id, l2fd)
 
     def create_policy_target_group_postcommit(self, context):
+        try:
+            with self.odl_manager.batch():
+                self._create_policy_target_group_postcommit(context)
+        except Exception:
+            # The contracts may never have reached ODL, and the controller
+            # may have lost the ones pushed before: send all of them again
+            # next time
+            with excutils.save_and_reraise_exception():
+                self._pushed_contracts.clear()
+
+    def _create_policy_target_group_postcommit(self, context):
         super(OdlMappingDriver, self).create_policy_target_group_postcommit(
             context)
         tenant_id = uuid.UUID(context.current['tenant_id']).urn[9:]
@@ -303,18 +345,16 @@ class OdlMappingDriver(api.ResourceMappingDriver):
 
         if provided_contract:
             epg['provider-named-selector'] = {
-                "name": 'Contract-' + provided_contract['id'],
-                "contract": provided_contract['id']
+                "name": 'Contract-' + provided_contract[1]['id'],
+                "contract": provided_contract[1]['id']
             }
-            self.odl_manager.create_update_contract(tenant_id,
-                                                    provided_contract)
+            self._push_contract(tenant_id, provided_contract)
         if consumed_contract:
             epg['consumer-named-selector'] = {
-                "name": 'Contract-' + consumed_contract['id'],
-                "contract": consumed_contract['id']
+                "name": 'Contract-' + consumed_contract[1]['id'],
+                "contract": consumed_contract[1]['id']
             }
-            self.odl_manager.create_update_contract(tenant_id,
-                                                    consumed_contract)
+            self._push_contract(tenant_id, consumed_contract)
 
         self.odl_manager.create_update_endpoint_group(tenant_id, epg)
 
@@ -331,6 +371,19 @@ class OdlMappingDriver(api.ResourceMappingDriver):
             }
             self.odl_manager.create_update_subnet(tenant_id, odl_subnet)
 
+    def _push_contract(self, tenant_id, fingerprinted_contract):
+        # Contracts are only sent when their content changed since the last
+        # time they were pushed for the tenant, or when that push expired
+        fingerprint, contract = fingerprinted_contract
+        key = (tenant_id, contract['id'])
+        now = time.time()
+        pushed_fingerprint, expiration = self._pushed_contracts.get(
+            key, (None, 0))
+        if pushed_fingerprint == fingerprint and expiration > now:
+            return
+        self.odl_manager.create_update_contract(tenant_id, contract)
+        self._pushed_contracts[key] = (fingerprint, now + CONTRACT_PUSH_TTL)
+
     def _make_odl_contract_and_clause(self, context, rule_sets):
         # As no contract/clause in O.S., they will be generated dynamically
         # when rule sets are associated with PTG:
@@ -340,35 +393,57 @@ class OdlMappingDriver(api.ResourceMappingDriver):
         # 4. contract ID is generated based on the clause name
         # 5. As a combination of same rule sets produce same sorted subject
         #    names, consistent clause name and contract ID are guaranteed
+        # The contract is returned along with its fingerprint, the sorted
+        # versions of the rule sets it was generated from.
         contract = None
         if rule_sets:
-            subjects = []
-            subject_names = []
-            for rule_set_id in rule_sets:
-                # a subject is mapped to a rule set
-                subject = self._make_subject(context, rule_set_id)
-                subjects.append(subject)
-                subject_names.append(subject['name'])
-            clause_name = "-".join(sorted(subject_names)).encode('ascii',
-                                                                 'ignore')
-            contract_id = uuid.uuid3(uuid.NAMESPACE_DNS, clause_name).urn[9:]
-            clauses = [
-                {
-                    "name": clause_name,
-                    "subject-refs": subject_names
-                }
-            ]
-            contract = {
-                "id": contract_id,
-                "clause": clauses,
-                "subject": subjects
-            }
+            versioned = [self._get_subject(context, rule_set_id)
+                         for rule_set_id in rule_sets]
+            fingerprint = tuple(sorted(key for key, subject in versioned))
+            contract = self._contract_cache.pop(fingerprint, None)
+            if contract is None:
+                contract = self._build_contract(
+                    [subject for key, subject in versioned])
+            self._contract_cache[fingerprint] = contract
+            while len(self._contract_cache) > CONTRACT_CACHE_SIZE:
+                self._contract_cache.popitem(last=False)
+            contract = (fingerprint, contract)
         return contract
 
-    def _make_subject(self, context, rule_set_id):
+    def _build_contract(self, subjects):
+        subject_names = [subject['name'] for subject in subjects]
+        clause_name = "-".join(sorted(subject_names)).encode('ascii',
+                                                             'ignore')
+        contract_id = uuid.uuid3(uuid.NAMESPACE_DNS, clause_name).urn[9:]
+        clauses = [
+            {
+                "name": clause_name,
+                "subject-refs": subject_names
+            }
+        ]
+        return {
+            "id": contract_id,
+            "clause": clauses,
+            "subject": subjects
+        }
+
+    def _get_subject(self, context, rule_set_id):
+        # Rules, classifiers and actions can't be updated on this driver,
+        # therefore a subject only changes along with the name or the rules
+        # of its rule set.
         rule_set = context._plugin.get_policy_rule_set(
             context._plugin_context, rule_set_id
         )
+        version = (rule_set['name'], tuple(rule_set['policy_rules']))
+        cached = self._subject_cache.get(rule_set_id)
+        if cached and cached[0] == version:
+            subject = cached[1]
+        else:
+            subject = self._make_subject(context, rule_set)
+            self._subject_cache[rule_set_id] = (version, subject)
+        return (rule_set_id, version), subject
+
+    def _make_subject(self, context, rule_set):
         rules = []
         for rule_id in rule_set['policy_rules']:
             rule = self._make_odl_rule(context, rule_id)
@@ -417,6 +492,7 @@ class OdlMappingDriver(api.ResourceMappingDriver):
     def update_policy_target_group_precommit(self, context):
         raise UpdatePTGNotSupportedOnOdlDriver()
 
+    @odl_batch
     def delete_policy_target_group_postcommit(self, context):
         # TODO(ODL): delete contract if no one uses it
         tenant_id = uuid.UUID(context.current['tenant_id']).urn[9:]
@@ -479,6 +555,7 @@ class OdlMappingDriver(api.ResourceMappingDriver):
         # }
         # self.odl_manager.delete_action(tenant_id, action_instance)
 
+    @odl_batch
     def create_policy_classifier_postcommit(self, context):
         tenant_id = uuid.UUID(context.current['tenant_id']).urn[9:]
         classifiers = self._make_odl_classifiers(context.current)
@@ -552,6 +629,7 @@ class OdlMappingDriver(api.ResourceMappingDriver):
     def update_policy_classifier_precommit(self, context):
         raise UpdateClassifierNotSupportedOnOdlDriver()
 
+    @odl_batch
     def delete_policy_classifier_postcommit(self, context):
         tenant_id = uuid.UUID(context.current['tenant_id']).urn[9:]
 
@@ -570,6 +648,11 @@ class OdlMappingDriver(api.ResourceMappingDriver):
             }
             self.odl_manager.delete_classifier(tenant_id, classifier_instance)
 
+    def delete_policy_rule_set_postcommit(self, context):
+        super(OdlMappingDriver, self).delete_policy_rule_set_postcommit(
+            context)
+        self._subject_cache.pop(context.current['id'], None)
+
     def create_policy_rule_precommit(self, context):
         if ('policy_actions' in context.current and
                 len(context.current['policy_actions']) != 1):
@@ -14,12 +14,16 @@
 
 import copy
 import httplib
-import requests
+import time
 import urlparse
 
+import eventlet
+from eventlet import queue
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
+import requests
+from requests import adapters
 
 from gbpservice.neutron.services.grouppolicy.common import exceptions
 
@@ -38,6 +42,28 @@ SERVICE_CONTROLLER_OPTIONS = [
     cfg.StrOpt('api_version',
                default='1.0',
                help=_('One Convergence NVSD Service Controller API Version')),
+    cfg.IntOpt('pool_maxsize',
+               default=10,
+               help=_('Maximum number of connections kept open to the One '
+                      'Convergence NVSD Service Controller')),
+    cfg.FloatOpt('retry_backoff',
+                 default=0.5,
+                 help=_('Seconds to wait before the first retry of a failed '
+                        'idempotent request, doubled at every attempt')),
+    cfg.BoolOpt('async_dispatch',
+                default=False,
+                help=_('Send the endpoint updates and deletes to the NVSD '
+                       'Service Controller in the background. Failures are '
+                       'then only logged, and not reported to the API '
+                       'caller. The policy drivers still create the '
+                       'endpoints synchronously')),
+    cfg.IntOpt('async_workers',
+               default=4,
+               help=_('Number of workers sending the background requests')),
+    cfg.IntOpt('async_batch_size',
+               default=20,
+               help=_('Maximum number of background requests a worker '
+                      'acknowledges at once')),
 ]
 
 cfg.CONF.register_opts(SERVICE_CONTROLLER_OPTIONS, "NVSD_SERVICE_CONTROLLER")
@@ -56,6 +82,12 @@ NVSD_SERVICE = "/service"
 ADMIN_URL = "&is_admin=true"
 API_TENANT_USER = "?tenant_id=%s&user_id=%s"
 
+# Only these methods are safe to send again after a failure
+IDEMPOTENT_METHODS = ('GET', 'PUT', 'DELETE')
+RETRY_STATUS_CODES = (requests.codes.bad_gateway,
+                      requests.codes.service_unavailable,
+                      requests.codes.gateway_timeout)
+
 
 class GroupPolicyException(exceptions.GroupPolicyException):
     """Base for policy driver exceptions returned to user."""
@@ -74,11 +106,16 @@ class NVSDServiceController(object):
 
         self._host = cfg.CONF.NVSD_SERVICE_CONTROLLER.service_controller_ip
         self._port = cfg.CONF.NVSD_SERVICE_CONTROLLER.service_controller_port
-        self._retries = cfg.CONF.NVSD_SERVICE_CONTROLLER.request_retries
+        self._retries = int(cfg.CONF.NVSD_SERVICE_CONTROLLER.request_retries
+                            or 0)
+        self._retry_backoff = cfg.CONF.NVSD_SERVICE_CONTROLLER.retry_backoff
         self._request_timeout = float(cfg.CONF.NVSD_SERVICE_CONTROLLER.
                                       request_timeout)
         self.service_api_url = 'http://' + self._host + ':' + str(self._port)
         self.pool = requests.Session()
+        self.pool.mount('http://', adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=cfg.CONF.NVSD_SERVICE_CONTROLLER.pool_maxsize))
 
     def do_request(self, method, url=None, headers=None, data=None,
                    timeout=10):
@@ -102,19 +139,30 @@ class NVSDServiceController(object):
         url = urlparse.urljoin(self.service_api_url, uri)
 
         response = None
-
-        try:
-            response = self.do_request(method, url=url, headers=headers,
-                                       data=body,
-                                       timeout=self._request_timeout)
-
-            LOG.debug("Request: %(method)s %(uri)s executed",
-                      {'method': method, 'uri': self.service_api_url + uri})
-        except httplib.IncompleteRead as err:
-            response = err.partial
-        except Exception as err:
-            LOG.error(_("Request failed in NVSD Service Controller. "
-                        "Error : %s"), err)
+        attempts = 1 + (self._retries if method in IDEMPOTENT_METHODS else 0)
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(self._retry_backoff * 2 ** (attempt - 1))
+                LOG.debug("Retrying %(method)s %(uri)s, attempt %(attempt)s",
+                          {'method': method, 'uri': uri,
+                           'attempt': attempt + 1})
+            response = None
+            try:
+                response = self.do_request(method, url=url, headers=headers,
+                                           data=body,
+                                           timeout=self._request_timeout)
+
+                LOG.debug("Request: %(method)s %(uri)s executed",
+                          {'method': method,
+                           'uri': self.service_api_url + uri})
+            except httplib.IncompleteRead as err:
+                response = err.partial
+            except Exception as err:
+                LOG.error(_("Request failed in NVSD Service Controller. "
+                            "Error : %s"), err)
+            if (response is not None and
+                    response.status_code not in RETRY_STATUS_CODES):
+                break
 
         if response is None:
             # Request was timed out.
@@ -142,6 +190,57 @@ class NVSDServiceController(object):
         return response
 
 
+class AsyncDispatcher(object):
+    """Sends NVSD Service Controller requests in the background.
+
+    Requests are spread over the workers by resource ID, so that the
+    requests for the same resource are sent in order. Each worker takes up
+    to batch_size pending requests at a time, sends them over the pooled
+    connections and acknowledges them together.
+    """
+
+    def __init__(self, workers, batch_size):
+        self._batch_size = max(batch_size, 1)
+        self._queues = [queue.Queue() for x in range(max(workers, 1))]
+        self.acknowledged = 0
+        self.failed = 0
+        self._workers = eventlet.GreenPool(len(self._queues))
+        for request_queue in self._queues:
+            self._workers.spawn_n(self._run, request_queue)
+
+    def dispatch(self, resource_id, func, *args):
+        self._queues[hash(resource_id) % len(self._queues)].put((func, args))
+
+    def wait(self):
+        """Block until all the dispatched requests are acknowledged."""
+        for request_queue in self._queues:
+            request_queue.join()
+
+    def _run(self, request_queue):
+        while True:
+            batch = [request_queue.get()]
+            while len(batch) < self._batch_size:
+                try:
+                    batch.append(request_queue.get_nowait())
+                except queue.Empty:
+                    break
+            failed = 0
+            for func, args in batch:
+                try:
+                    func(*args)
+                except Exception:
+                    LOG.exception(_("Background request to NVSD Service "
+                                    "Controller failed"))
+                    failed += 1
+            self.acknowledged += len(batch) - failed
+            self.failed += failed
+            LOG.debug("Acknowledged %(count)s NVSD requests, %(failed)s "
+                      "failed", {'count': len(batch) - failed,
+                                 'failed': failed})
+            for x in batch:
+                request_queue.task_done()
+
+
 class NVSDServiceApi(object):
     """Invokes One Convergence NVSD Service Controller API.
 
@@ -152,6 +251,18 @@ class NVSDServiceApi(object):
 
     def __init__(self):
         self.nvsd_service_controller = NVSDServiceController()
+        self.dispatcher = None
+        if cfg.CONF.NVSD_SERVICE_CONTROLLER.async_dispatch:
+            self.dispatcher = AsyncDispatcher(
+                cfg.CONF.NVSD_SERVICE_CONTROLLER.async_workers,
+                cfg.CONF.NVSD_SERVICE_CONTROLLER.async_batch_size)
+
+    def _dispatch(self, resource_id, func, *args):
+        # Endpoint requests are queued when dispatching asynchronously
+        if self.dispatcher:
+            self.dispatcher.dispatch(resource_id, func, *args)
+        else:
+            return func(*args)
 
     def create_policy_classifier(self, context, policy_classifier):
         body = copy.deepcopy(policy_classifier)
@@ -313,7 +424,15 @@ class NVSDServiceApi(object):
                (endpointgroup_id, context.tenant_id, context.user))
         self.nvsd_service_controller.request("DELETE", uri, context)
 
-    def create_endpoint(self, context, endpoint):
+    def create_endpoint(self, context, endpoint, wait=False):
+        # The request is sent right away when the caller needs the response,
+        # e.g. for the ID the Service Controller assigned to the endpoint
+        if wait or not endpoint.get('id'):
+            return self._create_endpoint(context, endpoint)
+        return self._dispatch(endpoint['id'], self._create_endpoint, context,
+                              endpoint)
+
+    def _create_endpoint(self, context, endpoint):
         body = copy.deepcopy(endpoint)
         body.update({'connectivity_portgroup_id':
                      endpoint.get('policy_target_group_id')})
@@ -326,6 +445,10 @@ class NVSDServiceApi(object):
         return response.json()
 
     def update_endpoint(self, context, endpoint):
+        return self._dispatch(endpoint['id'], self._update_endpoint, context,
+                              endpoint)
+
+    def _update_endpoint(self, context, endpoint):
         tenant_id = context.tenant_id
         endpoint_id = endpoint.get('id')
         body = copy.deepcopy(endpoint)
@@ -351,6 +474,10 @@ class NVSDServiceApi(object):
         return response.json()
 
     def delete_endpoint(self, context, endpoint_id):
+        self._dispatch(endpoint_id, self._delete_endpoint, context,
+                       endpoint_id)
+
+    def _delete_endpoint(self, context, endpoint_id):
         uri = (NVSD_ENDPOINT + "/%s?tenant_id=%s&user_id=%s" %
                (endpoint_id, context.tenant_id, context.user))
         self.nvsd_service_controller.request("DELETE", uri, context)
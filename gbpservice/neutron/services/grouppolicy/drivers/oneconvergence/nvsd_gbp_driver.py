@@ -45,8 +45,9 @@ class NvsdGbpDriver(res_map.ResourceMappingDriver):
     def create_policy_target_postcommit(self, context):
         super(NvsdGbpDriver, self).create_policy_target_postcommit(context)
         try:
+            # Sent right away, the PT is rolled back when it fails
             self.nvsd_api.create_endpoint(context._plugin_context,
-                                          context.current)
+                                          context.current, wait=True)
         except Exception:
             with excutils.save_and_reraise_exception():
                 super(NvsdGbpDriver,
@@ -10,6 +10,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import eventlet
 import netaddr
 
 from neutron.api.rpc.agentnotifiers import dhcp_rpc_agent_api
@@ -26,12 +27,15 @@ from neutron import manager
 from neutron.notifiers import nova
 from neutron.plugins.common import constants as pconst
 from oslo_config import cfg
+from oslo_db import exception as db_exc
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
+from oslo_utils import excutils
 import sqlalchemy as sa
 
 from gbpservice.common import utils
 from gbpservice.neutron.db.grouppolicy import group_policy_db as gpdb
+from gbpservice.neutron.db.grouppolicy import group_policy_mapping_db as gpmdb
 from gbpservice.neutron.db import servicechain_db  # noqa
 from gbpservice.neutron.extensions import group_policy as gp_ext
 from gbpservice.neutron.extensions import servicechain as sc_ext
@@ -39,10 +43,43 @@ from gbpservice.neutron.services.grouppolicy import (
     group_policy_driver_api as api)
 from gbpservice.neutron.services.grouppolicy.common import constants as gconst
 from gbpservice.neutron.services.grouppolicy.common import exceptions as exc
+from gbpservice.neutron.services.grouppolicy.common import ip_bitmap
+from gbpservice.neutron.services.grouppolicy.common import ip_index
+from gbpservice.neutron.services.grouppolicy.common import mapping_cache
 
 
 LOG = logging.getLogger(__name__)
 
+opts = [
+    cfg.IntOpt('port_pool_low_water_mark',
+               default=0,
+               help=_("Number of pre-created ports kept available for each "
+                      "policy target group, so that implicit policy target "
+                      "ports don't need to be created on the spot. The pool "
+                      "is refilled in the background whenever it drops "
+                      "below this mark. 0 disables the pool.")),
+    cfg.IntOpt('port_pool_max_size',
+               default=32,
+               help=_("Maximum number of ports in the pool of each policy "
+                      "target group. The ports of deleted policy targets "
+                      "are returned to the pool until it reaches this "
+                      "size, and deleted afterwards.")),
+    cfg.IntOpt('nat_pool_fip_prealloc',
+               default=0,
+               help=_("Number of spare floating IPs preallocated for each "
+                      "NAT pool and tenant, so that policy targets get their "
+                      "floating IP without creating it. Released floating "
+                      "IPs are kept as spares up to this number.")),
+    cfg.IntOpt('service_ips_per_subnet',
+               default=4,
+               help=_("Number of addresses at the end of each implicit "
+                      "policy target group subnet which are left out of its "
+                      "allocation pool, for the service IPs of network "
+                      "service policies.")),
+]
+
+cfg.CONF.register_opts(opts, "resource_mapping")
+
 
 class OwnedPort(model_base.BASEV2):
     """A Port owned by the resource_mapping driver."""
@@ -53,6 +90,18 @@ class OwnedPort(model_base.BASEV2):
                         nullable=False, primary_key=True)
 
 
+class PooledPort(model_base.BASEV2):
+    """An owned Port ready to be used by a new PT of the PTG."""
+
+    __tablename__ = 'gpm_ptg_pooled_ports'
+    port_id = sa.Column(sa.String(36),
+                        sa.ForeignKey('ports.id', ondelete='CASCADE'),
+                        nullable=False, primary_key=True)
+    # No FK, the ports are drained after the PTG is gone
+    policy_target_group_id = sa.Column(sa.String(36), nullable=False,
+                                       index=True)
+
+
 class OwnedSubnet(model_base.BASEV2):
     """A Subnet owned by the resource_mapping driver."""
 
@@ -80,6 +129,19 @@ class OwnedRouter(model_base.BASEV2):
                           nullable=False, primary_key=True)
 
 
+class PTGDefaultSecurityGroup(model_base.BASEV2):
+    """The default SG of a PTG."""
+
+    __tablename__ = 'gpm_ptg_default_sgs'
+    # No FK, the SG is deleted after the PTG
+    policy_target_group_id = sa.Column(sa.String(36), nullable=False,
+                                       primary_key=True)
+    security_group_id = sa.Column(sa.String(36),
+                                  sa.ForeignKey('securitygroups.id',
+                                                ondelete='CASCADE'),
+                                  nullable=False, unique=True)
+
+
 class PolicyRuleSetSGsMapping(model_base.BASEV2):
     """PolicyRuleSet to SGs mapping DB."""
 
@@ -101,9 +163,9 @@ class PtgServiceChainInstanceMapping(model_base.BASEV2):
     provider_ptg_id = sa.Column(sa.String(36),
                                 sa.ForeignKey('gp_policy_target_groups.id',
                                               ondelete='CASCADE'),
-                                nullable=False)
+                                nullable=False, index=True)
     # Consumer PTG could be an External Policy
-    consumer_ptg_id = sa.Column(sa.String(36), nullable=False)
+    consumer_ptg_id = sa.Column(sa.String(36), nullable=False, index=True)
     servicechain_instance_id = sa.Column(sa.String(36),
                                          sa.ForeignKey('sc_instances.id',
                                                        ondelete='CASCADE'),
@@ -123,6 +185,20 @@ class ServicePolicyPTGIpAddressMapping(model_base.BASEV2):
     ipaddress = sa.Column(sa.String(36))
 
 
+class PTGReservedIPAddress(model_base.BASEV2):
+    """An address of a PTG subnet reserved for a service."""
+
+    __tablename__ = 'gpm_ptg_reserved_ip_addresses'
+    subnet_id = sa.Column(sa.String(36),
+                          sa.ForeignKey('subnets.id', ondelete='CASCADE'),
+                          nullable=False, primary_key=True)
+    ip_address = sa.Column(sa.String(64), nullable=False, primary_key=True)
+    policy_target_group_id = sa.Column(
+        sa.String(36), sa.ForeignKey('gp_policy_target_groups.id',
+                                     ondelete='CASCADE'),
+        nullable=False, index=True)
+
+
 class ServicePolicyPTGFipMapping(model_base.BASEV2):
     """Service Policy to FIP Address mapping DB."""
 
@@ -142,6 +218,23 @@ class ServicePolicyPTGFipMapping(model_base.BASEV2):
                               primary_key=True)
 
 
+class NATPoolFloatingIP(model_base.BASEV2, models_v2.HasTenant):
+    """A Floating IP allocated from a NAT pool."""
+
+    __tablename__ = 'gpm_nat_pool_floatingips'
+    floatingip_id = sa.Column(sa.String(36),
+                              sa.ForeignKey('floatingips.id',
+                                            ondelete='CASCADE'),
+                              nullable=False, primary_key=True)
+    nat_pool_id = sa.Column(sa.String(36),
+                            sa.ForeignKey('gp_nat_pools.id',
+                                          ondelete='CASCADE'),
+                            nullable=False, index=True)
+    floating_ip_address = sa.Column(sa.String(64), nullable=False)
+    # Spare Floating IPs are not used by any PT or PTG
+    available = sa.Column(sa.Boolean, nullable=False, default=False)
+
+
 class PolicyTargetFloatingIPMapping(model_base.BASEV2):
     """Mapping of PolicyTarget to Floating IP."""
     __tablename__ = 'gpm_pt_floatingip_mappings'
@@ -167,6 +260,8 @@ class ResourceMappingDriver(api.PolicyDriver):
     def initialize(self):
         self._cached_agent_notifier = None
         self._nova_notifier = nova.Notifier()
+        self._refilling_port_pools = set()
+        self._nat_pool_bitmaps = {}
 
     def _reject_shared(self, object, type):
         if object.get('shared'):
@@ -286,6 +381,21 @@ class ResourceMappingDriver(api.PolicyDriver):
                                  context.current['policy_target_group_id'])
         self._associate_fip_to_pt(context)
 
+    @log.log
+    def create_policy_target_bulk_postcommit(self, contexts):
+        # Create all the implicit ports of a PTG and tenant at once, the rest
+        # of the postcommit (overridden by the subclasses) runs per PT.
+        implicit = {}
+        for context in contexts:
+            if not context.current['port_id']:
+                implicit.setdefault(
+                    (context.current['policy_target_group_id'],
+                     context.current['tenant_id']), []).append(context)
+        for ptg_contexts in implicit.values():
+            self._use_implicit_ports(ptg_contexts)
+        for context in contexts:
+            self.create_policy_target_postcommit(context)
+
     def _associate_fip_to_pt(self, context):
         ptg_id = context.current['policy_target_group_id']
         ptg = context._plugin.get_policy_target_group(
@@ -339,19 +449,176 @@ class ResourceMappingDriver(api.PolicyDriver):
             return fip_ids
 
         for es in external_segments:
-            ext_sub = self._core_plugin.get_subnet(context._plugin_context,
-                                                   es['subnet_id'])
-            ext_net_id = ext_sub['network_id']
-            # REVISIT(Magesh): Allocate floating IP from the Nat Pool in Kilo
             try:
-                fip_id = self._create_floatingip(
-                                        context, ext_net_id, fixed_port)
-                fip_ids.append(fip_id)
+                fip_id = self._allocate_nat_pool_fip(context, es, fixed_port)
             except Exception:
-                # TODO(Magesh): catch no free ip exception
                 LOG.exception(_("Floating allocation failed"))
+                continue
+            if fip_id:
+                fip_ids.append(fip_id)
+            else:
+                LOG.error(_("No free address left in the NAT pools of "
+                            "external segment %s"), es['id'])
         return fip_ids
 
+    def _allocate_nat_pool_fip(self, context, es, fixed_port=None):
+        """Allocate a FIP from the NAT pools of the ES, lowest pool first.
+
+        A spare FIP of the NAT pool is used if there is one, otherwise the
+        FIP is created together with the configured number of spares.
+        """
+        plugin_context = context._plugin_context
+        ext_sub = self._core_plugin.get_subnet(plugin_context,
+                                               es['subnet_id'])
+        nat_pools = context._plugin.get_nat_pools(
+            plugin_context, filters={'id': es['nat_pools']})
+        nat_pools.sort(key=lambda x: netaddr.IPNetwork(x['ip_pool']).first)
+        for nat_pool in nat_pools:
+            fip_id = self._take_spare_fip(plugin_context.session,
+                                          nat_pool['id'],
+                                          context.current['tenant_id'])
+            if fip_id:
+                if fixed_port:
+                    try:
+                        self._update_fip(plugin_context, fip_id,
+                                         {'port_id': fixed_port})
+                    except Exception:
+                        with excutils.save_and_reraise_exception():
+                            self._set_fip_available(plugin_context.session,
+                                                    fip_id)
+                return fip_id
+            fip_ids = self._create_nat_pool_fips(
+                context, nat_pool, ext_sub,
+                1 + cfg.CONF.resource_mapping.nat_pool_fip_prealloc,
+                fixed_port)
+            if fip_ids:
+                return fip_ids[0]
+
+    def _take_spare_fip(self, session, nat_pool_id, tenant_id):
+        with session.begin(subtransactions=True):
+            spare = (session.query(NATPoolFloatingIP).
+                     filter_by(nat_pool_id=nat_pool_id, tenant_id=tenant_id,
+                               available=True).
+                     with_lockmode('update').first())
+            if spare:
+                spare.available = False
+                return spare.floatingip_id
+
+    def _set_fip_available(self, session, fip_id):
+        with session.begin(subtransactions=True):
+            session.query(NATPoolFloatingIP).filter_by(
+                floatingip_id=fip_id).update({'available': True})
+
+    def _create_nat_pool_fips(self, context, nat_pool, ext_sub, count,
+                              fixed_port=None):
+        """Create up to count FIPs with the lowest free NAT pool addresses.
+
+        The first FIP is associated to fixed_port, the others are spares.
+        """
+        bitmap = self._get_nat_pool_bitmap(nat_pool, ext_sub)
+        refreshed = False
+        fips = []
+        while len(fips) < count:
+            address = bitmap.allocate()
+            if not address:
+                if refreshed or fips:
+                    break
+                # Addresses may have been freed behind our back
+                bitmap = self._get_nat_pool_bitmap(nat_pool, ext_sub,
+                                                   refresh=True)
+                refreshed = True
+                continue
+            try:
+                fip_id = self._create_floatingip(
+                    context, ext_sub['network_id'],
+                    None if fips else fixed_port,
+                    floating_ip_address=address)
+            except n_exc.IpAddressInUse:
+                # Taken by another server, the address stays reserved
+                continue
+            except Exception:
+                bitmap.release(address)
+                if fips:
+                    # Keep the FIPs created so far
+                    LOG.exception(_("Spare floating IP allocation failed"))
+                    break
+                raise
+            fips.append((fip_id, address))
+
+        session = context._plugin_context.session
+        with session.begin(subtransactions=True):
+            for index, (fip_id, address) in enumerate(fips):
+                session.add(NATPoolFloatingIP(
+                    floatingip_id=fip_id, nat_pool_id=nat_pool['id'],
+                    tenant_id=context.current['tenant_id'],
+                    floating_ip_address=address, available=index > 0))
+        return [x[0] for x in fips]
+
+    def _get_nat_pool_bitmap(self, nat_pool, ext_sub, refresh=False):
+        bitmap = self._nat_pool_bitmaps.get(nat_pool['id'])
+        if (refresh or not bitmap or
+                bitmap.cidr != str(netaddr.IPNetwork(
+                    nat_pool['ip_pool']).cidr)):
+            # Every address in use on the external network belongs to a port
+            ports = self._core_plugin.get_ports(
+                n_context.get_admin_context(),
+                filters={'network_id': [ext_sub['network_id']]},
+                fields=['fixed_ips'])
+            used = [x['ip_address'] for port in ports
+                    for x in port['fixed_ips']]
+            cidr = netaddr.IPNetwork(ext_sub['cidr'])
+            used.append(cidr.network)
+            if cidr.version == 4 and cidr.broadcast:
+                used.append(cidr.broadcast)
+            if ext_sub['gateway_ip']:
+                used.append(ext_sub['gateway_ip'])
+            bitmap = ip_bitmap.IPBitmap(nat_pool['ip_pool'], used)
+            self._nat_pool_bitmaps[nat_pool['id']] = bitmap
+        return bitmap
+
+    def _release_floating_ips(self, plugin_context, fip_ids):
+        """Keep the NAT pool FIPs as spares if needed, delete the others.
+
+        Spares are kept up to nat_pool_fip_prealloc per NAT pool and tenant.
+        """
+        if not fip_ids:
+            return
+        session = plugin_context.session
+        with session.begin(subtransactions=True):
+            allocated = dict(
+                (x.floatingip_id, ((x.nat_pool_id, x.tenant_id),
+                                   x.floating_ip_address))
+                for x in session.query(NATPoolFloatingIP).filter(
+                    NATPoolFloatingIP.floatingip_id.in_(fip_ids)))
+            spares = {}
+            if allocated:
+                spares = dict(
+                    ((nat_pool_id, tenant_id), count)
+                    for nat_pool_id, tenant_id, count in session.query(
+                        NATPoolFloatingIP.nat_pool_id,
+                        NATPoolFloatingIP.tenant_id, sa.func.count()).filter(
+                            NATPoolFloatingIP.nat_pool_id.in_(
+                                set(x[0][0] for x in allocated.values())),
+                            NATPoolFloatingIP.available == sa.true()).group_by(
+                                NATPoolFloatingIP.nat_pool_id,
+                                NATPoolFloatingIP.tenant_id))
+        max_spares = cfg.CONF.resource_mapping.nat_pool_fip_prealloc
+        for fip_id in fip_ids:
+            key, address = allocated.get(fip_id, (None, None))
+            if key and spares.get(key, 0) < max_spares:
+                try:
+                    self._update_fip(plugin_context, fip_id,
+                                     {'port_id': None})
+                except l3.FloatingIPNotFound:
+                    continue
+                self._set_fip_available(session, fip_id)
+                spares[key] = spares.get(key, 0) + 1
+                continue
+            self._delete_fip(plugin_context, fip_id)
+            bitmap = key and self._nat_pool_bitmaps.get(key[0])
+            if bitmap:
+                bitmap.release(address)
+
     @log.log
     def update_policy_target_precommit(self, context):
         if (context.current['policy_target_group_id'] !=
@@ -364,21 +631,40 @@ class ResourceMappingDriver(api.PolicyDriver):
 
     @log.log
     def delete_policy_target_precommit(self, context):
+        session = context._plugin_context.session
         context.fips = self._get_pt_floating_ip_mapping(
-                    context._plugin_context.session,
-                    context.current['id'])
+                    session, context.current['id'])
+        if not hasattr(context, 'owned_port_ids'):
+            context.owned_port_ids = self._get_owned_port_ids(
+                session, [context.current['port_id']])
 
     @log.log
     def delete_policy_target_postcommit(self, context):
-        sg_list = self._generate_list_of_sg_from_ptg(
-            context, context.current['policy_target_group_id'])
-        self._disassoc_sgs_from_port(context._plugin_context,
-                                     context.current['port_id'], sg_list)
         port_id = context.current['port_id']
-        for fip in context.fips:
-            self._delete_fip(context._plugin_context,
-                             fip.floatingip_id)
-        self._cleanup_port(context._plugin_context, port_id)
+        # Owned ports are deleted below, their SGs are left untouched
+        if port_id not in context.owned_port_ids:
+            sg_list = self._generate_list_of_sg_from_ptg(
+                context, context.current['policy_target_group_id'])
+            self._disassoc_sgs_from_port(context._plugin_context, port_id,
+                                         sg_list)
+        self._release_floating_ips(context._plugin_context,
+                                   [x.floatingip_id for x in context.fips])
+        if port_id in context.owned_port_ids and not (
+                self._return_port_to_pool(
+                    context._plugin_context, port_id,
+                    context.current['policy_target_group_id'])):
+            self._delete_owned_ports(context._plugin_context, [port_id])
+
+    @log.log
+    def delete_policy_target_bulk_precommit(self, contexts):
+        # The ownership of all the ports is checked at once, the rest of the
+        # precommit (overridden by the subclasses) runs per PT.
+        owned_port_ids = self._get_owned_port_ids(
+            contexts[0]._plugin_context.session,
+            [x.current['port_id'] for x in contexts]) if contexts else set()
+        for context in contexts:
+            context.owned_port_ids = owned_port_ids
+            self.delete_policy_target_precommit(context)
 
     @log.log
     def create_policy_target_group_precommit(self, context):
@@ -408,6 +694,7 @@ class ResourceMappingDriver(api.PolicyDriver):
                                             context.current['id'],
                                             context.current['tenant_id'],
                                             context.current['subnets'])
+        self._schedule_port_pool_refill(context.current['id'])
 
     def _validate_nat_pool_for_nsp(self, context):
         network_service_policy_id = context.current.get(
@@ -477,17 +764,13 @@ class ResourceMappingDriver(api.PolicyDriver):
         for nsp_parameter in nsp_params:
             if (nsp_parameter["type"] == "ip_single" and
                 nsp_parameter["value"] == "self_subnet"):
-                # TODO(Magesh):Handle concurrency issues
-                free_ip = self._get_last_free_ip(context._plugin_context,
-                                                 context.current['subnets'])
+                free_ip = self._reserve_service_ip(context._plugin_context,
+                                                   context.current)
                 if not free_ip:
                     LOG.error(_("Reserving IP Addresses failed for Network "
                                 "Service Policy. No more IP Addresses on "
                                 "subnet"))
                     return
-                # TODO(Magesh):Fetch subnet from PTG to which NSP is attached
-                self._remove_ip_from_allocation_pool(
-                    context, context.current['subnets'][0], free_ip)
                 self._set_policy_ipaddress_mapping(
                     context._plugin_context.session,
                     network_service_policy_id,
@@ -530,26 +813,25 @@ class ResourceMappingDriver(api.PolicyDriver):
         if not ipaddress:
             ipaddress = self._get_ptg_policy_ipaddress_mapping(
                 context._plugin_context.session, ptg['id'])
-        if ipaddress and ptg['subnets']:
-            # TODO(rkukura): Loop on subnets?
-            self._restore_ip_to_allocation_pool(
-                context, ptg['subnets'][0], ipaddress.ipaddress)
+        if ipaddress:
+            self._release_service_ip(context._plugin_context.session,
+                                     ptg['id'], ipaddress.ipaddress)
             self._delete_policy_ipaddress_mapping(
                 context._plugin_context.session, ptg['id'])
         if not fip_maps:
             fip_maps = self._get_ptg_policy_fip_mapping(
                 context._plugin_context.session, ptg['id'])
-        for fip_map in fip_maps:
-            self._delete_fip(context._plugin_context, fip_map.floatingip_id)
+        self._release_floating_ips(context._plugin_context,
+                                   [x.floatingip_id for x in fip_maps])
         self._delete_ptg_policy_fip_mapping(
             context._plugin_context.session, ptg['id'])
 
         for pt in ptg['policy_targets']:
             pt_fip_maps = self._get_pt_floating_ip_mapping(
                     context._plugin_context.session, pt)
-            for pt_fip_map in pt_fip_maps:
-                self._delete_fip(context._plugin_context,
-                                 pt_fip_map.floatingip_id)
+            self._release_floating_ips(
+                context._plugin_context,
+                [x.floatingip_id for x in pt_fip_maps])
             self._delete_pt_floating_ip_mapping(
                 context._plugin_context.session, pt)
 
@@ -721,8 +1003,8 @@ class ResourceMappingDriver(api.PolicyDriver):
 
         l2p_id = context.current['l2_policy_id']
         router_id = self._get_routerid_for_l2policy(context, l2p_id)
-        for subnet_id in context.current['subnets']:
-            self._cleanup_subnet(context._plugin_context, subnet_id, router_id)
+        self._cleanup_subnets(context._plugin_context,
+                              context.current['subnets'], router_id)
         self._delete_default_security_group(
             context._plugin_context, context.current['id'],
             context.current['tenant_id'])
@@ -768,8 +1050,7 @@ class ResourceMappingDriver(api.PolicyDriver):
         l3ps = context._plugin.get_l3_policies(
             context._plugin_context, {'tenant_id': [curr['tenant_id']]})
         subnets = [x['ip_pool'] for x in l3ps if x['id'] != curr['id']]
-        current_set = netaddr.IPSet(subnets)
-        if netaddr.IPSet([curr['ip_pool']]) & current_set:
+        if ip_index.CIDRIndex(subnets).overlaps(curr['ip_pool']):
             raise exc.OverlappingIPPoolsInSameTenantNotAllowed(
                 ip_pool=curr['ip_pool'], overlapping_pools=subnets)
         # In Neutron, one external gateway per router is allowed. Therefore
@@ -825,8 +1106,8 @@ class ResourceMappingDriver(api.PolicyDriver):
 
     @log.log
     def delete_l3_policy_postcommit(self, context):
-        for router_id in context.current['routers']:
-            self._cleanup_router(context._plugin_context, router_id)
+        self._cleanup_routers(context._plugin_context,
+                              context.current['routers'])
         self._process_remove_l3p_ip_pool(context, context.current['ip_pool'])
 
     @log.log
@@ -1236,10 +1517,38 @@ class ResourceMappingDriver(api.PolicyDriver):
         else:
             self._reject_nat_pool_external_segment_cidr_mismatch(context)
 
+    def update_nat_pool_postcommit(self, context):
+        if context.original['ip_pool'] != context.current['ip_pool']:
+            self._delete_spare_fips(context._plugin_context,
+                                    context.current['id'])
+
     def delete_nat_pool_precommit(self, context):
         nsps_using_nat_pool = self._get_nsps_using_nat_pool(context)
         if nsps_using_nat_pool:
             raise exc.NatPoolinUseByNSP()
+        session = context._plugin_context.session
+        with session.begin(subtransactions=True):
+            context.spare_fips = [x.floatingip_id for x in session.query(
+                NATPoolFloatingIP).filter_by(nat_pool_id=context.current['id'],
+                                             available=True)]
+
+    def delete_nat_pool_postcommit(self, context):
+        self._nat_pool_bitmaps.pop(context.current['id'], None)
+        for fip_id in context.spare_fips:
+            self._delete_fip(context._plugin_context, fip_id)
+
+    def _delete_spare_fips(self, plugin_context, nat_pool_id):
+        session = plugin_context.session
+        with session.begin(subtransactions=True):
+            spares = (session.query(NATPoolFloatingIP).
+                      filter_by(nat_pool_id=nat_pool_id, available=True).
+                      with_lockmode('update').all())
+            fip_ids = [x.floatingip_id for x in spares]
+            for spare in spares:
+                session.delete(spare)
+        self._nat_pool_bitmaps.pop(nat_pool_id, None)
+        for fip_id in fip_ids:
+            self._delete_fip(plugin_context, fip_id)
 
     def _reject_nat_pool_external_segment_cidr_mismatch(self, context):
         external_segment = context._plugin.get_external_segment(
@@ -1331,34 +1640,188 @@ class ResourceMappingDriver(api.PolicyDriver):
         return l3p['routers'][0]
 
     def _use_implicit_port(self, context):
+        self._use_implicit_ports([context])
+
+    def _use_implicit_ports(self, contexts):
+        """Create the implicit ports of several PTs of a PTG and tenant."""
+        context = contexts[0]
         ptg_id = context.current['policy_target_group_id']
         ptg = context._plugin.get_policy_target_group(
             context._plugin_context, ptg_id)
-        l2p_id = ptg['l2_policy_id']
-        l2p = context._plugin.get_l2_policy(context._plugin_context, l2p_id)
+        if context.current['tenant_id'] == ptg['tenant_id']:
+            pooled = self._take_pooled_ports(context._plugin_context, ptg_id,
+                                             len(contexts))
+            for pt_context, port_id in zip(contexts, pooled):
+                # Named like the ports created on the spot
+                self._update_port(context._plugin_context, port_id,
+                                  {'name': 'pt_' + pt_context.current['name']})
+                pt_context.set_port_id(port_id)
+            contexts = contexts[len(pooled):]
+            if not contexts:
+                return
+        l2p = context._plugin.get_l2_policy(context._plugin_context,
+                                            ptg['l2_policy_id'])
         sg_id = self._get_default_security_group(
             context._plugin_context, ptg_id, context.current['tenant_id'])
-        attrs = {'tenant_id': context.current['tenant_id'],
-                 'name': 'pt_' + context.current['name'],
-                 'network_id': l2p['network_id'],
-                 'mac_address': attributes.ATTR_NOT_SPECIFIED,
-                 'fixed_ips': attributes.ATTR_NOT_SPECIFIED,
-                 'device_id': '',
-                 'device_owner': '',
-                 'security_groups': [sg_id] if sg_id else None,
-                 'admin_state_up': True}
-        port = self._create_port(context._plugin_context, attrs)
-        port_id = port['id']
-        self._mark_port_owned(context._plugin_context.session, port_id)
-        context.set_port_id(port_id)
-
-    def _cleanup_port(self, plugin_context, port_id):
-        if self._port_is_owned(plugin_context.session, port_id):
+        attrs_list = [{'tenant_id': x.current['tenant_id'],
+                       'name': 'pt_' + x.current['name'],
+                       'network_id': l2p['network_id'],
+                       'mac_address': attributes.ATTR_NOT_SPECIFIED,
+                       'fixed_ips': attributes.ATTR_NOT_SPECIFIED,
+                       'device_id': '',
+                       'device_owner': '',
+                       'security_groups': [sg_id] if sg_id else None,
+                       'admin_state_up': True} for x in contexts]
+        ports = self._create_ports(context._plugin_context, attrs_list)
+        for pt_context, port in zip(contexts, ports):
+            self._mark_port_owned(context._plugin_context.session, port['id'])
+            pt_context.set_port_id(port['id'])
+
+    def _cleanup_ports(self, plugin_context, port_ids):
+        owned = self._get_owned_port_ids(plugin_context.session, port_ids)
+        self._delete_owned_ports(plugin_context,
+                                 [x for x in port_ids if x in owned])
+
+    def _delete_owned_ports(self, plugin_context, port_ids):
+        for port_id in port_ids:
             try:
                 self._delete_port(plugin_context, port_id)
             except n_exc.PortNotFound:
                 LOG.warn(_("Port %s is missing") % port_id)
 
+    def _get_pooled_port_ids(self, session, ptg_id):
+        with session.begin(subtransactions=True):
+            return [x.port_id for x in session.query(PooledPort).filter_by(
+                policy_target_group_id=ptg_id)]
+
+    def _take_pooled_ports(self, plugin_context, ptg_id, count):
+        """Remove up to count ports from the pool of the PTG."""
+        if not cfg.CONF.resource_mapping.port_pool_low_water_mark:
+            return []
+        session = plugin_context.session
+        with session.begin(subtransactions=True):
+            pooled = (session.query(PooledPort).
+                      filter_by(policy_target_group_id=ptg_id).
+                      with_lockmode('update').limit(count).all())
+            port_ids = [x.port_id for x in pooled]
+            for x in pooled:
+                session.delete(x)
+        self._schedule_port_pool_refill(ptg_id)
+        return port_ids
+
+    def _return_port_to_pool(self, plugin_context, port_id, ptg_id):
+        """Put the port of a deleted PT back in the pool of the PTG.
+
+        The port must be owned, it is pooled only when not in use anymore
+        and its SGs are the PTG's ones already. Returns whether the port was
+        pooled.
+        """
+        if not cfg.CONF.resource_mapping.port_pool_low_water_mark:
+            return False
+        try:
+            port = self._core_plugin.get_port(plugin_context, port_id)
+        except n_exc.PortNotFound:
+            return False
+        if (port['device_id'] or port['device_owner'] or
+                port.get('binding:host_id')):
+            return False
+        session = plugin_context.session
+        with session.begin(subtransactions=True):
+            size = session.query(PooledPort).filter_by(
+                policy_target_group_id=ptg_id).count()
+            if size >= cfg.CONF.resource_mapping.port_pool_max_size:
+                return False
+            session.add(PooledPort(port_id=port_id,
+                                   policy_target_group_id=ptg_id))
+        return True
+
+    def _drain_port_pools(self, plugin_context, subnet_ids):
+        """Delete the pooled ports of the deleted PTGs on the subnets."""
+        session = plugin_context.session
+        with session.begin(subtransactions=True):
+            port_ids = set(x.port_id for x in session.query(
+                PooledPort.port_id).join(
+                    models_v2.IPAllocation,
+                    models_v2.IPAllocation.port_id == PooledPort.port_id).
+                outerjoin(gpdb.PolicyTargetGroup,
+                          gpdb.PolicyTargetGroup.id ==
+                          PooledPort.policy_target_group_id).filter(
+                    models_v2.IPAllocation.subnet_id.in_(subnet_ids),
+                    gpdb.PolicyTargetGroup.id.is_(None)))
+            if port_ids:
+                session.query(PooledPort).filter(
+                    PooledPort.port_id.in_(port_ids)).delete(
+                        synchronize_session=False)
+        self._delete_owned_ports(plugin_context, list(port_ids))
+
+    def _schedule_port_pool_refill(self, ptg_id):
+        if (cfg.CONF.resource_mapping.port_pool_low_water_mark and
+                ptg_id not in self._refilling_port_pools):
+            self._refilling_port_pools.add(ptg_id)
+            eventlet.spawn_n(self._refill_port_pool, ptg_id)
+
+    def _refill_port_pool(self, ptg_id):
+        """Create ports in the pool of the PTG up to the low water mark."""
+        plugin_context = n_context.get_admin_context()
+        session = plugin_context.session
+        try:
+            missing = (cfg.CONF.resource_mapping.port_pool_low_water_mark -
+                       len(self._get_pooled_port_ids(session, ptg_id)))
+            if missing <= 0:
+                return
+            try:
+                ptg = self._group_policy_plugin.get_policy_target_group(
+                    plugin_context, ptg_id)
+            except gp_ext.PolicyTargetGroupNotFound:
+                return
+            sg_list = [self._get_default_security_group(
+                plugin_context, ptg_id, ptg['tenant_id'])]
+            # Drivers not managing SGs, like APIC, have no PRS mappings
+            prs_ids = (ptg['provided_policy_rule_sets'] +
+                       ptg['consumed_policy_rule_sets'])
+            with session.begin(subtransactions=True):
+                mappings = prs_ids and session.query(
+                    PolicyRuleSetSGsMapping).filter(
+                        PolicyRuleSetSGsMapping.policy_rule_set_id.in_(
+                            prs_ids)).all()
+            for mapping in mappings:
+                if (mapping.policy_rule_set_id in
+                        ptg['provided_policy_rule_sets']):
+                    sg_list.append(mapping.provided_sg_id)
+                if (mapping.policy_rule_set_id in
+                        ptg['consumed_policy_rule_sets']):
+                    sg_list.append(mapping.consumed_sg_id)
+            network = self._l2p_id_to_network(plugin_context,
+                                              ptg['l2_policy_id'])
+            attrs_list = [{'tenant_id': ptg['tenant_id'],
+                           'name': 'pt_pool',
+                           'network_id': network['id'],
+                           'mac_address': attributes.ATTR_NOT_SPECIFIED,
+                           'fixed_ips': attributes.ATTR_NOT_SPECIFIED,
+                           'device_id': '',
+                           'device_owner': '',
+                           'security_groups': [x for x in sg_list if x],
+                           'admin_state_up': True} for x in range(missing)]
+            ports = self._create_ports(plugin_context, attrs_list)
+            with session.begin(subtransactions=True):
+                # REVISIT: the PTG rule sets could have changed meanwhile,
+                # taking the port will add the missing SGs.
+                ptg_exists = session.query(gpdb.PolicyTargetGroup).filter_by(
+                    id=ptg_id).count()
+                for port in ports:
+                    self._mark_port_owned(session, port['id'])
+                    if ptg_exists:
+                        session.add(PooledPort(port_id=port['id'],
+                                               policy_target_group_id=ptg_id))
+            if not ptg_exists:
+                self._delete_owned_ports(plugin_context,
+                                         [x['id'] for x in ports])
+        except Exception:
+            LOG.exception(_("Failed to refill the port pool of PTG %s"),
+                          ptg_id)
+        finally:
+            self._refilling_port_pools.discard(ptg_id)
+
     def _plug_router_to_external_segment(self, context, es_dict):
         es_list = context._plugin.get_external_segments(
             context._plugin_context, filters={'id': es_dict.keys()})
@@ -1421,9 +1884,9 @@ class ResourceMappingDriver(api.PolicyDriver):
             subnets.extend(ptg['subnets'])
         subnets = self._core_plugin.get_subnets(context._plugin_context,
                                                 filters={'id': subnets})
+        used = ip_index.CIDRIndex(x['cidr'] for x in subnets)
         for cidr in pool.subnet(l3p['subnet_prefix_length']):
-            if not self._validate_subnet_overlap_for_l3p(subnets,
-                                                         cidr.__str__()):
+            if used.overlaps(cidr):
                 continue
             try:
                 attrs = {'tenant_id': context.current['tenant_id'],
@@ -1433,7 +1896,7 @@ class ResourceMappingDriver(api.PolicyDriver):
                          'cidr': cidr.__str__(),
                          'enable_dhcp': True,
                          'gateway_ip': attributes.ATTR_NOT_SPECIFIED,
-                         'allocation_pools': attributes.ATTR_NOT_SPECIFIED,
+                         'allocation_pools': self._get_allocation_pools(cidr),
                          'dns_nameservers': attributes.ATTR_NOT_SPECIFIED,
                          'host_routes': attributes.ATTR_NOT_SPECIFIED}
                 subnet = self._create_subnet(context._plugin_context, attrs)
@@ -1462,12 +1925,16 @@ class ResourceMappingDriver(api.PolicyDriver):
                 pass
         raise exc.NoSubnetAvailable()
 
-    def _validate_subnet_overlap_for_l3p(self, subnets, subnet_cidr):
-        new_subnet_ipset = netaddr.IPSet([subnet_cidr])
-        for subnet in subnets:
-            if (netaddr.IPSet([subnet['cidr']]) & new_subnet_ipset):
-                return False
-        return True
+    def _get_allocation_pools(self, cidr):
+        """Leave the service IPs out of the default allocation pool."""
+        reserved = cfg.CONF.resource_mapping.service_ips_per_subnet
+        # The gateway is the first address
+        start = cidr.first + 2
+        end = cidr.last - 1 - reserved
+        if not reserved or end < start:
+            return attributes.ATTR_NOT_SPECIFIED
+        return [{'start': str(netaddr.IPAddress(start, cidr.version)),
+                 'end': str(netaddr.IPAddress(end, cidr.version))}]
 
     def _use_explicit_subnet(self, plugin_context, subnet_id, router_id):
         interface_info = {'subnet_id': subnet_id}
@@ -1476,12 +1943,19 @@ class ResourceMappingDriver(api.PolicyDriver):
                                        interface_info)
 
     def _cleanup_subnet(self, plugin_context, subnet_id, router_id):
-        interface_info = {'subnet_id': subnet_id}
-        if router_id:
-            self._remove_router_interface(plugin_context, router_id,
-                                          interface_info)
-        if self._subnet_is_owned(plugin_context.session, subnet_id):
-            self._delete_subnet(plugin_context, subnet_id)
+        self._cleanup_subnets(plugin_context, [subnet_id], router_id)
+
+    def _cleanup_subnets(self, plugin_context, subnet_ids, router_id):
+        # Every driver cleans the PTG subnets up, the PooledPort rows have no
+        # FK to the PTG and would leave the ports behind otherwise
+        self._drain_port_pools(plugin_context, subnet_ids)
+        owned = self._get_owned_subnet_ids(plugin_context.session, subnet_ids)
+        for subnet_id in subnet_ids:
+            if router_id:
+                self._remove_router_interface(plugin_context, router_id,
+                                              {'subnet_id': subnet_id})
+            if subnet_id in owned:
+                self._delete_subnet(plugin_context, subnet_id)
 
     def _create_implicit_network(self, context, **kwargs):
         attrs = {'tenant_id': context.current['tenant_id'],
@@ -1512,9 +1986,11 @@ class ResourceMappingDriver(api.PolicyDriver):
         self._mark_router_owned(context._plugin_context.session, router_id)
         context.add_router(router_id)
 
-    def _cleanup_router(self, plugin_context, router_id):
-        if self._router_is_owned(plugin_context.session, router_id):
-            self._delete_router(plugin_context, router_id)
+    def _cleanup_routers(self, plugin_context, router_ids):
+        owned = self._get_owned_router_ids(plugin_context.session, router_ids)
+        for router_id in router_ids:
+            if router_id in owned:
+                self._delete_router(plugin_context, router_id)
 
     def _create_policy_rule_set_sg(self, context, sg_name_prefix):
         # This method sets up the attributes of security group
@@ -1763,6 +2239,10 @@ class ResourceMappingDriver(api.PolicyDriver):
         return self._create_resource(self._core_plugin, plugin_context, 'port',
                                      attrs)
 
+    def _create_ports(self, plugin_context, attrs_list):
+        return self._create_resources(self._core_plugin, plugin_context,
+                                      'port', attrs_list)
+
     def _update_port(self, plugin_context, port_id, attrs):
         return self._update_resource(self._core_plugin, plugin_context, 'port',
                                      port_id, attrs)
@@ -1867,61 +2347,96 @@ class ResourceMappingDriver(api.PolicyDriver):
         return self._update_resource(self._l3_plugin, plugin_context,
                                      'floatingip', fip_id, attrs)
 
-    def _restore_ip_to_allocation_pool(self, context, subnet_id, ip_address):
-        # TODO(Magesh):Pass subnets and loop on subnets. Better to add logic
-        # to Merge the pools together after Fragmentation
-        subnet = self._core_plugin.get_subnet(context._plugin_context,
-                                              subnet_id)
-        allocation_pools = subnet['allocation_pools']
-        for allocation_pool in allocation_pools:
-            pool_end_ip = allocation_pool.get('end')
-            if ip_address == str(netaddr.IPAddress(pool_end_ip) + 1):
-                new_last_ip = ip_address
-                allocation_pool['end'] = new_last_ip
-                del subnet['gateway_ip']
-                subnet = self._update_subnet(context._plugin_context,
-                                             subnet['id'], subnet)
-                # NOTE(Magesh): The update_subnet invoked directly on core
-                # plugin leaves the old object in this session most of the
-                # time. So expunge all objects from this session now. We may
-                # have to do this for any other objects modified in RMD using
-                # just the core/l3 plugin objects. Else the change may not be
-                # visible in the current session (#bug 1426946)
-                context._plugin_context.session.expunge_all()
-                return
-
-        # TODO(Magesh):Have to test this logic. Add proper unit tests
-        subnet['allocation_pools'].append({"start": ip_address,
-                                          "end": ip_address})
-        del subnet['gateway_ip']
-        subnet = self._update_subnet(context._plugin_context,
-                                     subnet['id'], subnet)
-
-    def _remove_ip_from_allocation_pool(self, context, subnet_id, ip_address):
-        # TODO(Magesh):Pass subnets and loop on subnets
-        subnet = self._core_plugin.get_subnet(context._plugin_context,
-                                              subnet_id)
-        allocation_pools = subnet['allocation_pools']
-        for allocation_pool in reversed(allocation_pools):
-            if ip_address == allocation_pool.get('end'):
-                new_last_ip = str(netaddr.IPAddress(ip_address) - 1)
-                allocation_pool['end'] = new_last_ip
-                del subnet['gateway_ip']
-                self._update_subnet(context._plugin_context,
-                                    subnet['id'], subnet)
-                break
-
-    def _get_last_free_ip(self, context, subnets):
-        # Hope lock_mode update is not needed
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).join(
-                models_v2.IPAllocationPool)
-        for subnet_id in subnets:
-            ip_range = range_qry.filter_by(subnet_id=subnet_id).first()
-            if not ip_range:
+    def _get_service_ip_candidates(self, subnet):
+        """Addresses out of the subnet allocation pools, highest first."""
+        cidr = netaddr.IPNetwork(subnet['cidr'])
+        candidates = netaddr.IPSet([cidr])
+        for pool in subnet['allocation_pools']:
+            candidates -= netaddr.IPSet(netaddr.IPRange(pool['start'],
+                                                        pool['end']))
+        candidates.remove(cidr.network)
+        if cidr.version == 4 and cidr.broadcast:
+            candidates.remove(cidr.broadcast)
+        if subnet['gateway_ip']:
+            candidates.remove(subnet['gateway_ip'])
+        for ip_range in reversed(list(candidates.iter_ipranges())):
+            value = ip_range.last
+            while value >= ip_range.first:
+                yield str(netaddr.IPAddress(value, cidr.version))
+                value -= 1
+
+    def _reserve_service_ip(self, plugin_context, ptg):
+        """Reserve an address of the PTG subnets for a service.
+
+        The address is taken out of the subnet allocation pools, which are
+        left untouched unless the subnet is an implicit one that predates
+        service_ips_per_subnet.
+        """
+        subnets = self._core_plugin.get_subnets(
+            plugin_context, filters={'id': ptg['subnets']})
+        for subnet in subnets:
+            address = self._reserve_subnet_service_ip(
+                plugin_context.session, subnet, ptg['id'])
+            if not address:
+                subnet = self._leave_out_service_ips(plugin_context, subnet)
+                if subnet:
+                    address = self._reserve_subnet_service_ip(
+                        plugin_context.session, subnet, ptg['id'])
+            if address:
+                return address
+
+    def _reserve_subnet_service_ip(self, session, subnet, ptg_id):
+        with session.begin(subtransactions=True):
+            reserved = set(x.ip_address for x in session.query(
+                PTGReservedIPAddress).filter_by(subnet_id=subnet['id']))
+        for address in self._get_service_ip_candidates(subnet):
+            if address in reserved:
+                continue
+            try:
+                with session.begin(subtransactions=True):
+                    # Fixed IPs can be requested outside of the pools
+                    if session.query(models_v2.IPAllocation).filter_by(
+                            subnet_id=subnet['id'],
+                            ip_address=address).count():
+                        continue
+                    session.add(PTGReservedIPAddress(
+                        subnet_id=subnet['id'], ip_address=address,
+                        policy_target_group_id=ptg_id))
+            except db_exc.DBDuplicateEntry:
                 continue
-            ip_address = ip_range['last_ip']
-            return ip_address
+            return address
+
+    def _leave_out_service_ips(self, plugin_context, subnet):
+        """Shrink the pools of an implicit subnet to the default ones.
+
+        Implicit subnets created before service_ips_per_subnet have their
+        whole range in the allocation pools. Returns the updated subnet, or
+        None when there is nothing to leave out.
+        """
+        default_pools = self._get_allocation_pools(
+            netaddr.IPNetwork(subnet['cidr']))
+        if (default_pools == attributes.ATTR_NOT_SPECIFIED or
+                not self._get_owned_subnet_ids(plugin_context.session,
+                                               [subnet['id']])):
+            return
+        pools = netaddr.IPSet([netaddr.IPRange(x['start'], x['end'])
+                               for x in subnet['allocation_pools']])
+        shrunk = pools & netaddr.IPSet([netaddr.IPRange(x['start'], x['end'])
+                                        for x in default_pools])
+        if not shrunk or shrunk == pools:
+            return
+        LOG.info(_("Leaving the service IPs out of the allocation pools of "
+                   "subnet %s"), subnet['id'])
+        return self._update_subnet(
+            plugin_context, subnet['id'],
+            {'allocation_pools': [{'start': str(x[0]), 'end': str(x[-1])}
+                                  for x in shrunk.iter_ipranges()]})
+
+    def _release_service_ip(self, session, ptg_id, ip_address):
+        with session.begin(subtransactions=True):
+            session.query(PTGReservedIPAddress).filter_by(
+                policy_target_group_id=ptg_id,
+                ip_address=ip_address).delete()
 
     def _create_servicechain_instance(self, context, servicechain_spec,
                                       parent_servicechain_spec,
@@ -1983,7 +2498,6 @@ class ResourceMappingDriver(api.PolicyDriver):
             LOG.warn(_("servicechain %s already deleted"),
                      servicechain_instance_id)
 
-    # Do Not Pass floating_ip_address to this method until after Kilo Release
     def _create_floatingip(self, context, ext_net_id, internal_port_id=None,
                            floating_ip_address=None):
         attrs = {'tenant_id': context.current['tenant_id'],
@@ -2010,6 +2524,24 @@ class ResourceMappingDriver(api.PolicyDriver):
                                              resource + '.create.end')
         return obj
 
+    def _create_resources(self, plugin, context, resource, attrs_list):
+        # Use the bulk create of the plugin when it supports it
+        bulk_creator = getattr(plugin, 'create_%s_bulk' % resource, None)
+        if not bulk_creator:
+            return [self._create_resource(plugin, context, resource, attrs)
+                    for attrs in attrs_list]
+        objs = bulk_creator(context, {resource + 's': [{resource: attrs}
+                                                       for attrs in
+                                                       attrs_list]})
+        for obj in objs:
+            self._nova_notifier.send_network_change('create_' + resource,
+                                                    {}, {resource: obj})
+            if cfg.CONF.dhcp_agent_notification:
+                self._dhcp_agent_notifier.notify(context,
+                                                 {resource: obj},
+                                                 resource + '.create.end')
+        return objs
+
     def _update_resource(self, plugin, context, resource, resource_id, attrs):
         # REVISIT(rkukura): Do update.start notification?
         # REVISIT(rkukura): Check authorization?
@@ -2080,6 +2612,13 @@ class ResourceMappingDriver(api.PolicyDriver):
             raise exc.GroupPolicyDeploymentError()
         return servicechain_plugin
 
+    @property
+    def _group_policy_plugin(self):
+        # REVISIT(rkukura): Need initialization method after all
+        # plugins are loaded to grab and store plugin.
+        plugins = manager.NeutronManager.get_service_plugins()
+        return plugins.get(pconst.GROUP_POLICY)
+
     @property
     def _dhcp_agent_notifier(self):
         # REVISIT(rkukura): Need initialization method after all
@@ -2091,27 +2630,85 @@ class ResourceMappingDriver(api.PolicyDriver):
                 dhcp_rpc_agent_api.DhcpAgentNotifyAPI())
         return self._cached_agent_notifier
 
+    def _port_id_to_pt(self, plugin_context, port_id):
+        def load():
+            pt = (plugin_context.session.query(gpmdb.PolicyTargetMapping).
+                  filter_by(port_id=port_id).first())
+            if pt:
+                return self._group_policy_plugin._make_policy_target_dict(pt)
+        return mapping_cache.cache.get(mapping_cache.PORT_PT, port_id, load)
+
+    def _port_id_to_ptg(self, plugin_context, port_id):
+        pt = self._port_id_to_pt(plugin_context, port_id)
+        if pt and pt['policy_target_group_id']:
+            return self._get_ptg(plugin_context, pt['policy_target_group_id'])
+
+    def _get_ptg(self, plugin_context, ptg_id):
+        # Not cached, its sharing and rule sets can change any time
+        return self._group_policy_plugin.get_policy_target_group(
+            plugin_context, ptg_id)
+
+    def _get_ptg_by_subnet(self, plugin_context, subnet_id):
+        # Only the PTG ID is cached per subnet
+        def load():
+            ptgass = (plugin_context.session.query(
+                gpmdb.PTGToSubnetAssociation).
+                filter_by(subnet_id=subnet_id).first())
+            return ptgass and ptgass['policy_target_group_id']
+        ptg_id = mapping_cache.cache.get(mapping_cache.SUBNET_PTG, subnet_id,
+                                         load)
+        if ptg_id:
+            return self._get_ptg(plugin_context, ptg_id)
+
+    def _l2p_id_to_network(self, plugin_context, l2p_id):
+        def load():
+            l2p = self._group_policy_plugin.get_l2_policy(plugin_context,
+                                                          l2p_id)
+            return self._core_plugin.get_network(plugin_context,
+                                                 l2p['network_id'])
+        return mapping_cache.cache.get(mapping_cache.L2P_NETWORK, l2p_id,
+                                       load)
+
+    def _network_id_to_l2p(self, plugin_context, network_id):
+        def load():
+            l2ps = self._group_policy_plugin.get_l2_policies(
+                plugin_context, filters={'network_id': [network_id]})
+            return l2ps[0] if l2ps else None
+        return mapping_cache.cache.get(mapping_cache.NETWORK_L2P, network_id,
+                                       load)
+
     def _mark_port_owned(self, session, port_id):
         with session.begin(subtransactions=True):
             owned = OwnedPort(port_id=port_id)
             session.add(owned)
 
     def _port_is_owned(self, session, port_id):
+        return port_id in self._get_owned_port_ids(session, [port_id])
+
+    def _get_owned_port_ids(self, session, port_ids):
+        """Return the subset of port_ids owned by the driver."""
+        port_ids = set(port_ids)
+        if not port_ids:
+            return set()
         with session.begin(subtransactions=True):
-            return (session.query(OwnedPort).
-                    filter_by(port_id=port_id).
-                    first() is not None)
+            return set(x.port_id for x in
+                       session.query(OwnedPort.port_id).filter(
+                           OwnedPort.port_id.in_(port_ids)))
 
     def _mark_subnet_owned(self, session, subnet_id):
         with session.begin(subtransactions=True):
             owned = OwnedSubnet(subnet_id=subnet_id)
             session.add(owned)
 
-    def _subnet_is_owned(self, session, subnet_id):
+    def _get_owned_subnet_ids(self, session, subnet_ids):
+        """Return the subset of subnet_ids owned by the driver."""
+        subnet_ids = set(subnet_ids)
+        if not subnet_ids:
+            return set()
         with session.begin(subtransactions=True):
-            return (session.query(OwnedSubnet).
-                    filter_by(subnet_id=subnet_id).
-                    first() is not None)
+            return set(x.subnet_id for x in
+                       session.query(OwnedSubnet.subnet_id).filter(
+                           OwnedSubnet.subnet_id.in_(subnet_ids)))
 
     def _mark_network_owned(self, session, network_id):
         with session.begin(subtransactions=True):
@@ -2119,21 +2716,32 @@ class ResourceMappingDriver(api.PolicyDriver):
             session.add(owned)
 
     def _network_is_owned(self, session, network_id):
+        return network_id in self._get_owned_network_ids(session, [network_id])
+
+    def _get_owned_network_ids(self, session, network_ids):
+        """Return the subset of network_ids owned by the driver."""
+        network_ids = set(network_ids)
+        if not network_ids:
+            return set()
         with session.begin(subtransactions=True):
-            return (session.query(OwnedNetwork).
-                    filter_by(network_id=network_id).
-                    first() is not None)
+            return set(x.network_id for x in
+                       session.query(OwnedNetwork.network_id).filter(
+                           OwnedNetwork.network_id.in_(network_ids)))
 
     def _mark_router_owned(self, session, router_id):
         with session.begin(subtransactions=True):
             owned = OwnedRouter(router_id=router_id)
             session.add(owned)
 
-    def _router_is_owned(self, session, router_id):
+    def _get_owned_router_ids(self, session, router_ids):
+        """Return the subset of router_ids owned by the driver."""
+        router_ids = set(router_ids)
+        if not router_ids:
+            return set()
         with session.begin(subtransactions=True):
-            return (session.query(OwnedRouter).
-                    filter_by(router_id=router_id).
-                    first() is not None)
+            return set(x.router_id for x in
+                       session.query(OwnedRouter.router_id).filter(
+                           OwnedRouter.router_id.in_(router_ids)))
 
     def _set_policy_rule_set_sg_mapping(
         self, session, policy_rule_set_id, consumed_sg_id, provided_sg_id):
@@ -2199,12 +2807,18 @@ class ResourceMappingDriver(api.PolicyDriver):
         except gp_ext.PolicyTargetNotFound:
             LOG.warn(_("PT %s doesn't exist anymore"), pt_id)
             return
-        port_id = pt['port_id']
-        port = self._core_plugin.get_port(context._plugin_context, port_id)
+        self._assoc_sgs_to_port(context._plugin_context, pt['port_id'],
+                                sg_list)
+
+    def _assoc_sgs_to_port(self, plugin_context, port_id, sg_list):
+        port = self._core_plugin.get_port(plugin_context, port_id)
         cur_sg_list = port[ext_sg.SECURITYGROUPS]
-        new_sg_list = cur_sg_list + sg_list
-        port[ext_sg.SECURITYGROUPS] = new_sg_list
-        self._update_port(context._plugin_context, port_id, port)
+        new_sg_list = cur_sg_list + [x for x in sg_list
+                                     if x not in cur_sg_list]
+        # Pooled ports have the PTG SGs already
+        if new_sg_list != cur_sg_list:
+            port[ext_sg.SECURITYGROUPS] = new_sg_list
+            self._update_port(plugin_context, port_id, port)
 
     def _disassoc_sgs_from_pt(self, context, pt_id, sg_list):
         try:
@@ -2275,6 +2889,15 @@ class ResourceMappingDriver(api.PolicyDriver):
                 self._assoc_sgs_to_pt(context, pt_id, sg_list)
             else:
                 self._disassoc_sgs_from_pt(context, pt_id, sg_list)
+        # Keep the pooled ports in sync with the PTG
+        for port_id in self._get_pooled_port_ids(
+                context._plugin_context.session, ptg_id):
+            if op == "ASSOCIATE":
+                self._assoc_sgs_to_port(context._plugin_context, port_id,
+                                        sg_list)
+            else:
+                self._disassoc_sgs_from_port(context._plugin_context, port_id,
+                                             sg_list)
 
     def _set_or_unset_rules_for_subnets(
             self, context, subnets, provided_policy_rule_sets,
@@ -2441,11 +3064,36 @@ class ResourceMappingDriver(api.PolicyDriver):
 
     def _get_default_security_group(self, plugin_context, ptg_id,
                                     tenant_id):
+        session = plugin_context.session
+        with session.begin(subtransactions=True):
+            default = (session.query(PTGDefaultSecurityGroup).
+                       filter_by(policy_target_group_id=ptg_id).first())
+        if default:
+            return default.security_group_id
+        # Look for a default SG not recorded yet
         port_name = 'gbp_%s' % ptg_id
         filters = {'name': [port_name], 'tenant_id': [tenant_id]}
         default_group = self._core_plugin.get_security_groups(
             plugin_context, filters)
-        return default_group[0]['id'] if default_group else None
+        if default_group:
+            return self._set_default_security_group(session, ptg_id,
+                                                    default_group[0]['id'])
+
+    def _set_default_security_group(self, session, ptg_id, sg_id):
+        """Set the default SG of the PTG unless there's one already.
+
+        Returns the ID of the PTG default SG.
+        """
+        try:
+            with session.begin(subtransactions=True):
+                session.add(PTGDefaultSecurityGroup(
+                    policy_target_group_id=ptg_id, security_group_id=sg_id))
+            return sg_id
+        except db_exc.DBDuplicateEntry:
+            with session.begin(subtransactions=True):
+                return (session.query(PTGDefaultSecurityGroup).
+                        filter_by(policy_target_group_id=ptg_id).
+                        one().security_group_id)
 
     def _update_default_security_group(self, plugin_context, ptg_id,
                                        tenant_id, subnets=None):
@@ -2457,7 +3105,12 @@ class ResourceMappingDriver(api.PolicyDriver):
             port_name = 'gbp_%s' % ptg_id
             attrs = {'name': port_name, 'tenant_id': tenant_id,
                      'description': 'default'}
-            sg_id = self._create_sg(plugin_context, attrs)['id']
+            new_sg_id = self._create_sg(plugin_context, attrs)['id']
+            sg_id = self._set_default_security_group(
+                plugin_context.session, ptg_id, new_sg_id)
+            if sg_id != new_sg_id:
+                # Another default SG was created concurrently
+                self._delete_sg(plugin_context, new_sg_id)
 
         for subnet in self._core_plugin.get_subnets(
                 plugin_context, filters={'id': subnets or []}):
@@ -2471,6 +3124,10 @@ class ResourceMappingDriver(api.PolicyDriver):
         sg_id = self._get_default_security_group(plugin_context, ptg_id,
                                                  tenant_id)
         if sg_id:
+            session = plugin_context.session
+            with session.begin(subtransactions=True):
+                session.query(PTGDefaultSecurityGroup).filter_by(
+                    policy_target_group_id=ptg_id).delete()
             self._delete_sg(plugin_context, sg_id)
 
     def _get_ptgs_by_id(self, context, ids):
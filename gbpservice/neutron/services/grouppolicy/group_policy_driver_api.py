@@ -537,6 +537,30 @@ class PolicyDriver(object):
         """
         pass
 
+    def create_policy_target_bulk_precommit(self, contexts):
+        """Allocate resources for several new policy_targets.
+
+        :param contexts: list of PolicyTargetContext instances describing
+        the new policy_targets, all created in the same transaction.
+
+        By default create_policy_target_precommit is called for each of
+        them.
+        """
+        for context in contexts:
+            self.create_policy_target_precommit(context)
+
+    def create_policy_target_bulk_postcommit(self, contexts):
+        """Create several policy_targets.
+
+        :param contexts: list of PolicyTargetContext instances describing
+        the new policy_targets.
+
+        By default create_policy_target_postcommit is called for each of
+        them.
+        """
+        for context in contexts:
+            self.create_policy_target_postcommit(context)
+
     def update_policy_target_precommit(self, context):
         """Update resources of a policy_target.
 
@@ -571,6 +595,30 @@ class PolicyDriver(object):
         """
         pass
 
+    def delete_policy_target_bulk_precommit(self, contexts):
+        """Delete resources for several policy_targets.
+
+        :param contexts: list of PolicyTargetContext instances describing
+        the policy_targets being deleted, all in the same transaction.
+
+        By default delete_policy_target_precommit is called for each of
+        them.
+        """
+        for context in contexts:
+            self.delete_policy_target_precommit(context)
+
+    def delete_policy_target_bulk_postcommit(self, contexts):
+        """Delete several policy_targets.
+
+        :param contexts: list of PolicyTargetContext instances describing
+        the deleted policy_targets.
+
+        By default delete_policy_target_postcommit is called for each of
+        them.
+        """
+        for context in contexts:
+            self.delete_policy_target_postcommit(context)
+
     def create_policy_target_group_precommit(self, context):
         """Allocate resources for a new policy_target_group.
 
@@ -32,6 +32,8 @@ from gbpservice.neutron.services.grouppolicy import (
     policy_driver_manager as manager)
 from gbpservice.neutron.services.grouppolicy.common import constants as gp_cts
 from gbpservice.neutron.services.grouppolicy.common import exceptions as gp_exc
+from gbpservice.neutron.services.grouppolicy.common import ip_index
+from gbpservice.neutron.services.grouppolicy.common import mapping_cache
 from gbpservice.neutron.services.servicechain.plugins.ncp import (
     model as ncp_model)
 
@@ -49,6 +51,10 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
     """
     _supported_extension_aliases = ["group-policy", "group-policy-mapping"]
 
+    # Policy targets are natively created in bulk, all the other resources
+    # are created one by one by _create_bulk_emulated.
+    __native_bulk_support = True
+
     @property
     def supported_extension_aliases(self):
         if not hasattr(self, '_aliases'):
@@ -232,19 +238,18 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             # Remove default routes
             added_dest.discard('0.0.0.0/0')
             added_dest.discard('::/0')
-            added_ipset = netaddr.IPSet(added_dest)
+            added_index = ip_index.CIDRIndex(added_dest)
             if current['l3_policies']:
                 l3ps = self.get_l3_policies(
                     context, filters={'id': current['l3_policies']})
                 for l3p in l3ps:
-                    if netaddr.IPSet([l3p['ip_pool']]) & added_ipset:
+                    if added_index.overlaps(l3p['ip_pool']):
                         raise gp_exc.ExternalRouteOverlapsWithL3PIpPool(
                             destination=added_dest, l3p_id=l3p['id'],
                             es_id=current['id'])
             # Verify NH in ES pool
-            added_nexthop = netaddr.IPSet(x[1] for x in added if x[1])
-            es_subnet = netaddr.IPSet([current['cidr']])
-            if added_nexthop & es_subnet != added_nexthop:
+            es_index = ip_index.CIDRIndex([current['cidr']])
+            if not all(es_index.contains(x[1]) for x in added if x[1]):
                 raise gp_exc.ExternalRouteNextHopNotInExternalSegment(
                     cidr=current['cidr'])
 
@@ -257,19 +262,19 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
         if added:
             es_list = self.get_external_segments(context,
                                                  filters={'id': added})
-            l3p_ipset = netaddr.IPSet([current['ip_pool']])
+            l3p_index = ip_index.CIDRIndex([current['ip_pool']])
             for es in es_list:
                 # Verify no route overlap
                 dest_set = set(x['destination'] for x in
                                es['external_routes'])
                 dest_set.discard('0.0.0.0/0')
                 dest_set.discard('::/0')
-                if l3p_ipset & netaddr.IPSet(dest_set):
+                if l3p_index.overlaps_any(dest_set):
                     raise gp_exc.ExternalRouteOverlapsWithL3PIpPool(
                         destination=dest_set, l3p_id=current['id'],
                         es_id=es['id'])
                 # Verify segment CIDR doesn't overlap with L3P's
-                if l3p_ipset & netaddr.IPSet([es['cidr']]):
+                if l3p_index.overlaps(es['cidr']):
                     raise gp_exc.ExternalSegmentSubnetOverlapsWithL3PIpPool(
                         subnet=es['cidr'], l3p_id=current['id'],
                         es_id=current['id'])
@@ -315,6 +320,11 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             self.servicechain_plugin.update_chains_pt_added(context,
                                                             policy_target)
 
+    def _notify_sc_plugin_pts_added(self, context, policy_targets):
+        if self.servicechain_plugin:
+            self.servicechain_plugin.update_chains_pts_added(context,
+                                                             policy_targets)
+
     def _notify_sc_plugin_pt_removed(self, context, policy_target):
         if self.servicechain_plugin:
             self.servicechain_plugin.update_chains_pt_removed(context,
@@ -352,6 +362,115 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
 
         return result
 
+    @log.log
+    def create_policy_target_bulk(self, context, policy_targets,
+                                  notify_sc=True):
+        if not self.policy_driver_manager.native_bulk_support:
+            return self._create_bulk_emulated('policy_target', context,
+                                              policy_targets,
+                                              notify_sc=notify_sc)
+        session = context.session
+        results = []
+        policy_contexts = []
+        with session.begin(subtransactions=True):
+            for policy_target in policy_targets['policy_targets']:
+                result = super(GroupPolicyPlugin, self).create_policy_target(
+                    context, policy_target)
+                self.extension_manager.process_create_policy_target(
+                    session, policy_target, result)
+                self._validate_shared_create(
+                    self, context, result, 'policy_target')
+                results.append(result)
+                policy_contexts.append(p_context.PolicyTargetContext(
+                    self, context, result))
+            self.policy_driver_manager.create_policy_target_bulk_precommit(
+                policy_contexts)
+
+        try:
+            self.policy_driver_manager.create_policy_target_bulk_postcommit(
+                policy_contexts)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                LOG.error(_("create_policy_target_bulk_postcommit "
+                            "failed, deleting policy_targets %s"),
+                          [x['id'] for x in results])
+                for result in results:
+                    try:
+                        self.delete_policy_target(context, result['id'],
+                                                  notify_sc=False)
+                    except Exception:
+                        LOG.exception(_("Failed to delete policy_target "
+                                        "%s"), result['id'])
+
+        if notify_sc:
+            self._notify_sc_plugin_pts_added(context, results)
+
+        return results
+
+    def _create_bulk_emulated(self, resource, context, request_items,
+                              **kwargs):
+        """Create the resources one by one, deleting them all on failure."""
+        collection = (resource[:-1] + 'ies' if resource.endswith('y')
+                      else resource + 's')
+        created = []
+        try:
+            for item in request_items[collection]:
+                created.append(getattr(self, 'create_' + resource)(
+                    context, item, **kwargs))
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                for obj in reversed(created):
+                    try:
+                        getattr(self, 'delete_' + resource)(context,
+                                                            obj['id'])
+                    except Exception:
+                        LOG.exception(_("Failed to delete %(resource)s "
+                                        "%(id)s"),
+                                      {'resource': resource,
+                                       'id': obj['id']})
+        return created
+
+    def create_policy_target_group_bulk(self, context, policy_target_groups):
+        return self._create_bulk_emulated(
+            'policy_target_group', context, policy_target_groups)
+
+    def create_l2_policy_bulk(self, context, l2_policies):
+        return self._create_bulk_emulated('l2_policy', context, l2_policies)
+
+    def create_l3_policy_bulk(self, context, l3_policies):
+        return self._create_bulk_emulated('l3_policy', context, l3_policies)
+
+    def create_network_service_policy_bulk(self, context,
+                                           network_service_policies):
+        return self._create_bulk_emulated(
+            'network_service_policy', context, network_service_policies)
+
+    def create_policy_classifier_bulk(self, context, policy_classifiers):
+        return self._create_bulk_emulated(
+            'policy_classifier', context, policy_classifiers)
+
+    def create_policy_action_bulk(self, context, policy_actions):
+        return self._create_bulk_emulated(
+            'policy_action', context, policy_actions)
+
+    def create_policy_rule_bulk(self, context, policy_rules):
+        return self._create_bulk_emulated('policy_rule', context, policy_rules)
+
+    def create_policy_rule_set_bulk(self, context, policy_rule_sets):
+        return self._create_bulk_emulated(
+            'policy_rule_set', context, policy_rule_sets)
+
+    def create_external_segment_bulk(self, context, external_segments):
+        return self._create_bulk_emulated(
+            'external_segment', context, external_segments)
+
+    def create_external_policy_bulk(self, context, external_policies):
+        return self._create_bulk_emulated(
+            'external_policy', context, external_policies)
+
+    def create_nat_pool_bulk(self, context, nat_pools):
+        return self._create_bulk_emulated('nat_pool', context, nat_pools)
+
     @log.log
     def update_policy_target(self, context, policy_target_id, policy_target):
         session = context.session
@@ -372,6 +491,7 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             self.policy_driver_manager.update_policy_target_precommit(
                 policy_context)
 
+        mapping_cache.cache.policy_target_changed(updated_policy_target)
         self.policy_driver_manager.update_policy_target_postcommit(
             policy_context)
         return updated_policy_target
@@ -389,6 +509,7 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             super(GroupPolicyPlugin, self).delete_policy_target(
                 context, policy_target_id)
 
+        mapping_cache.cache.policy_target_changed(policy_target)
         if notify_sc:
             # REVISIT(ivar): For now just raise the exception if something goes
             # wrong. This will eventually be managed in an asynchronous way.
@@ -403,6 +524,30 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
                             "for policy_target %s"),
                           policy_target_id)
 
+    def _delete_policy_targets(self, context, policy_targets):
+        """Delete several PTs at once, without notifying the chains."""
+        if not policy_targets:
+            return
+        session = context.session
+        with session.begin(subtransactions=True):
+            policy_contexts = [
+                p_context.PolicyTargetContext(self, context, policy_target)
+                for policy_target in policy_targets]
+            self.policy_driver_manager.delete_policy_target_bulk_precommit(
+                policy_contexts)
+            for policy_target in policy_targets:
+                super(GroupPolicyPlugin, self).delete_policy_target(
+                    context, policy_target['id'])
+
+        mapping_cache.cache.policy_target_changed(*policy_targets)
+        try:
+            self.policy_driver_manager.delete_policy_target_bulk_postcommit(
+                policy_contexts)
+        except Exception:
+            LOG.exception(_("delete_policy_target_bulk_postcommit failed "
+                            "for policy_targets %s"),
+                          [x['id'] for x in policy_targets])
+
     def get_policy_target(self, context, policy_target_id, fields=None):
         session = context.session
         with session.begin(subtransactions=True):
@@ -472,6 +617,8 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             self.policy_driver_manager.update_policy_target_group_precommit(
                 policy_context)
 
+        mapping_cache.cache.policy_target_group_changed(
+            original_policy_target_group, updated_policy_target_group)
         self.policy_driver_manager.update_policy_target_group_postcommit(
             policy_context)
 
@@ -484,34 +631,39 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             policy_target_group = self.get_policy_target_group(
                 context, policy_target_group_id)
             pt_ids = policy_target_group['policy_targets']
-            for pt in self.get_policy_targets(context, {'id': pt_ids}):
-                if pt['port_id'] and self._is_port_bound(pt['port_id']) or (
-                        self._is_service_target(context, pt['id'])):
-                    raise gp_exc.PolicyTargetGroupInUse(
-                        policy_target_group=policy_target_group_id)
+            policy_targets = self.get_policy_targets(context, {'id': pt_ids})
+            # We will allow PTG deletion if all PTs are unused, such that
+            # either all unused PTs are deleted or nothing is.
+            bound_ports = self._get_bound_port_ids(
+                [pt['port_id'] for pt in policy_targets if pt['port_id']])
+            if bound_ports or ncp_model.get_service_target_policy_target_ids(
+                    session, pt_ids):
+                raise gp_exc.PolicyTargetGroupInUse(
+                    policy_target_group=policy_target_group_id)
             policy_context = p_context.PolicyTargetGroupContext(
                 self, context, policy_target_group)
             self.policy_driver_manager.delete_policy_target_group_precommit(
                 policy_context)
 
-        # Disassociate all the PRSs first, this will trigger service chains
+        # Delete the PTs first, so that the PRSs disassociation below doesn't
+        # update the SGs of ports which are being deleted anyway. The chains
+        # are going away, no need to notify them.
+        self._delete_policy_targets(context, policy_targets)
+
+        # Disassociate all the PRSs, this will trigger service chains
         # deletion.
-        self.update_policy_target_group(
-            context, policy_target_group_id,
-            {'policy_target_group': {'provided_policy_rule_sets': {},
-                                     'consumed_policy_rule_sets': {}}})
+        if (policy_target_group['provided_policy_rule_sets'] or
+                policy_target_group['consumed_policy_rule_sets']):
+            self.update_policy_target_group(
+                context, policy_target_group_id,
+                {'policy_target_group': {'provided_policy_rule_sets': {},
+                                         'consumed_policy_rule_sets': {}}})
 
         with session.begin(subtransactions=True):
-            for pt_id in pt_ids:
-                # We will allow PTG deletion if all PTs are unused.
-                # We could have cleaned these opportunistically in
-                # the previous loop, but we will keep it simple,
-                # such that either all unused PTs are deleted
-                # or nothing is.
-                self.delete_policy_target(context, pt_id)
             super(GroupPolicyPlugin, self).delete_policy_target_group(
                 context, policy_target_group_id)
 
+        mapping_cache.cache.policy_target_group_changed(policy_target_group)
         try:
             self.policy_driver_manager.delete_policy_target_group_postcommit(
                 policy_context)
@@ -584,6 +736,8 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             self.policy_driver_manager.update_l2_policy_precommit(
                 policy_context)
 
+        mapping_cache.cache.l2_policy_changed(original_l2_policy,
+                                              updated_l2_policy)
         self.policy_driver_manager.update_l2_policy_postcommit(
             policy_context)
         return updated_l2_policy
@@ -600,6 +754,7 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             super(GroupPolicyPlugin, self).delete_l2_policy(context,
                                                             l2_policy_id)
 
+        mapping_cache.cache.l2_policy_changed(l2_policy)
         try:
             self.policy_driver_manager.delete_l2_policy_postcommit(
                 policy_context)
@@ -1476,16 +1631,17 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
                     session, result)
         return [self._fields(result, fields) for result in results]
 
-    def _is_port_bound(self, port_id):
-        # REVISIT(ivar): This operation shouldn't be done within a DB lock
-        # once we refactor the server.
+    def _get_bound_port_ids(self, port_ids):
+        """Return the IDs of the bound ports, with a single query."""
+        if not port_ids:
+            return set()
         not_bound = [portbindings.VIF_TYPE_UNBOUND,
                      portbindings.VIF_TYPE_BINDING_FAILED]
         context = n_ctx.get_admin_context()
-        port = n_manager.NeutronManager.get_plugin().get_port(context, port_id)
-        return (port.get('binding:vif_type') not in not_bound) and port.get(
-            'binding:host_id') and (port['device_owner'] or port['device_id'])
+        ports = n_manager.NeutronManager.get_plugin().get_ports(
+            context, filters={'id': port_ids})
+        return set(port['id'] for port in ports if
+                   port.get('binding:vif_type') not in not_bound and
+                   port.get('binding:host_id') and
+                   (port['device_owner'] or port['device_id']))
 
-    def _is_service_target(self, context, pt_id):
-        return bool(ncp_model.get_service_targets_count(
-            context.session, pt_id))
@@ -87,11 +87,9 @@ class PolicyDriverManager(stevedore.named.NamedExtensionManager):
                  [driver.name for driver in self.ordered_policy_drivers])
 
     def initialize(self):
-        # Group Policy bulk operations requires each driver to support them.
-        # However, this is currently not supported at the plugin level,
-        # so setting it to False. When the plugin does support it, we can
-        # set it to True such that the drivers can override it.
-        self.native_bulk_support = False
+        # Group Policy bulk operations requires each driver to support them,
+        # a driver can override it by setting native_bulk_support to False.
+        self.native_bulk_support = True
         for driver in self.ordered_policy_drivers:
             LOG.info(_("Initializing policy driver '%s'"), driver.name)
             driver.obj.initialize()
@@ -133,12 +131,64 @@ class PolicyDriverManager(stevedore.named.NamedExtensionManager):
                 method=method_name
             )
 
+    def _call_bulk_on_drivers(self, method_name, contexts,
+                              continue_on_failure=False):
+        """Helper method for calling a bulk method across all drivers.
+
+        :param method_name: name of the per resource method, the bulk one
+        is called when the policy driver implements it, the per resource
+        one is called for each context otherwise
+        :param contexts: list of contexts to pass to the method call
+        :param continue_on_failure: whether or not to continue to call
+        all policy drivers once one has raised an exception
+        :raises: neutron.services.group_policy.common.GroupPolicyDriverError
+        if any policy driver call fails.
+        """
+        prefix, phase = method_name.rsplit('_', 1)
+        bulk_method_name = '%s_bulk_%s' % (prefix, phase)
+        error = False
+        drivers = (self.ordered_policy_drivers if not
+                   method_name.startswith('delete') else
+                   self.reverse_ordered_policy_drivers)
+        for driver in drivers:
+            try:
+                bulk_method = getattr(driver.obj, bulk_method_name, None)
+                if bulk_method:
+                    bulk_method(contexts)
+                else:
+                    for context in contexts:
+                        getattr(driver.obj, method_name)(context)
+            except gp_exc.GroupPolicyException:
+                # This is an exception for the user.
+                raise
+            except Exception:
+                # This is an internal failure.
+                LOG.exception(
+                    _("Policy driver '%(name)s' failed in %(method)s"),
+                    {'name': driver.name, 'method': bulk_method_name}
+                )
+                error = True
+                if not continue_on_failure:
+                    break
+        if error:
+            raise gp_exc.GroupPolicyDriverError(
+                method=bulk_method_name
+            )
+
     def create_policy_target_precommit(self, context):
         self._call_on_drivers("create_policy_target_precommit", context)
 
     def create_policy_target_postcommit(self, context):
         self._call_on_drivers("create_policy_target_postcommit", context)
 
+    def create_policy_target_bulk_precommit(self, contexts):
+        self._call_bulk_on_drivers("create_policy_target_precommit",
+                                   contexts)
+
+    def create_policy_target_bulk_postcommit(self, contexts):
+        self._call_bulk_on_drivers("create_policy_target_postcommit",
+                                   contexts)
+
     def update_policy_target_precommit(self, context):
         self._call_on_drivers("update_policy_target_precommit", context)
 
@@ -152,6 +202,14 @@ class PolicyDriverManager(stevedore.named.NamedExtensionManager):
         self._call_on_drivers("delete_policy_target_postcommit", context,
                               continue_on_failure=True)
 
+    def delete_policy_target_bulk_precommit(self, contexts):
+        self._call_bulk_on_drivers("delete_policy_target_precommit",
+                                   contexts)
+
+    def delete_policy_target_bulk_postcommit(self, contexts):
+        self._call_bulk_on_drivers("delete_policy_target_postcommit",
+                                   contexts, continue_on_failure=True)
+
     def create_policy_target_group_precommit(self, context):
         self._call_on_drivers("create_policy_target_group_precommit", context)
 
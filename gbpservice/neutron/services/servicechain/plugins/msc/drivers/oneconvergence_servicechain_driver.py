@@ -12,8 +12,11 @@
 
 import ast
 import copy
+import itertools
+import time
 
 import eventlet
+from eventlet import queue
 from heatclient import client as heat_client
 from neutron.api.v2 import attributes
 from neutron.common import log
@@ -33,6 +36,24 @@ eventlet.monkey_patch()
 
 LOG = logging.getLogger(__name__)
 
+insertion_opts = [
+    cfg.IntOpt('insertion_workers',
+               default=4,
+               help=_("Number of workers performing the service insertion "
+                      "of the service chain instances")),
+    cfg.IntOpt('insertion_queue_size',
+               default=256,
+               help=_("Maximum number of service chain instances waiting "
+                      "for service insertion. Chain operations block when "
+                      "the queue is full")),
+    cfg.IntOpt('stack_poll_interval',
+               default=5,
+               help=_("Wait time between two successive checks of the "
+                      "status of the service chain instance stacks")),
+]
+
+cfg.CONF.register_opts(insertion_opts, "oneconvergence_servicechain")
+
 
 class ServiceChainInstancePolicyMap(model_base.BASEV2):
     """NVSD Policy attached to the Service Chain Instance."""
@@ -56,6 +77,16 @@ class ServiceChainInstanceVipEPMap(model_base.BASEV2):
                           nullable=False, primary_key=True)
 
 
+class ServiceChainInstanceInsertion(model_base.BASEV2):
+    """Service insertion status of the Service Chain Instance."""
+
+    __tablename__ = 'nvsd_sc_instance_insertions'
+    instance_id = sa.Column(sa.String(36),
+                            nullable=False, primary_key=True)
+    status = sa.Column(sa.String(16), nullable=False)
+    status_details = sa.Column(sa.String(255))
+
+
 class PendingServiceChainInsertions(object):
     """Encapsulates a ServiceChain Insertion Operation"""
 
@@ -67,6 +98,9 @@ class PendingServiceChainInsertions(object):
         self.provider_ptg_id = provider_ptg_id
         self.consumer_ptg_id = consumer_ptg_id
         self.classifier_id = classifier_id
+        self.enqueued_at = time.time()
+        self.status_details = None
+        self.generation = None
 
 
 class OneconvergenceServiceChainDriver(simplechain_driver.SimpleChainDriver):
@@ -74,8 +108,26 @@ class OneconvergenceServiceChainDriver(simplechain_driver.SimpleChainDriver):
     STATUSES = (CREATE_IN_PROGRESS, CREATE_FAILED, CREATE_COMPLETE
                 ) = ('CREATE_IN_PROGRESS', 'CREATE_FAILED', 'CREATE_COMPLETE')
 
+    INSERTION_STATUSES = (INSERTION_PENDING, INSERTION_ACTIVE,
+                          INSERTION_ERROR) = ('PENDING', 'ACTIVE', 'ERROR')
+
     def __init__(self):
-        self.pending_chain_insertions = list()
+        # Pending insertions by chain instance ID. An instance ID is in the
+        # queue only while it has an entry here, a newer insertion for the
+        # same instance replaces the entry and supersedes the older one.
+        self.pending_chain_insertions = {}
+        # Generation of the latest insertion by chain instance ID. Insertions
+        # of an older generation, or of a deleted instance, are dropped.
+        self.insertion_generations = {}
+        self._generation_counter = itertools.count(1)
+        self.insertion_stats = {'processed': 0, 'failed': 0,
+                                'superseded': 0, 'last_latency': 0.0,
+                                'max_latency': 0.0, 'total_latency': 0.0}
+        conf = cfg.CONF.oneconvergence_servicechain
+        self._insertion_queue = queue.LightQueue(conf.insertion_queue_size)
+        self._insertion_workers = eventlet.GreenPool(conf.insertion_workers)
+        for x in range(conf.insertion_workers):
+            self._insertion_workers.spawn_n(self._insertion_worker)
         self.nvsd_api = napi.NVSDServiceApi()
 
     @log.log
@@ -110,7 +162,7 @@ class OneconvergenceServiceChainDriver(simplechain_driver.SimpleChainDriver):
                                     context.current['provider_ptg_id'],
                                     context.current['consumer_ptg_id'],
                                     context.current['classifier_id'])
-        eventlet.spawn_n(self._process_chain_processing, pendinginsertion)
+        self._enqueue_chain_insertion(pendinginsertion)
 
     @log.log
     def update_servicechain_instance_postcommit(self, context):
@@ -126,6 +178,10 @@ class OneconvergenceServiceChainDriver(simplechain_driver.SimpleChainDriver):
 
     @log.log
     def delete_servicechain_instance_postcommit(self, context):
+        self.pending_chain_insertions.pop(context.current['id'], None)
+        self.insertion_generations.pop(context.current['id'], None)
+        self._delete_chain_insertion_status(context._plugin_context.session,
+                                            context.current['id'])
         self.delete_nvsd_policy(context, context.current['id'])
         self._delete_chain_policy_map(context._plugin_context.session,
                                       context.current['id'])
@@ -258,7 +314,8 @@ class OneconvergenceServiceChainDriver(simplechain_driver.SimpleChainDriver):
                 'user_id': context._plugin_context.user,
                 'policy_target_group_id': ptg_id,
                 'port_id': port_id}
-        nvsd_ep = self.nvsd_api.create_endpoint(context._plugin_context, body)
+        nvsd_ep = self.nvsd_api.create_endpoint(context._plugin_context, body,
+                                                wait=True)
         ep_id = nvsd_ep['id']
         self._add_chain_nvsd_vip_ep_map(context._plugin_context.session,
                                     context.current['id'],
@@ -304,7 +361,7 @@ class OneconvergenceServiceChainDriver(simplechain_driver.SimpleChainDriver):
                                            context.current['provider_ptg_id'],
                                            context.current['consumer_ptg_id'],
                                            context.current['classifier_id'])
-        eventlet.spawn_n(self._process_chain_processing, pendinginsertion)
+        self._enqueue_chain_insertion(pendinginsertion)
 
     def _delete_chain_policy_map(self, session, sc_instance_id):
         with session.begin(subtransactions=True):
@@ -352,10 +409,136 @@ class OneconvergenceServiceChainDriver(simplechain_driver.SimpleChainDriver):
                     instance_id=sc_instance_id).first()
         return chain_nvsd_ep_map
 
-    def _process_chain_processing(self, pending_chain):
+    def _set_chain_insertion_status(self, session, sc_instance_id, status,
+                                    status_details=None):
+        with session.begin(subtransactions=True):
+            insertion = session.query(
+                ServiceChainInstanceInsertion).filter_by(
+                    instance_id=sc_instance_id).first()
+            if not insertion:
+                insertion = ServiceChainInstanceInsertion(
+                    instance_id=sc_instance_id)
+                session.add(insertion)
+            insertion.status = status
+            insertion.status_details = status_details
+
+    def _update_chain_insertion_status(self, session, sc_instance_id, status,
+                                       status_details=None):
+        # Unlike _set_chain_insertion_status this never creates the row, which
+        # is gone when the instance was deleted during the insertion
+        with session.begin(subtransactions=True):
+            session.query(ServiceChainInstanceInsertion).filter_by(
+                instance_id=sc_instance_id).update(
+                    {'status': status, 'status_details': status_details},
+                    synchronize_session=False)
+
+    def _delete_chain_insertion_status(self, session, sc_instance_id):
+        with session.begin(subtransactions=True):
+            session.query(ServiceChainInstanceInsertion).filter_by(
+                instance_id=sc_instance_id).delete()
+
+    def get_chain_insertion_status(self, session, sc_instance_id):
+        with session.begin(subtransactions=True):
+            insertion = session.query(
+                ServiceChainInstanceInsertion).filter_by(
+                    instance_id=sc_instance_id).first()
+        return insertion and insertion.status
+
+    def get_insertion_stats(self):
+        """Return the service insertion queue depth and latencies."""
+        stats = dict(self.insertion_stats)
+        stats['queue_depth'] = len(self.pending_chain_insertions)
+        stats['busy_workers'] = self._insertion_workers.running()
+        return stats
+
+    def _enqueue_chain_insertion(self, pending_chain):
+        pending_chain.generation = next(self._generation_counter)
+        self.insertion_generations[pending_chain.chain_instance_id] = (
+            pending_chain.generation)
+        self._set_chain_insertion_status(pending_chain.context.session,
+                                         pending_chain.chain_instance_id,
+                                         self.INSERTION_PENDING)
+        self._queue_chain_insertion(pending_chain)
+
+    def _queue_chain_insertion(self, pending_chain):
+        instance_id = pending_chain.chain_instance_id
+        queued = instance_id in self.pending_chain_insertions
+        self.pending_chain_insertions[instance_id] = pending_chain
+        if queued:
+            self.insertion_stats['superseded'] += 1
+            LOG.debug("Service insertion for chain instance %s superseded",
+                      instance_id)
+        else:
+            # Blocks the caller when the queue is full
+            self._insertion_queue.put(instance_id)
+
+    def _is_stale_insertion(self, pending_chain):
+        return (self.insertion_generations.get(
+            pending_chain.chain_instance_id) != pending_chain.generation)
+
+    def _requeue_chain_insertion(self, pending_chain):
+        instance_id = pending_chain.chain_instance_id
+        if instance_id not in self.insertion_generations:
+            LOG.debug("Chain instance %s deleted, service insertion dropped",
+                      instance_id)
+            return
+        if self._is_stale_insertion(pending_chain):
+            # A newer insertion was queued meanwhile
+            self.insertion_stats['superseded'] += 1
+            return
+        self._queue_chain_insertion(pending_chain)
+
+    def _insertion_worker(self):
         while True:
-            if self._perform_service_insertion(pending_chain):
-                return
+            instance_id = self._insertion_queue.get()
+            pending_chain = self.pending_chain_insertions.pop(instance_id,
+                                                              None)
+            if pending_chain:
+                self._process_chain_processing(pending_chain)
+
+    def _process_chain_processing(self, pending_chain):
+        try:
+            done = self._perform_service_insertion(pending_chain)
+        except Exception as e:
+            LOG.exception(_("Service insertion failed for chain instance "
+                            "%s"), pending_chain.chain_instance_id)
+            done, pending_chain.status_details = True, str(e)[:255]
+        if self._is_stale_insertion(pending_chain):
+            # The instance was updated or deleted during the insertion
+            LOG.debug("Service insertion for chain instance %s is stale",
+                      pending_chain.chain_instance_id)
+            return
+        if not done:
+            # Poll the stacks again later without holding a worker
+            eventlet.spawn_after(
+                cfg.CONF.oneconvergence_servicechain.stack_poll_interval,
+                self._requeue_chain_insertion, pending_chain)
+            return
+
+        if pending_chain.status_details:
+            status = self.INSERTION_ERROR
+            self.insertion_stats['failed'] += 1
+        else:
+            status = self.INSERTION_ACTIVE
+        latency = time.time() - pending_chain.enqueued_at
+        self.insertion_stats['processed'] += 1
+        self.insertion_stats['last_latency'] = latency
+        self.insertion_stats['total_latency'] += latency
+        self.insertion_stats['max_latency'] = max(
+            self.insertion_stats['max_latency'], latency)
+        LOG.debug("Service insertion for chain instance %(instance)s "
+                  "finished with status %(status)s in %(latency).2fs",
+                  {'instance': pending_chain.chain_instance_id,
+                   'status': status, 'latency': latency})
+        try:
+            self._update_chain_insertion_status(
+                pending_chain.context.session,
+                pending_chain.chain_instance_id, status,
+                pending_chain.status_details)
+        except Exception:
+            LOG.exception(_("Failed to update the service insertion status "
+                            "of chain instance %s"),
+                          pending_chain.chain_instance_id)
 
     def nvsd_get_service(self, context, service_id):
         return self.nvsd_api.get_nvsd_service(context,
@@ -474,8 +657,8 @@ class OneconvergenceServiceChainDriver(simplechain_driver.SimpleChainDriver):
         if status == self.CREATE_IN_PROGRESS:
             return False
         elif status == self.CREATE_FAILED:
-            # TODO(Magesh): Status has to be added to ServiceChainInstance
-            # Update the Status to ERROR  at this point
+            pending_chain.status_details = _("Service chain instance stacks "
+                                             "creation failed")
             return True
 
         # Services are created by now. Determine Service IDs an setup
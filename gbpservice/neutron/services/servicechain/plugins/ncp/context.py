@@ -15,6 +15,7 @@ from neutron import manager
 from neutron.plugins.common import constants as pconst
 
 from gbpservice.neutron.extensions import group_policy
+from gbpservice.neutron.extensions import servicechain as schain
 from gbpservice.neutron.services.servicechain.plugins.ncp import model
 
 
@@ -25,34 +26,11 @@ def get_gbp_plugin():
 def get_node_driver_context(sc_plugin, context, sc_instance,
                             current_node, original_node=None,
                             management_group=None, service_targets=None):
-    specs = sc_plugin.get_servicechain_specs(
-        context, filters={'id': sc_instance['servicechain_specs']})
-    position = _calculate_node_position(specs, current_node['id'])
-    provider = _get_ptg_or_ep(context, sc_instance['provider_ptg_id'])
-    consumer = _get_ptg_or_ep(context, sc_instance['consumer_ptg_id'])
-    current_profile = sc_plugin.get_service_profile(
-        context, current_node['service_profile_id'])
-    original_profile = sc_plugin.get_service_profile(
-        context,
-        original_node['service_profile_id']) if original_node else None
-    if not service_targets:
-        service_targets = model.get_service_targets(
-            context.session, servicechain_instance_id=sc_instance['id'],
-            position=position, servicechain_node_id=current_node['id'])
-
-    return NodeDriverContext(sc_plugin=sc_plugin,
-                             context=context,
-                             service_chain_instance=sc_instance,
-                             service_chain_specs=specs,
-                             current_service_chain_node=current_node,
-                             current_service_profile=current_profile,
-                             provider_group=provider,
-                             consumer_group=consumer,
-                             management_group=management_group,
-                             original_service_chain_node=original_node,
-                             original_service_profile=original_profile,
-                             service_targets=service_targets,
-                             position=position)
+    builder = ChainContextBuilder(sc_plugin, context, sc_instance,
+                                  management_group=management_group)
+    return builder.get_node_driver_context(current_node,
+                                           original_node=original_node,
+                                           service_targets=service_targets)
 
 
 def _get_ptg_or_ep(context, group_id):
@@ -67,13 +45,143 @@ def _get_ptg_or_ep(context, group_id):
     return group
 
 
-def _calculate_node_position(specs, node_id):
-    for spec in specs:
-        pos = 0
-        for node in spec['nodes']:
-            pos += 1
-            if node_id == node:
-                return pos
+class ChainContextBuilder(object):
+    """Builds the NodeDriverContexts of a Service Chain Instance.
+
+    Everything that the nodes of a chain have in common (specs, provider and
+    consumer groups, service profiles and service targets) is loaded once,
+    with a few bulk queries, and shared by all the node contexts built
+    through the same builder. Scheduled drivers and plumbing info are
+    memoized as well, so that each node is scheduled at most once per action.
+    """
+
+    def __init__(self, sc_plugin, context, sc_instance,
+                 management_group=None):
+        self._sc_plugin = sc_plugin
+        self._context = context
+        self._instance = sc_instance
+        self._management_group = management_group
+        self._specs = None
+        self._positions = None
+        self._nodes = None
+        self._groups = {}
+        self._profiles = {}
+        self._service_targets = None
+        self._scheduled = {}
+        self._plumbing_info = {}
+
+    @property
+    def instance(self):
+        return self._instance
+
+    @property
+    def specs(self):
+        if self._specs is None:
+            self._specs = self._sc_plugin.get_servicechain_specs(
+                self._context,
+                filters={'id': self._instance['servicechain_specs']})
+        return self._specs
+
+    def get_nodes(self):
+        """Get the nodes of the first spec of the instance."""
+        if self._nodes is None:
+            self._nodes = []
+            spec_ids = self._instance['servicechain_specs']
+            if spec_ids:
+                spec = [x for x in self.specs if x['id'] == spec_ids[0]]
+                if spec and spec[0]['nodes']:
+                    self._nodes = self._sc_plugin.get_servicechain_nodes(
+                        self._context, {'id': spec[0]['nodes']})
+        return self._nodes
+
+    def get_position(self, node_id):
+        if self._positions is None:
+            self._positions = {}
+            for spec in self.specs:
+                for pos, node in enumerate(spec['nodes'], 1):
+                    self._positions.setdefault(node, pos)
+        return self._positions.get(node_id)
+
+    def get_group(self, group_id):
+        if group_id not in self._groups:
+            self._groups[group_id] = _get_ptg_or_ep(self._context, group_id)
+        return self._groups[group_id]
+
+    def get_profile(self, profile_id):
+        if profile_id not in self._profiles:
+            self._load_profiles([profile_id])
+        if profile_id not in self._profiles:
+            raise schain.ServiceProfileNotFound(profile_id=profile_id)
+        return self._profiles[profile_id]
+
+    def get_service_targets(self, node_id, position):
+        if self._service_targets is None:
+            self._service_targets = {}
+            for target in model.get_service_targets(
+                    self._context.session,
+                    servicechain_instance_id=self._instance['id']):
+                self._service_targets.setdefault(
+                    target.servicechain_node_id, []).append(target)
+        targets = self._service_targets.get(node_id, [])
+        if position:
+            targets = [x for x in targets if x.position == position]
+        return targets
+
+    def get_node_driver_contexts(self, nodes):
+        """Build the contexts for a list of nodes of this instance.
+
+        Returns a dictionary of NodeDriverContexts keyed by node ID.
+        """
+        self._load_profiles([x['service_profile_id'] for x in nodes])
+        return dict((node['id'], self.get_node_driver_context(node))
+                    for node in nodes)
+
+    def get_node_driver_context(self, current_node, original_node=None,
+                                service_targets=None):
+        position = self.get_position(current_node['id'])
+        original_profile = self.get_profile(
+            original_node['service_profile_id']) if original_node else None
+        if not service_targets:
+            service_targets = self.get_service_targets(current_node['id'],
+                                                       position)
+        return NodeDriverContext(
+            sc_plugin=self._sc_plugin,
+            context=self._context,
+            service_chain_instance=self._instance,
+            service_chain_specs=self.specs,
+            current_service_chain_node=current_node,
+            current_service_profile=self.get_profile(
+                current_node['service_profile_id']),
+            provider_group=self.get_group(self._instance['provider_ptg_id']),
+            consumer_group=self.get_group(self._instance['consumer_ptg_id']),
+            management_group=self._management_group,
+            original_service_chain_node=original_node,
+            original_service_profile=original_profile,
+            service_targets=service_targets,
+            position=position)
+
+    def schedule(self, node_context, action):
+        """Schedule a node driver for a given action, at most once."""
+        key = (node_context.current_node['id'], action)
+        if key not in self._scheduled:
+            func = getattr(self._sc_plugin.driver_manager,
+                           'schedule_' + action)
+            self._scheduled[key] = func(node_context)
+        return self._scheduled[key]
+
+    def get_plumbing_info(self, node_context, driver):
+        key = (node_context.current_node['id'], driver.name)
+        if key not in self._plumbing_info:
+            self._plumbing_info[key] = driver.get_plumbing_info(node_context)
+        return self._plumbing_info[key]
+
+    def _load_profiles(self, profile_ids):
+        missing = set(profile_ids) - set(self._profiles)
+        missing.discard(None)
+        if missing:
+            for profile in self._sc_plugin.get_service_profiles(
+                    self._context, filters={'id': list(missing)}):
+                self._profiles[profile['id']] = profile
 
 
 class NodeDriverContext(object):
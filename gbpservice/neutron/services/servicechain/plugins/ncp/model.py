@@ -50,6 +50,11 @@ class ServiceTarget(model_base.BASEV2):
     """
 
     __tablename__ = 'ncp_service_targets'
+    __table_args__ = (
+        sa.Index('ix_ncp_service_targets_instance_node_position',
+                 'servicechain_instance_id', 'servicechain_node_id',
+                 'position'),
+    )
     policy_target_id = sa.Column(sa.String(36),
                                  sa.ForeignKey(gp_db.PolicyTarget.id,
                                                ondelete='CASCADE'),
@@ -101,6 +106,17 @@ def set_service_target(context, policy_target_id, relationship):
             session.add(owner)
 
 
+def set_service_targets(session, service_targets):
+    """Store several service targets at once.
+
+    :param service_targets: list of dictionaries of ServiceTarget attributes
+    """
+    if not service_targets:
+        return
+    with session.begin(subtransactions=True):
+        session.add_all([ServiceTarget(**x) for x in service_targets])
+
+
 def get_service_targets(session, policy_target_id=None, relationship=None,
                         servicechain_instance_id=None, position=None,
                         servicechain_node_id=None):
@@ -125,6 +141,16 @@ def get_service_targets_count(session, policy_target_id=None,
         return query.count()
 
 
+def get_service_target_policy_target_ids(session, policy_target_ids):
+    """Return which of the given policy targets are service targets."""
+    if not policy_target_ids:
+        return set()
+    with session.begin(subtransactions=True):
+        query = session.query(ServiceTarget.policy_target_id).filter(
+            ServiceTarget.policy_target_id.in_(policy_target_ids))
+        return set(x[0] for x in query.distinct())
+
+
 def _prepare_service_target_query(session, policy_target_id=None,
                                   relationship=None,
                                   servicechain_instance_id=None, position=None,
@@ -29,10 +29,8 @@ class ChainAgnosticPlumber(plumber_base.NodePlumberBase):
 
     @log.log
     def plug_services(self, context, deployment):
-        for part in deployment:
-            self._create_service_targets(context, part)
+        self._create_service_targets_bulk(context, deployment)
 
     @log.log
     def unplug_services(self, context, deployment):
-        for part in deployment:
-            self._delete_service_targets(context, part)
+        self._delete_service_targets_bulk(context, deployment)
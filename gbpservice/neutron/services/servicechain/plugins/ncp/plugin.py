@@ -240,6 +240,15 @@ class NodeCompositionPlugin(servicechain_db.ServiceChainDbPlugin,
         """
         self._update_chains_pt_modified(context, policy_target, 'added')
 
+    def update_chains_pts_added(self, context, policy_targets):
+        """ Auto scaling function.
+
+        Notify the correct set of node drivers that new policy targets have
+        been added to relevant PTGs. The chains of each PTG are retrieved
+        only once.
+        """
+        self._update_chains_pts_modified(context, policy_targets, 'added')
+
     def update_chains_pt_removed(self, context, policy_target):
         """ Auto scaling function.
 
@@ -249,25 +258,30 @@ class NodeCompositionPlugin(servicechain_db.ServiceChainDbPlugin,
         self._update_chains_pt_modified(context, policy_target, 'removed')
 
     def _update_chains_pt_modified(self, context, policy_target, action):
-        scis = self._get_instances_from_policy_target(context, policy_target)
-
-        for sci in scis:
-            updaters = self._get_scheduled_drivers(context, sci, 'update')
-            for update in updaters.values():
-                try:
-                    getattr(update['driver'],
-                            'update_policy_target_' + action)(
-                                update['context'], policy_target)
-                except exc.NodeDriverError as ex:
-                    LOG.error(_("Node Update on policy target modification "
-                                "failed, %s"), ex.message)
-
-    def _get_instance_nodes(self, context, instance):
-        if not instance['servicechain_specs']:
-            return []
-        specs = self.get_servicechain_spec(
-            context, instance['servicechain_specs'][0])
-        return self.get_servicechain_nodes(context, {'id': specs['nodes']})
+        self._update_chains_pts_modified(context, [policy_target], action)
+
+    def _update_chains_pts_modified(self, context, policy_targets, action):
+        pts_by_ptg = {}
+        for policy_target in policy_targets:
+            pts_by_ptg.setdefault(policy_target.get('policy_target_group_id'),
+                                  []).append(policy_target)
+
+        for ptg_pts in pts_by_ptg.values():
+            scis = self._get_instances_from_policy_target(context,
+                                                          ptg_pts[0])
+            for sci in scis:
+                updaters = self._get_scheduled_drivers(context, sci,
+                                                       'update')
+                for update in updaters.values():
+                    for policy_target in ptg_pts:
+                        try:
+                            getattr(update['driver'],
+                                    'update_policy_target_' + action)(
+                                        update['context'], policy_target)
+                        except exc.NodeDriverError as ex:
+                            LOG.error(_("Node Update on policy target "
+                                        "modification failed, %s"),
+                                      ex.message)
 
     def _get_node_instances(self, context, node):
         specs = self.get_servicechain_specs(
@@ -279,21 +293,21 @@ class NodeCompositionPlugin(servicechain_db.ServiceChainDbPlugin,
         return result
 
     def _get_scheduled_drivers(self, context, instance, action):
-        nodes = self._get_instance_nodes(context, instance)
+        builder = ctx.ChainContextBuilder(self, context, instance)
+        nodes = builder.get_nodes()
+        node_contexts = builder.get_node_driver_contexts(nodes)
         result = {}
-        func = getattr(self.driver_manager, 'schedule_' + action)
         for node in nodes:
-            node_context = ctx.get_node_driver_context(
-                self, context, instance, node)
-            driver = func(node_context)
+            node_context = node_contexts[node['id']]
+            driver = builder.schedule(node_context, action)
             if not driver:
                 raise exc.NoDriverAvailableForAction(action=action,
                                                      node_id=node['id'])
             result[node['id']] = {}
             result[node['id']]['driver'] = driver
             result[node['id']]['context'] = node_context
-            result[node['id']]['plumbing_info'] = driver.get_plumbing_info(
-                node_context)
+            result[node['id']]['plumbing_info'] = builder.get_plumbing_info(
+                node_context, driver)
         return result
 
     def _deploy_servicechain_nodes(self, context, deployers):
@@ -14,6 +14,7 @@ import abc
 import six
 
 from oslo_log import log as logging
+from oslo_utils import excutils
 
 from gbpservice.neutron.extensions import group_policy
 from gbpservice.neutron.services.servicechain.plugins.ncp import exceptions
@@ -84,60 +85,105 @@ class NodePlumberBase(object):
         """
 
     def _create_service_targets(self, context, part):
-        info = part['plumbing_info']
-        if not info:
-            return
-        part_context = part['context']
-        provider = part_context.provider
-        consumer = part_context.consumer
-        management = part_context.management
-
-        self._create_service_target(context, part_context,
-                                    info.get('provider', []),
-                                    provider, 'provider')
-        self._create_service_target(context, part_context,
-                                    info.get('consumer', []),
-                                    consumer, 'consumer')
-        self._create_service_target(context, part_context,
-                                    info.get('management', []),
-                                    management, 'management')
+        self._create_service_targets_bulk(context, [part])
 
     def _delete_service_targets(self, context, part):
+        self._delete_service_targets_bulk(context, [part])
+
+    def _create_service_targets_bulk(self, context, deployment):
+        """Create all the service targets needed by a deployment.
+
+        The policy targets of all the nodes and relationships are created in
+        a single pass, natively in bulk whenever the GBP plugin supports it,
+        and the corresponding Service Targets are then stored at once.
+        """
+        requests = []
+        for part in deployment:
+            requests.extend(self._get_service_target_requests(part))
+        if not requests:
+            return
+        gbp_plugin = requests[0][0].gbp_plugin
+        created = []
+        try:
+            bulk_create = getattr(gbp_plugin, 'create_policy_target_bulk',
+                                  None)
+            if bulk_create:
+                created = bulk_create(
+                    context, {'policy_targets': [{'policy_target': x[2]}
+                                                 for x in requests]},
+                    notify_sc=False)
+            else:
+                for request in requests:
+                    created.append(gbp_plugin.create_policy_target(
+                        context, {'policy_target': request[2]},
+                        notify_sc=False))
+        except Exception:
+            # Keep track of the PTs created so far, so that they are
+            # disposed on unplug.
+            with excutils.save_and_reraise_exception():
+                self._set_service_targets(context, requests, created)
+        self._set_service_targets(context, requests, created)
+
+    def _delete_service_targets_bulk(self, context, deployment):
+        """Delete all the service targets owned by a deployment."""
+        nodes_by_instance = {}
+        gbp_plugin = None
+        for part in deployment:
+            part_context = part['context']
+            gbp_plugin = part_context.gbp_plugin
+            nodes_by_instance.setdefault(
+                part_context.instance['id'], set()).add(
+                    part_context.current_node['id'])
+
+        for instance_id, node_ids in nodes_by_instance.items():
+            pts = model.get_service_targets(
+                context.session, servicechain_instance_id=instance_id)
+            for pt in pts:
+                if pt.servicechain_node_id not in node_ids:
+                    continue
+                try:
+                    gbp_plugin.delete_policy_target(
+                        context, pt.policy_target_id, notify_sc=False)
+                except group_policy.PolicyTargetNotFound as ex:
+                    LOG.debug(ex.message)
+
+    def _get_service_target_requests(self, part):
+        info = part['plumbing_info']
+        if not info:
+            return []
         part_context = part['context']
-        node = part_context.current_node
-        instance = part_context.instance
-        gbp_plugin = part_context.gbp_plugin
-        pts = model.get_service_targets(
-            context.session, servicechain_instance_id=instance['id'],
-            servicechain_node_id=node['id'])
-
-        for pt in pts:
-            try:
-                gbp_plugin.delete_policy_target(context, pt.policy_target_id,
-                                                notify_sc=False)
-            except group_policy.PolicyTargetNotFound as ex:
-                LOG.debug(ex.message)
-
-    def _create_service_target(self, context, part_context, targets, group,
-                               relationship):
         instance = part_context.instance
         node = part_context.current_node
-        gbp_plugin = part_context.gbp_plugin
-        for target in targets:
-            if not group:
-                exceptions.NotAvailablePTGForTargetRequest(
-                    ptg_type=relationship, instance=instance['id'],
-                    node=node['id'])
-            data = {'policy_target_group_id': group['id'],
-                    'description': TARGET_DESCRIPTION % (relationship,
-                                                         node['id'],
-                                                         instance['id']),
-                    'name': '', 'port_id': None}
-            data.update(target)
-            pt = gbp_plugin.create_policy_target(context,
-                                                 {'policy_target': data},
-                                                 notify_sc=False)
-            model.set_service_target(part_context, pt['id'], relationship)
+        groups = {model.PROVIDER: part_context.provider,
+                  model.CONSUMER: part_context.consumer,
+                  model.MANAGEMENT: part_context.management}
+        requests = []
+        for relationship in model.RELATIONSHIPS:
+            group = groups[relationship]
+            for target in info.get(relationship, []):
+                if not group:
+                    raise exceptions.NotAvailablePTGForTargetRequest(
+                        ptg_type=relationship, instance=instance['id'],
+                        node=node['id'])
+                data = {'policy_target_group_id': group['id'],
+                        'description': TARGET_DESCRIPTION % (relationship,
+                                                             node['id'],
+                                                             instance['id']),
+                        'name': '', 'port_id': None}
+                data.update(target)
+                requests.append((part_context, relationship, data))
+        return requests
+
+    def _set_service_targets(self, context, requests, policy_targets):
+        model.set_service_targets(
+            context.session,
+            [{'policy_target_id': pt['id'],
+              'servicechain_instance_id': part_context.instance['id'],
+              'servicechain_node_id': part_context.current_node['id'],
+              'position': part_context.current_position,
+              'relationship': relationship}
+             for (part_context, relationship, _), pt in zip(requests,
+                                                            policy_targets)])
 
     def _sort_deployment(self, deployment):
         deployment.sort(key=lambda x: x['context'].current_position)
\ No newline at end of file
@@ -0,0 +1,119 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import functools
+import json
+import os
+import time
+import timeit
+
+from neutron.tests import base
+from sqlalchemy import event
+
+# File the results are appended to, one JSON document per line
+RESULTS_FILE_ENV = 'GBP_BENCHMARK_RESULTS'
+
+
+class SQLCounter(object):
+    """Count the SQL statements executed on an engine."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _executed(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._executed)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._executed)
+
+
+class CallCounter(object):
+    """Count the calls to the API methods of a plugin.
+
+    Only the calls made from the outside are counted, not the ones the
+    plugin makes to itself while serving them.
+    """
+
+    PREFIXES = ('create_', 'get_', 'update_', 'delete_',
+                'add_router_interface', 'remove_router_interface')
+
+    def __init__(self, plugin):
+        self.plugin = plugin
+        self.calls = collections.Counter()
+        self._depth = 0
+        self._wrapped = []
+
+    @property
+    def count(self):
+        return sum(self.calls.values())
+
+    def _wrap(self, name, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if not self._depth:
+                self.calls[name] += 1
+            self._depth += 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._depth -= 1
+        return wrapper
+
+    def __enter__(self):
+        for name in dir(type(self.plugin)):
+            if (name.startswith(self.PREFIXES) and
+                    name not in vars(self.plugin) and
+                    callable(getattr(self.plugin, name))):
+                setattr(self.plugin, name,
+                        self._wrap(name, getattr(self.plugin, name)))
+                self._wrapped.append(name)
+        return self
+
+    def __exit__(self, *exc_info):
+        for name in self._wrapped:
+            delattr(self.plugin, name)
+        self._wrapped = []
+
+
+class BenchmarkTestCase(base.BaseTestCase):
+    """Base class of the benchmarks.
+
+    The benchmarks are regular test cases (so they are run by testr with
+    OS_TEST_PATH pointing here, see the tox benchmark environment) which
+    record their measurements with record().
+    """
+
+    def measure(self, func, repeat=3):
+        """Run func repeat times, return its result and best wall time."""
+        best = None
+        for x in range(repeat):
+            start = timeit.default_timer()
+            result = func()
+            elapsed = timeit.default_timer() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return result, best
+
+    def record(self, scenario, **metrics):
+        path = os.environ.get(RESULTS_FILE_ENV)
+        if not path:
+            return
+        result = {'benchmark': self.id(), 'scenario': scenario,
+                  'timestamp': time.time()}
+        result.update(metrics)
+        with open(path, 'a') as results:
+            results.write(json.dumps(result, sort_keys=True) + '\n')
@@ -0,0 +1,199 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import timeit
+
+from neutron.db import api as db_api
+from oslo_config import cfg
+import webob.exc
+
+from gbpservice.neutron.tests.benchmarks import base
+from gbpservice.neutron.tests.unit.services.grouppolicy import (
+    test_resource_mapping as test_rmd)
+
+# Number of PTs in the PTG
+MEMBERS = (10, 100, 1000)
+# Number of rules in the PRS, number of PTGs providing it
+PRS_SIZES = ((1, 10), (10, 10), (10, 50), (50, 10))
+# Number of tenants with an L3P and an EP on the ES
+ES_TENANTS = (1, 10, 50)
+# Number of nodes in the chain, number of PTGs consuming it
+CHAIN_SIZES = ((1, 1), (3, 1), (1, 10))
+
+
+class TestGroupPolicyPluginBenchmark(test_rmd.ResourceMappingTestCase,
+                                     base.BenchmarkTestCase):
+    """Cost of the canonical GBP workflows.
+
+    The API requests are served by the GroupPolicyPlugin with the
+    implicit_policy and resource_mapping drivers on top of ML2, on the
+    unit test database. For each scenario the number of SQL statements, the
+    number of calls to the core plugin and the wall time are recorded.
+    """
+
+    def setUp(self):
+        super(TestGroupPolicyPluginBenchmark, self).setUp()
+        # The scenarios go way beyond the default quotas
+        for resource in ('network', 'subnet', 'port', 'router',
+                         'security_group', 'security_group_rule'):
+            cfg.CONF.set_override('quota_%s' % resource, -1, group='QUOTAS')
+
+    def profile(self, func):
+        """Run func once, return its result and what it cost."""
+        with base.SQLCounter(db_api.get_engine()) as sql:
+            with base.CallCounter(self._plugin) as core:
+                start = timeit.default_timer()
+                result = func()
+                elapsed = timeit.default_timer() - start
+        return result, {'seconds': elapsed,
+                        'sql_statements': sql.count,
+                        'core_plugin_calls': core.count,
+                        'core_plugin_calls_by_method': dict(core.calls)}
+
+    def _create(self, collection, resource, **attrs):
+        attrs.setdefault('tenant_id', self._tenant_id)
+        req = self.new_create_request(collection, {resource: attrs},
+                                      self.fmt)
+        res = req.get_response(self.ext_api)
+        self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+        return self.deserialize(self.fmt, res)[resource]
+
+    def _create_servicechain_spec(self, nodes):
+        node_ids = []
+        for x in range(nodes):
+            profile = self._create(test_rmd.SERVICE_PROFILES,
+                                   'service_profile',
+                                   service_type='LOADBALANCER')
+            node_ids.append(self._create(
+                test_rmd.SERVICECHAIN_NODES, 'servicechain_node',
+                service_profile_id=profile['id'], config='{}')['id'])
+        return self._create(test_rmd.SERVICECHAIN_SPECS, 'servicechain_spec',
+                            nodes=node_ids)['id']
+
+    def _create_policy_rule_set(self, rules, tenant_id=None,
+                                action_type='allow', action_value=None):
+        tenant_id = tenant_id or self._tenant_id
+        attrs = {'action_value': action_value} if action_value else {}
+        action = self.create_policy_action(
+            action_type=action_type, tenant_id=tenant_id,
+            **attrs)['policy_action']
+        rule_ids = []
+        for port in range(1, rules + 1):
+            classifier = self.create_policy_classifier(
+                protocol='TCP', port_range=str(port), direction='bi',
+                tenant_id=tenant_id)['policy_classifier']
+            rule_ids.append(self.create_policy_rule(
+                policy_classifier_id=classifier['id'],
+                policy_actions=[action['id']],
+                tenant_id=tenant_id)['policy_rule']['id'])
+        return self.create_policy_rule_set(
+            policy_rules=rule_ids, tenant_id=tenant_id)['policy_rule_set']
+
+    def test_policy_target_create_delete(self):
+        for index, members in enumerate(MEMBERS):
+            # Big enough subnets for all the members
+            l3p = self.create_l3_policy(
+                ip_pool='10.%s.0.0/16' % index,
+                subnet_prefix_length=20)['l3_policy']
+            l2p = self.create_l2_policy(
+                l3_policy_id=l3p['id'])['l2_policy']
+            ptg_id = self.create_policy_target_group(
+                l2_policy_id=l2p['id'])['policy_target_group']['id']
+
+            body = {'policy_targets': [
+                {'policy_target': {'policy_target_group_id': ptg_id,
+                                   'tenant_id': self._tenant_id}}
+                for x in range(members)]}
+            req = self.new_create_request('policy_targets', body, self.fmt)
+            res, costs = self.profile(lambda: req.get_response(self.ext_api))
+            self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+            self.record('pt_bulk_create', members=members, **costs)
+
+            pt, costs = self.profile(lambda: self.create_policy_target(
+                policy_target_group_id=ptg_id,
+                expected_res_status=201)['policy_target'])
+            self.record('pt_create', members=members, **costs)
+
+            _, costs = self.profile(lambda: self.delete_policy_target(
+                pt['id'], expected_res_status=204))
+            self.record('pt_delete', members=members, **costs)
+
+            _, costs = self.profile(lambda: self.delete_policy_target_group(
+                ptg_id, expected_res_status=204))
+            self.record('ptg_delete', members=members, **costs)
+
+    def test_policy_rule_set_attach(self):
+        for rules, ptgs in PRS_SIZES:
+            prs = self._create_policy_rule_set(rules)
+            ptg_ids = [self.create_policy_target_group()[
+                'policy_target_group']['id'] for x in range(ptgs)]
+
+            def attach():
+                for ptg_id in ptg_ids:
+                    self.update_policy_target_group(
+                        ptg_id, provided_policy_rule_sets={prs['id']: ''},
+                        expected_res_status=200)
+
+            _, costs = self.profile(attach)
+            self.record('prs_attach', rules=rules, ptgs=ptgs, **costs)
+
+    def test_external_segment_route_update(self):
+        for index, tenants in enumerate(ES_TENANTS):
+            cidr = '172.%s.0.0/16' % (16 + index)
+            with self.network(router__external=True, shared=True,
+                              tenant_id='admin') as net:
+                with self.subnet(cidr=cidr, network=net) as sub:
+                    es = self.create_external_segment(
+                        subnet_id=sub['subnet']['id'], shared=True,
+                        tenant_id='admin')['external_segment']
+                    for x in range(tenants):
+                        tenant_id = 'tenant-%s-%s' % (index, x)
+                        self.create_l3_policy(
+                            ip_pool='10.0.0.0/16', tenant_id=tenant_id,
+                            external_segments={es['id']: []})
+                        prs = self._create_policy_rule_set(
+                            1, tenant_id=tenant_id)
+                        self.create_external_policy(
+                            external_segments=[es['id']],
+                            provided_policy_rule_sets={prs['id']: ''},
+                            tenant_id=tenant_id)
+
+                    route = {'destination': '192.0.2.0/24', 'nexthop': None}
+                    _, costs = self.profile(
+                        lambda: self.update_external_segment(
+                            es['id'], external_routes=[route],
+                            is_admin_context=True, expected_res_status=200))
+                    self.record('es_route_add', tenants=tenants, **costs)
+
+                    _, costs = self.profile(
+                        lambda: self.update_external_segment(
+                            es['id'], external_routes=[],
+                            is_admin_context=True, expected_res_status=200))
+                    self.record('es_route_remove', tenants=tenants, **costs)
+
+    def test_servicechain_create(self):
+        for nodes, consumers in CHAIN_SIZES:
+            scs_id = self._create_servicechain_spec(nodes)
+            prs = self._create_policy_rule_set(
+                1, action_type='redirect', action_value=scs_id)
+            self.create_policy_target_group(
+                provided_policy_rule_sets={prs['id']: ''})
+
+            def consume():
+                for x in range(consumers):
+                    self.create_policy_target_group(
+                        consumed_policy_rule_sets={prs['id']: ''},
+                        expected_res_status=201)
+
+            _, costs = self.profile(consume)
+            self.record('chain_create', nodes=nodes, consumers=consumers,
+                        **costs)
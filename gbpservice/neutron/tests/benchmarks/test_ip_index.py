@@ -0,0 +1,99 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import netaddr
+
+from gbpservice.neutron.services.grouppolicy.common import ip_index
+from gbpservice.neutron.tests.benchmarks import base
+
+
+def _cidrs(count, prefix_length=24, supernet='10.0.0.0/8'):
+    subnets = netaddr.IPNetwork(supernet).subnet(prefix_length)
+    return [str(next(subnets)) for x in range(count)]
+
+
+class TestCIDRIndexBenchmark(base.BenchmarkTestCase):
+    """Compare the CIDR index to the IPSet based validation it replaced."""
+
+    def _compare(self, scenario, legacy, indexed):
+        legacy_result, legacy_time = self.measure(legacy)
+        index_result, index_time = self.measure(indexed)
+        self.assertEqual(legacy_result, index_result)
+        self.record(scenario, legacy_seconds=legacy_time,
+                    index_seconds=index_time,
+                    speedup=legacy_time / max(index_time, 1e-9))
+
+    def test_implicit_subnet_allocation(self):
+        # Look for the first free subnet of an L3P with count subnets in use
+        def legacy(pool, subnets):
+            for cidr in netaddr.IPNetwork(pool).subnet(24):
+                candidate = netaddr.IPSet([cidr])
+                if not any(netaddr.IPSet([x]) & candidate for x in subnets):
+                    return str(cidr)
+
+        def indexed(pool, subnets):
+            used = ip_index.CIDRIndex(subnets)
+            for cidr in netaddr.IPNetwork(pool).subnet(24):
+                if not used.overlaps(cidr):
+                    return str(cidr)
+
+        for count in (10, 100, 300):
+            subnets = _cidrs(count)
+            self._compare('subnets=%s' % count,
+                          lambda: legacy('10.0.0.0/8', subnets),
+                          lambda: indexed('10.0.0.0/8', subnets))
+
+    def test_l3_policy_ip_pool_overlap(self):
+        # Validate a new IP pool against the pools of the tenant's L3Ps
+        def legacy(pools, new_pool):
+            return bool(netaddr.IPSet([new_pool]) & netaddr.IPSet(pools))
+
+        def indexed(pools, new_pool):
+            return ip_index.CIDRIndex(pools).overlaps(new_pool)
+
+        for count in (10, 100, 1000):
+            pools = _cidrs(count)
+            self._compare('l3ps=%s' % count,
+                          lambda: legacy(pools, '11.0.0.0/16'),
+                          lambda: indexed(pools, '11.0.0.0/16'))
+
+    def test_external_routes_overlap(self):
+        # Validate the routes added to an ES against the pools of its L3Ps
+        def legacy(routes, pools):
+            added = netaddr.IPSet(routes)
+            return [x for x in pools if netaddr.IPSet([x]) & added]
+
+        def indexed(routes, pools):
+            added = ip_index.CIDRIndex(routes)
+            return [x for x in pools if added.overlaps(x)]
+
+        for routes, l3ps in ((10, 10), (100, 100), (1000, 300)):
+            destinations = _cidrs(routes, 24, '172.16.0.0/12')
+            pools = _cidrs(l3ps)
+            self._compare('routes=%s,l3ps=%s' % (routes, l3ps),
+                          lambda: legacy(destinations, pools),
+                          lambda: indexed(destinations, pools))
+
+    def test_next_hops_in_segment(self):
+        def legacy(next_hops, cidr):
+            added = netaddr.IPSet(next_hops)
+            return added & netaddr.IPSet([cidr]) == added
+
+        def indexed(next_hops, cidr):
+            segment = ip_index.CIDRIndex([cidr])
+            return all(segment.contains(x) for x in next_hops)
+
+        for count in (10, 100, 1000):
+            next_hops = _cidrs(count, 32, '192.168.0.0/16')
+            self._compare('next_hops=%s' % count,
+                          lambda: legacy(next_hops, '192.168.0.0/16'),
+                          lambda: indexed(next_hops, '192.168.0.0/16'))
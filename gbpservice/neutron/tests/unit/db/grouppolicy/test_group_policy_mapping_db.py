@@ -13,10 +13,14 @@
 
 import webob.exc
 
+from neutron import context
 from neutron.tests.unit.extensions import test_l3
 from neutron.tests.unit import testlib_api
 
+from gbpservice.neutron.db.grouppolicy import group_policy_db as gpdb
 from gbpservice.neutron.db.grouppolicy import group_policy_mapping_db as gpmdb
+from gbpservice.neutron.db import servicechain_db as scdb
+from gbpservice.neutron.services.grouppolicy.drivers import resource_mapping
 from gbpservice.neutron.tests.unit.db.grouppolicy import (
     test_group_policy_db as tgpdb)
 
@@ -234,3 +238,47 @@ class TestMappedGroupResourceAttrs(GroupPolicyMappingDbTestCase):
                 self._test_list_resources(
                             'external_segment', [external_segments[0]],
                             query_params='subnet_id=' + subnets[0])
+
+
+class TestLookupIndexes(GroupPolicyMappingDbTestCase):
+
+    def _assert_uses_index(self, model, index='INDEX', **filters):
+        session = context.get_admin_context().session
+        statement = session.query(model).filter_by(**filters).statement
+        sql = str(statement.compile(dialect=session.bind.dialect,
+                                    compile_kwargs={'literal_binds': True}))
+        plan = ' '.join(str(row[-1]) for row in
+                        session.execute('EXPLAIN QUERY PLAN ' + sql))
+        self.assertIn(index, plan)
+
+    def test_hot_lookups_use_indexes(self):
+        self._assert_uses_index(gpmdb.PolicyTargetMapping, port_id='p')
+        self._assert_uses_index(
+            gpdb.PolicyTarget, 'ix_gp_policy_targets_policy_target_group_id',
+            policy_target_group_id='ptg')
+        self._assert_uses_index(
+            gpdb.PolicyTargetGroup, 'ix_gp_policy_target_groups_l2_policy_id',
+            l2_policy_id='l2p')
+        self._assert_uses_index(gpdb.L2Policy,
+                                'ix_gp_l2_policies_l3_policy_id',
+                                l3_policy_id='l3p')
+        self._assert_uses_index(gpmdb.L2PolicyMapping, network_id='net')
+        self._assert_uses_index(gpdb.L3Policy,
+                                'ix_gp_l3_policies_tenant_id_name',
+                                tenant_id='tenant', name='default')
+        self._assert_uses_index(gpdb.ExternalSegment,
+                                'ix_gp_external_segments_name',
+                                name='default')
+        mapping = resource_mapping.PtgServiceChainInstanceMapping
+        self._assert_uses_index(
+            mapping, 'ix_gpm_ptgs_servicechain_mapping_provider_ptg_id',
+            provider_ptg_id='ptg')
+        self._assert_uses_index(
+            mapping, 'ix_gpm_ptgs_servicechain_mapping_consumer_ptg_id',
+            consumer_ptg_id='ptg')
+        self._assert_uses_index(scdb.ServiceChainInstance,
+                                'ix_sc_instances_provider_ptg_id',
+                                provider_ptg_id='ptg')
+        self._assert_uses_index(scdb.ServiceChainInstance,
+                                'ix_sc_instances_consumer_ptg_id',
+                                consumer_ptg_id='ptg')
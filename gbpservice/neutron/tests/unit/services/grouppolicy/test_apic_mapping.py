@@ -202,6 +202,70 @@ class TestPolicyTarget(ApicMappingTestCase):
             # Path deleted 1 time
             self.assertEqual(mgr.ensure_path_deleted_for_port.call_count, 1)
 
+    def test_policy_target_path_locked_per_host_segment(self):
+        ptg = self.create_policy_target_group()['policy_target_group']
+        subnet = self._get_object('subnets', ptg['subnets'][0], self.api)
+        with self.port(subnet=subnet) as port:
+            self._bind_port_to_host(port['port']['id'], 'h1')
+            with mock.patch.object(amap.lockutils, 'lock',
+                                   wraps=amap.lockutils.lock) as lock:
+                pt = self.create_policy_target(
+                    policy_target_group_id=ptg['id'],
+                    port_id=port['port']['id'])
+                self.assertEqual(1, lock.call_count)
+                lock_name = lock.call_args[0][0]
+                self.assertTrue(lock_name.startswith('apic-portlock-h1-'))
+                self.new_delete_request(
+                    'policy_targets', pt['policy_target']['id'],
+                    self.fmt).get_response(self.ext_api)
+                # Creation and deletion serialized on the same path lock
+                self.assertEqual([mock.call(lock_name)] * 2,
+                                 lock.call_args_list)
+            mgr = self.driver.apic_manager
+            self.assertEqual(mgr.ensure_path_deleted_for_port.call_count, 1)
+
+    def test_get_gbp_details_list(self):
+        ptg = self.create_policy_target_group(
+            name="ptg1")['policy_target_group']
+        pts = [self.create_policy_target(
+            policy_target_group_id=ptg['id'])['policy_target']
+            for x in range(2)]
+        for pt in pts:
+            self._bind_port_to_host(pt['port_id'], 'h1')
+        ctx = context.get_admin_context()
+        devices = [pts[0]['port_id'], 'unknown', pts[1]['port_id']]
+
+        details = self.driver.get_gbp_details_list(ctx, devices=devices,
+                                                   host='h1')
+        expected = [self.driver.get_gbp_details(ctx, device=x, host='h1')
+                    if x != 'unknown' else None for x in devices]
+        self.assertEqual(expected, details)
+        self.assertEqual(ptg['id'], details[0]['ptg_id'])
+        self.assertEqual([], self.driver.get_gbp_details_list(
+            ctx, devices=[], host='h1'))
+
+    def test_irrelevant_port_update_skipped(self):
+        ptg = self.create_policy_target_group(
+            name="ptg1")['policy_target_group']
+        pt = self.create_policy_target(
+            policy_target_group_id=ptg['id'])['policy_target']
+        self._bind_port_to_host(pt['port_id'], 'h1')
+        mech = (manager.NeutronManager.get_plugin().mechanism_manager.
+                mech_drivers['apic_gbp'].obj)
+        skipped = mech.update_filter.skipped['port']
+
+        with mock.patch.object(self.driver,
+                               'process_port_changed') as port_changed:
+            data = {'port': {'name': 'new-name'}}
+            req = self.new_update_request('ports', data, pt['port_id'],
+                                          self.fmt)
+            req.get_response(self.api)
+            self.assertFalse(port_changed.called)
+            self.assertEqual(skipped + 1, mech.update_filter.skipped['port'])
+
+            self._bind_port_to_host(pt['port_id'], 'h2')
+            self.assertEqual(1, port_changed.call_count)
+
     def test_policy_target_port_not_deleted(self):
         # Create 2 EP same PTG same host bound
         ptg = self.create_policy_target_group(
@@ -396,6 +460,37 @@ class TestPolicyTargetGroup(ApicMappingTestCase):
     def test_process_subnet_update_shared(self):
         self._test_process_subnet_update(shared=True)
 
+    def test_ptg_update_single_apic_transaction(self):
+        old = self.create_policy_rule_set(name='c0')['policy_rule_set']
+        prss = [self.create_policy_rule_set(name='c%s' % x)[
+            'policy_rule_set'] for x in range(1, 4)]
+        ptg = self.create_policy_target_group(
+            provided_policy_rule_sets={old['id']: 'scope'})[
+                'policy_target_group']
+        self.driver.apic_manager.apic.transaction = mock.Mock(
+            side_effect=self.fake_transaction)
+
+        data = {'policy_target_group': {
+            'provided_policy_rule_sets': {prss[0]['id']: 'scope',
+                                          prss[1]['id']: 'scope'},
+            'consumed_policy_rule_sets': {prss[2]['id']: 'scope'}}}
+        req = self.new_update_request('policy_target_groups', data,
+                                      ptg['id'], self.fmt)
+        res = req.get_response(self.ext_api)
+        self.assertEqual(webob.exc.HTTPOk.code, res.status_int)
+
+        # All the helpers joined the transaction opened for the request
+        trs = self.driver.apic_manager.apic.transaction
+        new_transactions = [x for x in trs.call_args_list
+                            if x != mock.call('transaction')]
+        self.assertEqual([mock.call(None)], new_transactions)
+        mgr = self.driver.apic_manager
+        self.assertEqual(3, mgr.set_contract_for_epg.call_count)
+        mgr.unset_contract_for_epg.assert_called_once_with(
+            ptg['tenant_id'], ptg['id'], old['id'],
+            contract_owner=old['tenant_id'], transaction='transaction',
+            provider=True)
+
     def _create_explicit_subnet_ptg(self, cidr, shared=False):
         l2p = self.create_l2_policy(name="l2p", shared=shared)
         l2p_id = l2p['l2_policy']['id']
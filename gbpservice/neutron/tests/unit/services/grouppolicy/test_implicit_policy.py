@@ -11,11 +11,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import mock
+from neutron import context as nctx
 from neutron.db import api as db_api
 from neutron.db import model_base
 from oslo_config import cfg
 import webob.exc
 
+from gbpservice.neutron.services.grouppolicy.drivers import implicit_policy
 from gbpservice.neutron.tests.unit.services.grouppolicy import (
     test_grouppolicy_plugin as test_plugin)
 
@@ -309,6 +312,37 @@ class TestImplicitL3Policy(ImplicitPolicyTestCase):
         res = req.get_response(self.ext_api)
         self.assertEqual(res.status_int, webob.exc.HTTPNotFound.code)
 
+    def test_default_l3_policy_mapping(self):
+        l2p = self.create_l2_policy()['l2_policy']
+        session = nctx.get_admin_context().session
+        default = session.query(implicit_policy.DefaultL3Policy).filter_by(
+            tenant_id=l2p['tenant_id']).one()
+        self.assertEqual(l2p['l3_policy_id'], default.l3_policy_id)
+
+        # The mapping goes away with the L3 policy
+        self.delete_l2_policy(l2p['id'], expected_res_status=204)
+        self.assertIsNone(session.query(
+            implicit_policy.DefaultL3Policy).filter_by(
+                tenant_id=l2p['tenant_id']).first())
+
+    def test_concurrent_default_l3_policy(self):
+        # Another server sets the default L3 policy after the lookup
+        l3p = self.create_l3_policy(name='other')['l3_policy']
+        session = nctx.get_admin_context().session
+        with session.begin(subtransactions=True):
+            session.add(implicit_policy.DefaultL3Policy(
+                tenant_id=l3p['tenant_id'], l3_policy_id=l3p['id']))
+        with mock.patch.object(implicit_policy.ImplicitPolicyDriver,
+                               '_get_default_l3_policy_id',
+                               side_effect=[None, l3p['id']]):
+            l2p = self.create_l2_policy()['l2_policy']
+        self.assertEqual(l3p['id'], l2p['l3_policy_id'])
+        # The L3 policy created meanwhile is gone
+        req = self.new_list_request('l3_policies')
+        l3ps = self.deserialize(self.fmt,
+                                req.get_response(self.ext_api))['l3_policies']
+        self.assertEqual([l3p['id']], [x['id'] for x in l3ps])
+
 
 class TestImplicitExternalSegment(ImplicitPolicyTestCase):
 
@@ -392,3 +426,22 @@ class TestImplicitExternalSegment(ImplicitPolicyTestCase):
                                       tenant_id='anothertenant')
         self.assertEqual('DefaultExternalSegmentAlreadyExists',
                          res['NeutronError']['type'])
+
+    def test_default_external_segment_mapping(self):
+        es = self._create_default_es(shared=True,
+                                     tenant_id='onetenant')['external_segment']
+        self.create_l3_policy(tenant_id='anothertenant')
+        session = nctx.get_admin_context().session
+        default = session.query(
+            implicit_policy.DefaultExternalSegment).filter_by(
+                tenant_id='anothertenant').one()
+        self.assertEqual(es['id'], default.external_segment_id)
+
+        # Renaming the ES resets the defaults
+        self.update_external_segment(es['id'], name='renamed',
+                                     tenant_id='onetenant',
+                                     expected_res_status=200)
+        self.assertEqual([], session.query(
+            implicit_policy.DefaultExternalSegment).all())
+        l3p = self.create_l3_policy(tenant_id='anothertenant')['l3_policy']
+        self.assertEqual({}, l3p['external_segments'])
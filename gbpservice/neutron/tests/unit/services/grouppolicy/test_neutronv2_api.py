@@ -72,6 +72,39 @@ class NeutronV2ApiTestCase(unittest.TestCase):
             method_to_test(CONTEXT, FILTERS)
             mock_client_action.assert_called_once_with(**FILTERS)
 
+    def _test_create_resources(self, resource):
+        with mock.patch.object(nc_client, 'get_client') as mock_get_client:
+            resources = resource + 's'
+            mock_get_client.return_value = self.mock_client
+            mock_client_action = getattr(self.mock_client,
+                                         'create_' + resource)
+            mock_client_action.return_value = {resources: [VALUE, VALUE]}
+
+            method_to_test = getattr(self.neutron_api, 'create_' + resources)
+            self.assertEqual([VALUE, VALUE],
+                             method_to_test(CONTEXT, [ATTRIBUTES, ATTRIBUTES]))
+            mock_client_action.assert_called_once_with(
+                {resources: [ATTRIBUTES, ATTRIBUTES]})
+            self.assertEqual([], method_to_test(CONTEXT, []))
+            self.assertEqual(1, mock_client_action.call_count)
+
+    def _test_iter_resources(self, resource):
+        with mock.patch.object(nc_client, 'get_client') as mock_get_client:
+            resources = resource + 's'
+            action = 'list_' + resources
+            mock_get_client.return_value = self.mock_client
+            mock_client_action = getattr(self.mock_client, action)
+            mock_client_action.return_value = iter(
+                [{resources: [VALUE, VALUE]}, {resources: [VALUE]},
+                 {resources: []}])
+
+            method_to_test = getattr(self.neutron_api, 'iter_' + resources)
+            pages = method_to_test(CONTEXT, FILTERS, page_size=2)
+            self.assertFalse(mock_client_action.called)
+            self.assertEqual([[VALUE, VALUE], [VALUE]], list(pages))
+            mock_client_action.assert_called_once_with(
+                retrieve_all=False, limit=2, **FILTERS)
+
     def _test_update_resource(self, resource):
         with mock.patch.object(nc_client, 'get_client') as mock_get_client:
             action = 'update_' + resource
@@ -115,6 +148,9 @@ class NeutronV2ApiTestCase(unittest.TestCase):
     def test_list_networks(self):
         self._test_list_resources('network')
 
+    def test_iter_networks(self):
+        self._test_iter_resources('network')
+
     def test_update_network(self):
         self._test_update_resource('network')
 
@@ -130,6 +166,12 @@ class NeutronV2ApiTestCase(unittest.TestCase):
     def test_list_subnets(self):
         self._test_list_resources('subnet')
 
+    def test_iter_subnets(self):
+        self._test_iter_resources('subnet')
+
+    def test_create_subnets(self):
+        self._test_create_resources('subnet')
+
     def test_update_subnet(self):
         self._test_update_resource('subnet')
 
@@ -145,6 +187,12 @@ class NeutronV2ApiTestCase(unittest.TestCase):
     def test_list_ports(self):
         self._test_list_resources('port')
 
+    def test_iter_ports(self):
+        self._test_iter_resources('port')
+
+    def test_create_ports(self):
+        self._test_create_resources('port')
+
     def test_update_port(self):
         self._test_update_resource('port')
 
@@ -160,6 +208,9 @@ class NeutronV2ApiTestCase(unittest.TestCase):
     def test_list_security_groups(self):
         self._test_list_resources('security_group')
 
+    def test_iter_security_groups(self):
+        self._test_iter_resources('security_group')
+
     def test_update_security_group(self):
         self._test_update_resource('security_group')
 
@@ -175,6 +226,12 @@ class NeutronV2ApiTestCase(unittest.TestCase):
     def test_list_security_group_rules(self):
         self._test_list_resources('security_group_rule')
 
+    def test_iter_security_group_rules(self):
+        self._test_iter_resources('security_group_rule')
+
+    def test_create_security_group_rules(self):
+        self._test_create_resources('security_group_rule')
+
     # REVISIT(yi): update_security_group_rule not supported in neutron yet
     # def test_update_security_group_rule(self):
     #     self._test_update_resource('security_group_rule')
@@ -191,6 +248,9 @@ class NeutronV2ApiTestCase(unittest.TestCase):
     def test_list_routers(self):
         self._test_list_resources('router')
 
+    def test_iter_routers(self):
+        self._test_iter_resources('router')
+
     def test_update_router(self):
         self._test_update_resource('router')
 
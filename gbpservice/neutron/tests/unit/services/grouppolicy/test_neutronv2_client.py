@@ -134,3 +134,44 @@ class TestNeutronClient(test_db_base_plugin_v2.NeutronDbPluginV2TestCase):
                 client1 = neutronclient.get_client(my_context, True)
                 client1.list_networks(retrieve_all=False)
                 self.assertEqual('new_token1', token_store.admin_auth_token)
+
+    def test_client_reused_for_token(self):
+        CONF.set_override('neutron_server_url',
+                          'http://anyhost',
+                          group='neutron')
+        neutronclient.ClientCache.clear()
+        my_context = context.ContextBase('userid', 'my_tenantid',
+                                         auth_token='token')
+        other_context = context.ContextBase('userid', 'my_tenantid',
+                                            auth_token='token2')
+        client1 = neutronclient.get_client(my_context)
+        self.assertIs(client1, neutronclient.get_client(my_context))
+        self.assertIsNot(client1, neutronclient.get_client(other_context))
+
+        with mock.patch.object(neutronclient.time, 'time',
+                               return_value=neutronclient.time.time() +
+                               CONF.neutron.client_cache_ttl + 1):
+            self.assertIsNot(client1, neutronclient.get_client(my_context))
+
+    def test_admin_client_renewed_with_token(self):
+        CONF.set_override('neutron_server_url',
+                          'http://anyhost',
+                          group='neutron')
+        token_store = neutronclient.AdminTokenStore.get()
+        token_store.admin_auth_token = 'new_token'
+        my_context = context.ContextBase('userid', 'my_tenantid',
+                                         auth_token='token')
+        with mock.patch.object(client.Client, "list_networks",
+                               side_effect=mock.Mock):
+            with mock.patch.object(client.Client, 'get_auth_info',
+                                   return_value={'auth_token': 'new_token'}):
+                with mock.patch.object(neutronclient.lockutils,
+                                       'lock') as lock:
+                    client1 = neutronclient.get_client(my_context, True)
+                    client1.list_networks(retrieve_all=False)
+                    self.assertIs(client1,
+                                  neutronclient.get_client(my_context, True))
+                    self.assertFalse(lock.called)
+                token_store.admin_auth_token = 'new_token1'
+                self.assertIsNot(client1,
+                                 neutronclient.get_client(my_context, True))
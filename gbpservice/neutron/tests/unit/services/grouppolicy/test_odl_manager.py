@@ -11,15 +11,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import requests
+import threading
+import time
 import unittest
 
 import mock
+from oslo_log import log as logging
 from oslo_serialization import jsonutils
+import requests
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
 
 from gbpservice.neutron.services.grouppolicy import config
 from gbpservice.neutron.services.grouppolicy.drivers.odl import odl_manager
 
+LOG = logging.getLogger(__name__)
 
 HOST = 'fake_host'
 PORT = 'fake_port'
@@ -162,7 +168,8 @@ class OdlManagerTestCase(unittest.TestCase):
             *args,
             **kwargs
     ):
-        with mock.patch('requests.request') as mock_request:
+        with mock.patch.object(self.manager._session,
+                               'request') as mock_request:
             tested_method(*args)
             mock_request.assert_called_once_with(
                 http_method,
@@ -181,7 +188,8 @@ class OdlManagerTestCase(unittest.TestCase):
     ):
         with mock.patch.object(odl_manager.OdlManager,
                                '_is_tenant_created') as mock_is_tenant_created:
-            with mock.patch('requests.request') as mock_request:
+            with mock.patch.object(self.manager._session,
+                                   'request') as mock_request:
                 mock_is_tenant_created.return_value = True
                 tested_method(*args)
                 mock_request.assert_called_once_with(
@@ -204,8 +212,10 @@ class OdlManagerTestCase(unittest.TestCase):
                     **kwargs
                 )
 
-    @mock.patch.object(requests, 'request')
-    def test_is_tenant_created(self, mock_request):
+    def test_is_tenant_created(self):
+        mock_request = mock.patch.object(self.manager._session,
+                                         'request').start()
+        self.addCleanup(mock.patch.stopall)
 
         mock_request.return_value = mock.Mock(
             status_code=200
@@ -461,3 +471,179 @@ class OdlManagerTestCase(unittest.TestCase):
             data=DataMatcher({'contract': CONTRACT}),
             auth=AuthMatcher()
         )
+
+    def test_idempotent_request_retried(self):
+        config.cfg.CONF.set_override('odl_max_retries', 2,
+                                     group='odl_driver')
+        self.addCleanup(config.cfg.CONF.clear_override, 'odl_max_retries',
+                        group='odl_driver')
+        manager = odl_manager.OdlManager()
+        with mock.patch.object(manager._session, 'request') as mock_request:
+            with mock.patch.object(time, 'sleep') as mock_sleep:
+                mock_request.side_effect = [
+                    requests.ConnectionError(), mock.Mock(status_code=503),
+                    mock.Mock(status_code=200)]
+                manager.create_update_contract(TENANT_ID, CONTRACT)
+                self.assertEqual(3, mock_request.call_count)
+                self.assertEqual(2, mock_sleep.call_count)
+
+                # Retries are bounded
+                mock_request.reset_mock()
+                mock_request.side_effect = requests.ConnectionError()
+                self.assertRaises(requests.ConnectionError,
+                                  manager.delete_subnet, TENANT_ID, SUBNET)
+                self.assertEqual(3, mock_request.call_count)
+
+    def test_non_idempotent_request_not_retried(self):
+        with mock.patch.object(self.manager._session,
+                               'request') as mock_request:
+            with mock.patch.object(time, 'sleep'):
+                mock_request.side_effect = requests.ConnectionError()
+                self.assertRaises(requests.ConnectionError,
+                                  self.manager.register_endpoints, [ENDPOINT])
+                self.assertEqual(1, mock_request.call_count)
+
+    def test_batch_coalesces_requests(self):
+        with mock.patch.object(odl_manager.OdlManager,
+                               '_is_tenant_created') as mock_is_tenant_created:
+            with mock.patch.object(self.manager._session,
+                                   'request') as mock_request:
+                mock_is_tenant_created.return_value = False
+                with self.manager.batch():
+                    self.manager.create_update_subnet(TENANT_ID, SUBNET)
+                    with self.manager.batch():
+                        self.manager.create_update_endpoint_group(TENANT_ID,
+                                                                  EPG)
+                    self.manager.create_update_subnet(TENANT_ID, SUBNET)
+                    # Nothing is sent before leaving the outermost batch
+                    self.assertFalse(mock_request.called)
+                mock_is_tenant_created.assert_called_once_with(TENANT_ID)
+                self.assertEqual(
+                    [mock.call('put', url=URL_TENANT, headers=HEADER,
+                               data=DataMatcher({'tenant': {'id': TENANT_ID}}),
+                               auth=AuthMatcher()),
+                     mock.call('put', url=URL_EPG, headers=HEADER,
+                               data=DataMatcher({'endpoint-group': EPG}),
+                               auth=AuthMatcher()),
+                     mock.call('put', url=URL_SUBNET, headers=HEADER,
+                               data=DataMatcher({'subnet': SUBNET}),
+                               auth=AuthMatcher())],
+                    mock_request.call_args_list)
+
+    def test_batch_merges_unregistered_endpoints(self):
+        ep1 = {'l2': ['l2_1'], 'l3': ['l3_1', 'l3_2']}
+        ep2 = {'l2': ['l2_2'], 'l3': ['l3_3']}
+        with mock.patch.object(self.manager._session,
+                               'request') as mock_request:
+            with self.manager.batch():
+                self.manager.unregister_endpoints([ep1])
+                self.manager.unregister_endpoints([ep2])
+            mock_request.assert_called_once_with(
+                'post',
+                url=URL_UNREG_EP,
+                headers=HEADER,
+                data=DataMatcher({'input': {
+                    'l2': ['l2_1', 'l2_2'],
+                    'l3': ['l3_1', 'l3_2', 'l3_3']}}),
+                auth=AuthMatcher()
+            )
+
+    def test_batch_discarded_on_error(self):
+        with mock.patch.object(self.manager._session,
+                               'request') as mock_request:
+            def failing_batch():
+                with self.manager.batch():
+                    self.manager.unregister_endpoints(
+                        [{'l2': ['l2_1'], 'l3': ['l3_1']}])
+                    raise ValueError()
+            self.assertRaises(ValueError, failing_batch)
+            self.assertFalse(mock_request.called)
+
+
+class StubOdlRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Replies 200 to everything, keeping the connection alive."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def _reply(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        self.server.requests += 1
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_GET = do_PUT = do_POST = do_DELETE = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+class StubOdlServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+    connections = 0
+    requests = 0
+
+
+class OdlManagerStubServerTestCase(unittest.TestCase):
+    """ Run the ODL manager against a local stub HTTP server
+
+    Verifies that connections are pooled and measures the per-call latency
+    compared to one-shot requests.
+    """
+
+    CALLS = 50
+
+    def setUp(self):
+        self.server = StubOdlServer(('127.0.0.1', 0), StubOdlRequestHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.addCleanup(config.cfg.CONF.reset)
+        config.cfg.CONF.set_override('odl_username', USERNAME,
+                                     group='odl_driver')
+        config.cfg.CONF.set_override('odl_password', PASSWORD,
+                                     group='odl_driver')
+        config.cfg.CONF.set_override('odl_host', '127.0.0.1',
+                                     group='odl_driver')
+        config.cfg.CONF.set_override('odl_port',
+                                     str(self.server.server_address[1]),
+                                     group='odl_driver')
+        self.manager = odl_manager.OdlManager()
+
+    def _per_call_latency(self, func):
+        start = time.time()
+        for x in range(self.CALLS):
+            func()
+        return (time.time() - start) / self.CALLS
+
+    def test_connections_reused(self):
+        url = self.manager._contract_url % {'tenant_id': TENANT_ID,
+                                            'contract': CONTRACT_ID}
+
+        def one_shot():
+            requests.request(
+                'put', url=url, headers=HEADER, data='{}',
+                auth=requests.auth.HTTPBasicAuth(USERNAME, PASSWORD)
+            ).raise_for_status()
+
+        one_shot_latency = self._per_call_latency(one_shot)
+        self.assertEqual(self.CALLS, self.server.connections)
+
+        self.server.connections = 0
+        self.server.requests = 0
+        pooled_latency = self._per_call_latency(
+            lambda: self.manager.create_update_contract(TENANT_ID, CONTRACT))
+        self.assertEqual(self.CALLS, self.server.requests)
+        self.assertEqual(1, self.server.connections)
+        LOG.debug("ODL per-call latency: one-shot %(one_shot).6fs, "
+                  "pooled %(pooled).6fs",
+                  {'one_shot': one_shot_latency, 'pooled': pooled_latency})
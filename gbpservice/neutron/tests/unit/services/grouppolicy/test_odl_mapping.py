@@ -12,6 +12,7 @@
 # limitations under the License.
 
 import mock
+import time
 import uuid
 
 from gbpservice.neutron.services.grouppolicy.common import constants
@@ -866,6 +867,65 @@ class PolicyTargetGroupTestCase(OdlMappingTestCase):
         mock_create_update_subnet.assert_called_once_with(TENANT_UUID,
                                                           odl_subnet)
 
+    @mock.patch.object(g_plugin.GroupPolicyPlugin, 'get_policy_action')
+    @mock.patch.object(g_plugin.GroupPolicyPlugin, 'get_policy_classifier')
+    @mock.patch.object(g_plugin.GroupPolicyPlugin, 'get_policy_rule')
+    @mock.patch.object(g_plugin.GroupPolicyPlugin, 'get_policy_rule_set')
+    @mock.patch.object(ml2_plugin.Ml2Plugin, 'get_subnet')
+    @mock.patch.object(odl_manager.OdlManager, 'create_update_subnet')
+    @mock.patch.object(odl_manager.OdlManager, 'create_update_endpoint_group')
+    @mock.patch.object(odl_manager.OdlManager, 'create_update_contract')
+    @mock.patch.object(resource_mapping.ResourceMappingDriver,
+                       'create_policy_target_group_postcommit')
+    def test_unchanged_contracts_not_pushed_again(
+            self,
+            mock_create_policy_target_group_postcommit,
+            mock_create_update_contract,
+            mock_create_update_endpoint_group,
+            mock_create_update_subnet,
+            mock_get_subnet,
+            mock_get_policy_rule_set,
+            mock_get_policy_rule,
+            mock_get_policy_classifier,
+            mock_get_policy_action):
+        mock_get_subnet.side_effect = self.fake_core_plugin.get_subnet
+        mock_get_policy_rule_set.side_effect = (self.fake_gbp_plugin.
+                                                get_policy_rule_set)
+        mock_get_policy_rule.side_effect = (self.fake_gbp_plugin.
+                                            get_policy_rule)
+        mock_get_policy_classifier.side_effect = (self.fake_gbp_plugin.
+                                                  get_policy_classifier)
+        mock_get_policy_action.side_effect = (self.fake_gbp_plugin.
+                                              get_policy_action)
+
+        self.driver.create_policy_target_group_postcommit(self.context)
+        self.assertEqual(2, mock_create_update_contract.call_count)
+        self.assertEqual(2, mock_get_policy_rule.call_count)
+
+        # Same rule sets, subjects are reused and contracts are not resent
+        self.driver.create_policy_target_group_postcommit(self.context)
+        self.assertEqual(2, mock_create_update_contract.call_count)
+        self.assertEqual(2, mock_get_policy_rule.call_count)
+        self.assertEqual(4, mock_get_policy_rule_set.call_count)
+        self.assertEqual(2, mock_create_update_endpoint_group.call_count)
+
+        # Unchanged contracts are pushed again once expired
+        expired = time.time() + odl_mapping.CONTRACT_PUSH_TTL + 1
+        with mock.patch.object(time, 'time', return_value=expired):
+            self.driver.create_policy_target_group_postcommit(self.context)
+        self.assertEqual(4, mock_create_update_contract.call_count)
+
+        # A failure resets the pushed contracts, they are sent again on the
+        # next creation
+        mock_create_update_endpoint_group.side_effect = Exception
+        self.assertRaises(
+            Exception, self.driver.create_policy_target_group_postcommit,
+            self.context)
+        self.assertEqual({}, self.driver._pushed_contracts)
+        mock_create_update_endpoint_group.side_effect = None
+        self.driver.create_policy_target_group_postcommit(self.context)
+        self.assertEqual(6, mock_create_update_contract.call_count)
+
     def test_update_policy_target_group_precommit(self):
         self.assertRaises(
             odl_mapping.UpdatePTGNotSupportedOnOdlDriver,
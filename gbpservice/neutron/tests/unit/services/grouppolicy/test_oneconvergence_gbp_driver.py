@@ -12,7 +12,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
+import unittest
+
 import mock
+from oslo_config import cfg
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
 
 from gbpservice.neutron.services.grouppolicy.drivers.oneconvergence import (
     nvsd_gbp_api as api)
@@ -22,7 +28,7 @@ from gbpservice.neutron.tests.unit.services.grouppolicy import (
 
 class MockNVSDApiClient(object):
 
-    def create_endpoint(self, context, endpoint):
+    def create_endpoint(self, context, endpoint, wait=False):
         pass
 
     def update_endpoint(self, context, updated_endpoint):
@@ -80,7 +86,8 @@ class TestPolicyTarget(OneConvergenceGBPDriverTestCase,
                     pt = self.create_policy_target(
                             name="pt1",
                             policy_target_group_id=ptg_id)['policy_target']
-                    create_ep.assert_called_once_with(mock.ANY, pt)
+                    create_ep.assert_called_once_with(mock.ANY, pt,
+                                                      wait=True)
                     pt = self.update_policy_target(
                             pt['id'], name="new_pt")['policy_target']
                     update_ep.assert_called_once_with(mock.ANY, pt)
@@ -190,3 +197,111 @@ class TestExternalSegment(OneConvergenceGBPDriverTestCase,
 class TestExternalPolicy(OneConvergenceGBPDriverTestCase,
                          test_resource_mapping.TestExternalPolicy):
     pass
+
+
+class StubNVSDRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Replies with the queued status codes, 200 once they are consumed."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def _reply(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        self.server.requests.append((self.command, self.path.split('?')[0]))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    do_GET = do_PUT = do_POST = do_DELETE = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+class StubNVSDServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        BaseHTTPServer.HTTPServer.__init__(self, *args, **kwargs)
+        self.connections = 0
+        self.requests = []
+        self.statuses = []
+
+
+class NVSDServiceApiStubServerTestCase(unittest.TestCase):
+    """Run the NVSD client against a local stub NVSD Service Controller."""
+
+    def setUp(self):
+        self.server = StubNVSDServer(('127.0.0.1', 0), StubNVSDRequestHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.addCleanup(cfg.CONF.reset)
+        for opt, value in (('service_controller_ip', '127.0.0.1'),
+                           ('service_controller_port',
+                            str(self.server.server_address[1])),
+                           ('request_retries', '2'),
+                           ('request_timeout', '5'),
+                           ('retry_backoff', 0)):
+            cfg.CONF.set_override(opt, value, 'NVSD_SERVICE_CONTROLLER')
+        self.context = mock.Mock(tenant_id='tenant', user='user',
+                                 is_admin=False)
+        self.endpoint = {'id': 'pt', 'policy_target_group_id': 'ptg'}
+
+    def test_connections_reused(self):
+        nvsd_api = api.NVSDServiceApi()
+        for x in range(10):
+            nvsd_api.update_endpoint(self.context, self.endpoint)
+        self.assertEqual(10, len(self.server.requests))
+        self.assertEqual(1, self.server.connections)
+
+    def test_idempotent_request_retried(self):
+        nvsd_api = api.NVSDServiceApi()
+        self.server.statuses = [503, 502]
+        nvsd_api.update_endpoint(self.context, self.endpoint)
+        self.assertEqual(3, len(self.server.requests))
+
+        self.server.statuses = [503, 503, 503]
+        self.assertRaises(api.GroupPolicyException, nvsd_api.update_endpoint,
+                          self.context, self.endpoint)
+
+    def test_non_idempotent_request_not_retried(self):
+        nvsd_api = api.NVSDServiceApi()
+        self.server.statuses = [503]
+        self.assertRaises(api.GroupPolicyException, nvsd_api.create_endpoint,
+                          self.context, self.endpoint)
+        self.assertEqual(1, len(self.server.requests))
+
+    def test_async_dispatch(self):
+        cfg.CONF.set_override('async_dispatch', True,
+                              'NVSD_SERVICE_CONTROLLER')
+        nvsd_api = api.NVSDServiceApi()
+        endpoints = [{'id': 'pt%s' % x, 'policy_target_group_id': 'ptg'}
+                     for x in range(5)]
+        for endpoint in endpoints:
+            nvsd_api.create_endpoint(self.context, endpoint)
+            nvsd_api.update_endpoint(self.context, endpoint)
+            nvsd_api.delete_endpoint(self.context, endpoint['id'])
+        nvsd_api.dispatcher.wait()
+
+        self.assertEqual(15, nvsd_api.dispatcher.acknowledged)
+        self.assertEqual(0, nvsd_api.dispatcher.failed)
+        # Requests for the same endpoint are sent in order
+        for endpoint in endpoints:
+            path = api.NVSD_ENDPOINT + '/' + endpoint['id']
+            sent = [x[0] for x in self.server.requests
+                    if x[1].endswith(path)]
+            self.assertEqual(['PUT', 'DELETE'], sent)
+        self.assertEqual(5, len([x for x in self.server.requests
+                                 if x[0] == 'POST']))
@@ -26,6 +26,7 @@ from neutron import manager
 from neutron.notifiers import nova
 from neutron.openstack.common import uuidutils
 from neutron.plugins.common import constants as pconst
+from neutron.tests import base
 from neutron.tests.unit.extensions import test_l3
 from neutron.tests.unit.extensions import test_securitygroup
 from neutron.tests.unit.plugins.ml2 import test_plugin as n_test_plugin
@@ -34,6 +35,8 @@ import webob.exc
 from gbpservice.neutron.db.grouppolicy import group_policy_db as gpdb
 from gbpservice.neutron.db import servicechain_db
 from gbpservice.neutron.services.grouppolicy.common import constants as gconst
+from gbpservice.neutron.services.grouppolicy.common import ip_bitmap
+from gbpservice.neutron.services.grouppolicy.common import ip_index
 from gbpservice.neutron.services.grouppolicy import config
 from gbpservice.neutron.services.grouppolicy.drivers import resource_mapping
 from gbpservice.neutron.services.servicechain.plugins.msc import (
@@ -315,6 +318,12 @@ class ResourceMappingTestCase(test_plugin.GroupPolicyPluginTestCase):
                         "Some rules still exist:\n%s" % str(existing))
         return expected
 
+    def _get_reserved_ips(self, ptg_id):
+        ctx = nctx.get_admin_context()
+        return [x.ip_address for x in ctx.session.query(
+            resource_mapping.PTGReservedIPAddress).filter_by(
+                policy_target_group_id=ptg_id)]
+
     def _get_nsp_ptg_fip_mapping(self, ptg_id):
         ctx = nctx.get_admin_context()
         with ctx.session.begin(subtransactions=True):
@@ -472,6 +481,211 @@ class TestPolicyTarget(ResourceMappingTestCase):
         self.assertEqual('PolicyTargetGroupUpdateOfPolicyTargetNotSupported',
                          data['NeutronError']['type'])
 
+    def test_port_mapping_cached(self):
+        driver = [x.obj for x in
+                  self._gbp_plugin.policy_driver_manager.ordered_policy_drivers
+                  if isinstance(x.obj, resource_mapping.ResourceMappingDriver)
+                  ][0]
+        ptg = self.create_policy_target_group(name="ptg1")[
+            'policy_target_group']
+        pt = self.create_policy_target(
+            policy_target_group_id=ptg['id'])['policy_target']
+        subnet_id = ptg['subnets'][0]
+
+        with mock.patch.object(
+                self._gbp_plugin, 'get_policy_target_group',
+                wraps=self._gbp_plugin.get_policy_target_group) as get_ptg:
+            for x in range(2):
+                self.assertEqual(ptg['id'], driver._port_id_to_ptg(
+                    self._context, pt['port_id'])['id'])
+                self.assertEqual(ptg['id'], driver._get_ptg_by_subnet(
+                    self._context, subnet_id)['id'])
+            # The PTG itself is always loaded
+            self.assertEqual(4, get_ptg.call_count)
+
+        # Callers get their own copy
+        driver._port_id_to_pt(self._context, pt['port_id'])['name'] = 'x'
+        self.assertEqual(pt['name'], driver._port_id_to_pt(
+            self._context, pt['port_id'])['name'])
+
+        # The PTG is up to date
+        self.update_policy_target_group(ptg['id'], name='ptg2',
+                                        expected_res_status=200)
+        self.assertEqual('ptg2', driver._get_ptg_by_subnet(
+            self._context, subnet_id)['name'])
+
+        # Deleting the PT invalidates the port mapping
+        self.delete_policy_target(pt['id'], expected_res_status=204)
+        self.assertIsNone(driver._port_id_to_pt(self._context,
+                                                pt['port_id']))
+
+    def test_bulk_create_policy_targets(self):
+        ptg_id = self.create_policy_target_group(name="ptg1")[
+            'policy_target_group']['id']
+        body = {'policy_targets': [
+            {'policy_target': {'name': 'pt%s' % x,
+                               'policy_target_group_id': ptg_id,
+                               'tenant_id': self._tenant_id}}
+            for x in range(3)]}
+        with mock.patch.object(self._plugin, 'create_port_bulk',
+                               wraps=self._plugin.create_port_bulk) as bulk:
+            with mock.patch.object(
+                    self._gbp_plugin, 'create_policy_target',
+                    wraps=self._gbp_plugin.create_policy_target) as single:
+                req = self.new_create_request('policy_targets', body,
+                                              self.fmt)
+                res = req.get_response(self.ext_api)
+        self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+        pts = self.deserialize(self.fmt, res)['policy_targets']
+
+        self.assertEqual(['pt0', 'pt1', 'pt2'], [x['name'] for x in pts])
+        # Native bulk, with all the implicit ports created at once
+        self.assertFalse(single.called)
+        self.assertEqual(1, bulk.call_count)
+        for pt in pts:
+            self.assertIsNotNone(pt['port_id'])
+            self._get_object('ports', pt['port_id'], self.api)
+        ptg = self.show_policy_target_group(ptg_id)['policy_target_group']
+        self.assertEqual(sorted(x['id'] for x in pts),
+                         sorted(ptg['policy_targets']))
+
+
+class TestPolicyTargetPortPool(ResourceMappingTestCase):
+
+    def setUp(self):
+        config.cfg.CONF.set_override('port_pool_low_water_mark', 2,
+                                     group='resource_mapping')
+        super(TestPolicyTargetPortPool, self).setUp()
+        # Refill the pools synchronously
+        mock.patch.object(resource_mapping.eventlet, 'spawn_n',
+                          side_effect=lambda f, *args: f(*args)).start()
+
+    def _get_pooled_port_ids(self, ptg_id):
+        return set(x.port_id for x in self._context.session.query(
+            resource_mapping.PooledPort).filter_by(
+                policy_target_group_id=ptg_id))
+
+    def test_port_pool_lifecycle(self):
+        ptg_id = self.create_policy_target_group(
+            name="ptg1")['policy_target_group']['id']
+        pooled = self._get_pooled_port_ids(ptg_id)
+        self.assertEqual(2, len(pooled))
+
+        # The PT port is taken from the pool, which is refilled
+        pt = self.create_policy_target(
+            policy_target_group_id=ptg_id)['policy_target']
+        self.assertIn(pt['port_id'], pooled)
+        self.assertEqual(2, len(self._get_pooled_port_ids(ptg_id)))
+        self.assertNotIn(pt['port_id'], self._get_pooled_port_ids(ptg_id))
+
+        # The unused port is returned to the pool
+        self.delete_policy_target(pt['id'], expected_res_status=204)
+        pooled = self._get_pooled_port_ids(ptg_id)
+        self.assertEqual(3, len(pooled))
+        self.assertIn(pt['port_id'], pooled)
+
+        # All the pooled ports go away with the PTG
+        self.delete_policy_target_group(ptg_id, expected_res_status=204)
+        for port_id in pooled:
+            req = self.new_show_request('ports', port_id, fmt=self.fmt)
+            res = req.get_response(self.api)
+            self.assertEqual(webob.exc.HTTPNotFound.code, res.status_int)
+
+    def test_pooled_port_renamed(self):
+        ptg_id = self.create_policy_target_group(
+            name="ptg1")['policy_target_group']['id']
+        pt = self.create_policy_target(
+            name='pt1', policy_target_group_id=ptg_id)['policy_target']
+        port = self._plugin.get_port(self._context, pt['port_id'])
+        self.assertEqual('pt_pt1', port['name'])
+
+    def test_refill_without_rule_set_sg_mapping(self):
+        driver = [x.obj for x in
+                  self._gbp_plugin.policy_driver_manager.ordered_policy_drivers
+                  if isinstance(x.obj, resource_mapping.ResourceMappingDriver)
+                  ][0]
+        prs = self.create_policy_rule_set()['policy_rule_set']
+        ptg_id = self.create_policy_target_group(
+            name="ptg1")['policy_target_group']['id']
+        self.update_policy_target_group(
+            ptg_id, provided_policy_rule_sets={prs['id']: ''})
+        # Like with the drivers not managing SGs
+        session = self._context.session
+        with session.begin(subtransactions=True):
+            session.query(resource_mapping.PolicyRuleSetSGsMapping).filter_by(
+                policy_rule_set_id=prs['id']).delete()
+        # Taking the ports refills the pool
+        taken = driver._take_pooled_ports(self._context, ptg_id, 2)
+
+        pooled = self._get_pooled_port_ids(ptg_id)
+        self.assertEqual(2, len(pooled))
+        self.assertFalse(pooled & set(taken))
+
+    def test_pool_drained_with_subnets(self):
+        driver = [x.obj for x in
+                  self._gbp_plugin.policy_driver_manager.ordered_policy_drivers
+                  if isinstance(x.obj, resource_mapping.ResourceMappingDriver)
+                  ][0]
+        l2p = self.create_l2_policy()['l2_policy']
+        router_id = self.show_l3_policy(l2p['l3_policy_id'])[
+            'l3_policy']['routers'][0]
+        ptg = self.create_policy_target_group(
+            name="ptg1", l2_policy_id=l2p['id'])['policy_target_group']
+        pooled = self._get_pooled_port_ids(ptg['id'])
+        # The subclasses only clean the PTG subnets up
+        with mock.patch.object(resource_mapping.ResourceMappingDriver,
+                               'delete_policy_target_group_postcommit'):
+            self.delete_policy_target_group(ptg['id'],
+                                            expected_res_status=204)
+        driver._cleanup_subnets(self._context, ptg['subnets'], router_id)
+
+        self.assertEqual(set(), self._get_pooled_port_ids(ptg['id']))
+        for port_id in pooled:
+            req = self.new_show_request('ports', port_id, fmt=self.fmt)
+            res = req.get_response(self.api)
+            self.assertEqual(webob.exc.HTTPNotFound.code, res.status_int)
+        req = self.new_show_request('subnets', ptg['subnets'][0],
+                                    fmt=self.fmt)
+        self.assertEqual(webob.exc.HTTPNotFound.code,
+                         req.get_response(self.api).status_int)
+
+    def test_bulk_create_mixed_tenants(self):
+        ptg_id = self.create_policy_target_group(
+            name="ptg1", shared=True)['policy_target_group']['id']
+        pooled = self._get_pooled_port_ids(ptg_id)
+        body = {'policy_targets': [
+            {'policy_target': {'policy_target_group_id': ptg_id,
+                               'tenant_id': tenant_id}}
+            for tenant_id in ('another_tenant', self._tenant_id)]}
+        req = self.new_create_request('policy_targets', body, self.fmt,
+                                      context=nctx.get_admin_context())
+        res = req.get_response(self.ext_api)
+        self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+        other, own = self.deserialize(self.fmt, res)['policy_targets']
+
+        # Only the PTs of the PTG tenant take ports from the pool
+        self.assertIn(own['port_id'], pooled)
+        self.assertNotIn(other['port_id'], pooled)
+        port = self._plugin.get_port(self._context, other['port_id'])
+        self.assertEqual('another_tenant', port['tenant_id'])
+
+    def test_pooled_ports_follow_ptg_sgs(self):
+        prs = self.create_policy_rule_set()['policy_rule_set']
+        sg_id = self._get_prs_mapping(prs['id'])['provided_sg_id']
+        ptg_id = self.create_policy_target_group(
+            name="ptg1")['policy_target_group']['id']
+        self.update_policy_target_group(
+            ptg_id, provided_policy_rule_sets={prs['id']: ''})
+        for port_id in self._get_pooled_port_ids(ptg_id):
+            port = self._plugin.get_port(self._context, port_id)
+            self.assertIn(sg_id, port[ext_sg.SECURITYGROUPS])
+
+        self.update_policy_target_group(
+            ptg_id, provided_policy_rule_sets={})
+        for port_id in self._get_pooled_port_ids(ptg_id):
+            port = self._plugin.get_port(self._context, port_id)
+            self.assertNotIn(sg_id, port[ext_sg.SECURITYGROUPS])
+
 
 class TestPolicyTargetGroup(ResourceMappingTestCase):
 
@@ -512,6 +726,60 @@ class TestPolicyTargetGroup(ResourceMappingTestCase):
     def test_implicit_subnet_lifecycle_shared(self):
         self._test_implicit_subnet_lifecycle(True)
 
+    def test_default_security_group_mapping(self):
+        ptg = self.create_policy_target_group()['policy_target_group']
+        session = self._context.session
+        mapping = session.query(
+            resource_mapping.PTGDefaultSecurityGroup).filter_by(
+                policy_target_group_id=ptg['id']).one()
+        sg_id = mapping.security_group_id
+        sg = self._plugin.get_security_group(self._context, sg_id)
+        self.assertEqual('gbp_%s' % ptg['id'], sg['name'])
+
+        self.delete_policy_target_group(ptg['id'], expected_res_status=204)
+        self.assertIsNone(session.query(
+            resource_mapping.PTGDefaultSecurityGroup).filter_by(
+                policy_target_group_id=ptg['id']).first())
+        self.assertEqual([], self._plugin.get_security_groups(
+            self._context, filters={'id': [sg_id]}))
+
+    def test_delete_with_policy_targets(self):
+        ptg_id = self.create_policy_target_group(
+            name="ptg1")['policy_target_group']['id']
+        port_ids = [self.create_policy_target(
+            policy_target_group_id=ptg_id)['policy_target']['port_id']
+            for x in range(3)]
+
+        with mock.patch.object(self._plugin, 'update_port',
+                               wraps=self._plugin.update_port) as update_port:
+            req = self.new_delete_request('policy_target_groups', ptg_id)
+            res = req.get_response(self.ext_api)
+            self.assertEqual(webob.exc.HTTPNoContent.code, res.status_int)
+            # Implicit ports are deleted without updating their SGs first
+            self.assertFalse(update_port.called)
+
+        for port_id in port_ids:
+            req = self.new_show_request('ports', port_id, fmt=self.fmt)
+            res = req.get_response(self.api)
+            self.assertEqual(webob.exc.HTTPNotFound.code, res.status_int)
+
+    def test_delete_with_policy_targets_checks_ownership_once(self):
+        ptg_id = self.create_policy_target_group(
+            name="ptg1")['policy_target_group']['id']
+        port_ids = [self.create_policy_target(
+            policy_target_group_id=ptg_id)['policy_target']['port_id']
+            for x in range(3)]
+
+        driver = resource_mapping.ResourceMappingDriver
+        with mock.patch.object(
+                driver, '_get_owned_port_ids', autospec=True,
+                side_effect=driver._get_owned_port_ids) as get_owned:
+            self.delete_policy_target_group(ptg_id, expected_res_status=204)
+            checked = [set(x[0][2]) for x in get_owned.call_args_list]
+            # All the PT ports are checked by the same query
+            self.assertEqual([set(port_ids)],
+                             [x for x in checked if x & set(port_ids)])
+
     def test_explicit_subnet_lifecycle(self):
         # Create L3 policy.
         l3p = self.create_l3_policy(name="l3p1", ip_pool='10.0.0.0/8')
@@ -2816,30 +3084,34 @@ class TestNetworkServicePolicy(ResourceMappingTestCase):
                                                     'network_service_policy']
 
         # Update PTG, associating a NSP with it and verify that an IP is
-        # reserved from the PTG subnet allocation pool
+        # reserved out of the PTG subnet allocation pool
         self.update_policy_target_group(
                     ptg['id'],
                     network_service_policy_id=nsp['id'],
                     expected_res_status=webob.exc.HTTPOk.code)
         subnet = self._show_subnet(ptg_subnet_id)['subnet']
-        allocation_pool_after_nsp = subnet['allocation_pools']
-        self.assertEqual(
-                netaddr.IPAddress(initial_allocation_pool[0].get('start')),
-                netaddr.IPAddress(allocation_pool_after_nsp[0].get('start')))
+        self.assertEqual(initial_allocation_pool, subnet['allocation_pools'])
+        reserved = self._get_reserved_ips(ptg['id'])
         self.assertEqual(
-                netaddr.IPAddress(initial_allocation_pool[0].get('end')),
-                netaddr.IPAddress(allocation_pool_after_nsp[0].get('end')) + 1)
+            [str(netaddr.IPNetwork(subnet['cidr'])[-2])], reserved)
 
         # Update the PTGs and unset the NSP used and verify that the IP is
-        # restored to the PTG subnet allocation pool
+        # released
         self.update_policy_target_group(
                     ptg['id'],
                     network_service_policy_id=None,
                     expected_res_status=webob.exc.HTTPOk.code)
         subnet = self._show_subnet(ptg_subnet_id)['subnet']
-        allocation_pool_after_nsp_cleanup = subnet['allocation_pools']
-        self.assertEqual(
-                initial_allocation_pool, allocation_pool_after_nsp_cleanup)
+        self.assertEqual(initial_allocation_pool, subnet['allocation_pools'])
+        self.assertEqual([], self._get_reserved_ips(ptg['id']))
+
+    def test_implicit_subnet_service_ips(self):
+        ptg = self.create_policy_target_group()['policy_target_group']
+        subnet = self._show_subnet(ptg['subnets'][0])['subnet']
+        cidr = netaddr.IPNetwork(subnet['cidr'])
+        # The last addresses are kept for the services
+        self.assertEqual([{'start': str(cidr[2]), 'end': str(cidr[-6])}],
+                         subnet['allocation_pools'])
 
     def test_create_nsp_ip_pool_multiple_ptgs(self):
         routes = [{'destination': '0.0.0.0/0', 'nexthop': None}]
@@ -3159,6 +3431,27 @@ class TestNetworkServicePolicy(ResourceMappingTestCase):
         self._verify_update_ptg_with_nsp(ptg['id'], nsp2['id'], subnet)
         self._verify_update_ptg_with_nsp(ptg['id'], nsp['id'], subnet)
 
+    def test_nsp_on_subnet_with_full_allocation_pool(self):
+        # Implicit subnets created before service_ips_per_subnet
+        config.cfg.CONF.set_override('service_ips_per_subnet', 0,
+                                     group='resource_mapping')
+        ptg = self.create_policy_target_group()['policy_target_group']
+        config.cfg.CONF.clear_override('service_ips_per_subnet',
+                                       group='resource_mapping')
+        nsp = self.create_network_service_policy(
+                    network_service_params=[
+                            {"type": "ip_single", "value": "self_subnet",
+                             "name": "vip"}])['network_service_policy']
+
+        self.update_policy_target_group(
+                    ptg['id'], network_service_policy_id=nsp['id'],
+                    expected_res_status=webob.exc.HTTPOk.code)
+        subnet = self._show_subnet(ptg['subnets'][0])['subnet']
+        cidr = netaddr.IPNetwork(subnet['cidr'])
+        self.assertEqual([str(cidr[-2])], self._get_reserved_ips(ptg['id']))
+        self.assertEqual(str(cidr[-6]),
+                         subnet['allocation_pools'][-1]['end'])
+
     def _verify_update_ptg_with_nsp(self, ptg_id, nsp_id, ptg_subnet_no_nsp):
         ptg_subnet_id = ptg_subnet_no_nsp['id']
         initial_allocation_pool = ptg_subnet_no_nsp['allocation_pools']
@@ -3167,13 +3460,11 @@ class TestNetworkServicePolicy(ResourceMappingTestCase):
                     network_service_policy_id=nsp_id,
                     expected_res_status=webob.exc.HTTPOk.code)
         subnet = self._show_subnet(ptg_subnet_id)['subnet']
-        allocation_pool_after_nsp = subnet['allocation_pools']
-        self.assertEqual(
-                netaddr.IPAddress(initial_allocation_pool[0].get('start')),
-                netaddr.IPAddress(allocation_pool_after_nsp[0].get('start')))
+        self.assertEqual(initial_allocation_pool, subnet['allocation_pools'])
+        # The previous NSP address is released
         self.assertEqual(
-                netaddr.IPAddress(initial_allocation_pool[0].get('end')),
-                netaddr.IPAddress(allocation_pool_after_nsp[0].get('end')) + 1)
+            [str(netaddr.IPNetwork(subnet['cidr'])[-2])],
+            self._get_reserved_ips(ptg_id))
 
 
 class TestNatPool(ResourceMappingTestCase):
@@ -3208,3 +3499,164 @@ class TestNatPool(ResourceMappingTestCase):
             expected_res_status=webob.exc.HTTPBadRequest.code)
         self.assertEqual('ESSubnetRequiredForNatPool',
                          result['NeutronError']['type'])
+
+    def _create_nat_pool_nsp_ptg(self, sub):
+        routes = [{'destination': '0.0.0.0/0', 'nexthop': None}]
+        es = self.create_external_segment(
+            name="default", subnet_id=sub['subnet']['id'],
+            external_routes=routes,
+            expected_res_status=webob.exc.HTTPCreated.code)['external_segment']
+        self.create_nat_pool(
+            external_segment_id=es['id'], ip_version=4,
+            ip_pool='192.168.0.0/24',
+            expected_res_status=webob.exc.HTTPCreated.code)
+        nsp = self.create_network_service_policy(
+            network_service_params=[{"type": "ip_pool", "value": "nat_pool",
+                                     "name": "external_access"}],
+            expected_res_status=webob.exc.HTTPCreated.code)[
+                'network_service_policy']
+        return self.create_policy_target_group(
+            network_service_policy_id=nsp['id'],
+            expected_res_status=webob.exc.HTTPCreated.code)[
+                'policy_target_group']
+
+    def _get_pt_fip(self, pt_id):
+        fips = self._list('floatingips')['floatingips']
+        ctx = nctx.get_admin_context()
+        fip_id = (ctx.session.query(
+            resource_mapping.PolicyTargetFloatingIPMapping).
+            filter_by(policy_target_id=pt_id).one().floatingip_id)
+        return [x for x in fips if x['id'] == fip_id][0]
+
+    def test_fip_allocation_from_nat_pool(self):
+        with self.network(router__external=True) as net:
+            with self.subnet(cidr='192.168.0.0/24', network=net) as sub:
+                ptg = self._create_nat_pool_nsp_ptg(sub)
+                pt1 = self.create_policy_target(
+                    policy_target_group_id=ptg['id'])['policy_target']
+                pt2 = self.create_policy_target(
+                    policy_target_group_id=ptg['id'])['policy_target']
+                address1 = self._get_pt_fip(pt1['id'])['floating_ip_address']
+                address2 = self._get_pt_fip(pt2['id'])['floating_ip_address']
+                # Lowest free addresses first
+                self.assertEqual(netaddr.IPAddress(address1) + 1,
+                                 netaddr.IPAddress(address2))
+
+                # Released addresses are allocated again
+                self.delete_policy_target(pt1['id'], expected_res_status=204)
+                self.assertEqual(1, len(self._list('floatingips')[
+                    'floatingips']))
+                pt3 = self.create_policy_target(
+                    policy_target_group_id=ptg['id'])['policy_target']
+                self.assertEqual(
+                    address1,
+                    self._get_pt_fip(pt3['id'])['floating_ip_address'])
+
+    def test_fip_preallocation(self):
+        config.cfg.CONF.set_override('nat_pool_fip_prealloc', 2,
+                                     group='resource_mapping')
+        with self.network(router__external=True) as net:
+            with self.subnet(cidr='192.168.0.0/24', network=net) as sub:
+                ptg = self._create_nat_pool_nsp_ptg(sub)
+                pt1 = self.create_policy_target(
+                    policy_target_group_id=ptg['id'])['policy_target']
+                fips = self._list('floatingips')['floatingips']
+                self.assertEqual(3, len(fips))
+                self.assertEqual(1, len([x for x in fips if x['port_id']]))
+
+                # The spares are used first
+                pt2 = self.create_policy_target(
+                    policy_target_group_id=ptg['id'])['policy_target']
+                fips = self._list('floatingips')['floatingips']
+                self.assertEqual(3, len(fips))
+                self.assertEqual(2, len([x for x in fips if x['port_id']]))
+
+                # Released FIPs become spares again
+                fip = self._get_pt_fip(pt2['id'])
+                self.delete_policy_target(pt2['id'], expected_res_status=204)
+                fips = self._list('floatingips')['floatingips']
+                self.assertEqual(3, len(fips))
+                self.assertIsNone(
+                    [x for x in fips if x['id'] == fip['id']][0]['port_id'])
+                self.assertEqual(pt1['port_id'], self._get_pt_fip(
+                    pt1['id'])['port_id'])
+
+    def test_fip_spares_per_tenant(self):
+        config.cfg.CONF.set_override('nat_pool_fip_prealloc', 1,
+                                     group='resource_mapping')
+        driver = [x.obj for x in
+                  self._gbp_plugin.policy_driver_manager.ordered_policy_drivers
+                  if isinstance(x.obj, resource_mapping.ResourceMappingDriver)
+                  ][0]
+        session = self._context.session
+        with session.begin(subtransactions=True):
+            for fip_id, tenant_id, available in (('fip1', 'tenant1', True),
+                                                 ('fip2', 'tenant1', False),
+                                                 ('fip3', 'tenant2', False)):
+                session.add(resource_mapping.NATPoolFloatingIP(
+                    floatingip_id=fip_id, nat_pool_id='nat_pool',
+                    tenant_id=tenant_id, floating_ip_address=fip_id,
+                    available=available))
+        with mock.patch.object(driver, '_update_fip'):
+            with mock.patch.object(driver, '_delete_fip') as delete_fip:
+                driver._release_floating_ips(self._context, ['fip2', 'fip3'])
+
+        # tenant1 has its spare already, tenant2 gets one
+        delete_fip.assert_called_once_with(self._context, 'fip2')
+        self.assertTrue(session.query(
+            resource_mapping.NATPoolFloatingIP).filter_by(
+                floatingip_id='fip3').one().available)
+
+
+class TestIPBitmap(base.BaseTestCase):
+
+    def test_allocate(self):
+        bitmap = ip_bitmap.IPBitmap('10.0.0.0/29', ['10.0.0.0', '10.0.0.7',
+                                                    '10.1.0.1'])
+        self.assertEqual(6, bitmap.free)
+        self.assertEqual(['10.0.0.%s' % x for x in range(1, 7)],
+                         [bitmap.allocate() for x in range(6)])
+        self.assertIsNone(bitmap.allocate())
+
+        bitmap.release('10.0.0.4')
+        bitmap.release('10.0.0.2')
+        self.assertEqual(2, bitmap.free)
+        self.assertEqual('10.0.0.2', bitmap.allocate())
+        self.assertFalse(bitmap.reserve('10.0.0.3'))
+        self.assertTrue(bitmap.reserve('10.0.0.4'))
+        self.assertEqual(0, bitmap.free)
+
+    def test_big_pool(self):
+        bitmap = ip_bitmap.IPBitmap('2001:db8::/64', ['2001:db8::'])
+        self.assertEqual(ip_bitmap.MAX_SIZE - 1, bitmap.free)
+        self.assertEqual('2001:db8::1', bitmap.allocate())
+
+
+class TestCIDRIndex(base.BaseTestCase):
+
+    def test_overlaps(self):
+        index = ip_index.CIDRIndex(['10.0.0.0/24', '10.0.1.0/24',
+                                    '10.2.0.0/16', '10.0.0.128/25',
+                                    '2001:db8::/64'])
+        self.assertTrue(index.overlaps('10.0.0.0/8'))
+        self.assertTrue(index.overlaps('10.0.1.255'))
+        self.assertTrue(index.overlaps('10.2.3.0/24'))
+        self.assertFalse(index.overlaps('10.0.2.0/24'))
+        self.assertFalse(index.overlaps('10.1.0.0/16'))
+        self.assertFalse(index.overlaps('9.0.0.0/8'))
+        self.assertTrue(index.overlaps('2001:db8::1'))
+        self.assertFalse(index.overlaps('2001:db9::/64'))
+        # Versions are indexed separately
+        self.assertFalse(index.overlaps('::/0'))
+        self.assertTrue(index.overlaps_any(['9.0.0.0/8', '10.2.0.1']))
+        self.assertFalse(ip_index.CIDRIndex().overlaps('0.0.0.0/0'))
+
+    def test_contains(self):
+        index = ip_index.CIDRIndex(['10.0.0.0/24', '10.0.1.0/24',
+                                    '10.0.3.0/24'])
+        # Adjacent CIDRs are merged
+        self.assertTrue(index.contains('10.0.0.0/23'))
+        self.assertTrue(index.contains('10.0.1.1'))
+        self.assertFalse(index.contains('10.0.0.0/22'))
+        self.assertFalse(index.contains('10.0.2.1'))
+        self.assertFalse(index.contains('::1'))
@@ -186,6 +186,51 @@ class NodeCompositionPluginTestCase(
         self.assertEqual([spec_used['id']],
                          [x['id'] for x in ctx.relevant_specs])
 
+    def test_context_builder_shares_chain_resources(self):
+        plugin_context = n_context.get_admin_context()
+        profile = self.create_service_profile(
+            service_type="TYPE")['service_profile']
+        nodes = [self.create_servicechain_node(
+            service_profile_id=profile['id'],
+            config='{}')['servicechain_node'] for x in range(3)]
+        spec = self.create_servicechain_spec(
+            nodes=[x['id'] for x in nodes])['servicechain_spec']
+        provider = self.create_policy_target_group()['policy_target_group']
+        consumer = self.create_policy_target_group()['policy_target_group']
+        instance = self.create_servicechain_instance(
+            provider_ptg_id=provider['id'], consumer_ptg_id=consumer['id'],
+            servicechain_specs=[spec['id']])['servicechain_instance']
+
+        builder = ncp_context.ChainContextBuilder(self.plugin, plugin_context,
+                                                  instance)
+        with mock.patch.object(
+                self.plugin, 'get_servicechain_specs',
+                wraps=self.plugin.get_servicechain_specs) as get_specs:
+            with mock.patch.object(
+                    self.plugin, 'get_service_profiles',
+                    wraps=self.plugin.get_service_profiles) as get_profiles:
+                contexts = builder.get_node_driver_contexts(nodes)
+        self.assertEqual(1, get_specs.call_count)
+        self.assertEqual(1, get_profiles.call_count)
+        self.assertEqual(3, len(contexts))
+        for pos, node in enumerate(nodes, 1):
+            ctx = contexts[node['id']]
+            self.assertEqual(pos, ctx.current_position)
+            self.assertEqual(provider['id'], ctx.provider['id'])
+            self.assertEqual(consumer['id'], ctx.consumer['id'])
+            self.assertEqual(profile['id'], ctx.current_profile['id'])
+            self.assertEqual([spec['id']],
+                             [x['id'] for x in ctx.relevant_specs])
+            self.assertEqual(0, len(ctx.get_service_targets()))
+
+        # Drivers are scheduled only once per node and action
+        node_context = contexts[nodes[0]['id']]
+        with mock.patch.object(self.plugin.driver_manager,
+                               'schedule_update') as schedule:
+            builder.schedule(node_context, 'update')
+            builder.schedule(node_context, 'update')
+        self.assertEqual(1, schedule.call_count)
+
     def test_manager_initialized(self):
         mgr = self.plugin.driver_manager
         self.assertIsInstance(mgr.ordered_drivers[0].obj,
@@ -446,6 +491,34 @@ class NodeCompositionPluginTestCase(
         self.delete_policy_target(pt['id'])
         self.assertFalse(rem.called)
 
+    def test_unchained_ptg_update_not_scheduled(self):
+        other = self.create_policy_target_group()['policy_target_group']
+        with mock.patch.object(self.sc_plugin,
+                               '_get_scheduled_drivers') as scheduled:
+            pt = self.create_policy_target(
+                policy_target_group_id=other['id'])['policy_target']
+            self.delete_policy_target(pt['id'])
+        self.assertFalse(scheduled.called)
+
+    def test_instances_from_policy_target(self):
+        plugin_context = n_context.get_admin_context()
+        provider, consumer, _ = self._create_simple_service_chain()
+        other = self.create_policy_target_group()['policy_target_group']
+        instances = self.sc_plugin.get_servicechain_instances(plugin_context)
+        self.assertEqual(1, len(instances))
+
+        for ptg in [provider, consumer]:
+            result = self.sc_plugin._get_instances_from_policy_target(
+                plugin_context, {'policy_target_group_id': ptg['id']})
+            self.assertEqual(instances, result)
+        self.assertEqual([], self.sc_plugin._get_instances_from_policy_target(
+            plugin_context, {'policy_target_group_id': other['id']}))
+
+        # Other tenants don't see the instances
+        self.assertEqual([], self.sc_plugin._get_instances_from_policy_target(
+            n_context.Context('', 'another_tenant'),
+            {'policy_target_group_id': provider['id']}))
+
 
 class AgnosticChainPlumberTestCase(NodeCompositionPluginTestCase):
 
@@ -529,6 +602,24 @@ class AgnosticChainPlumberTestCase(NodeCompositionPluginTestCase):
             targets[0].policy_target_id)['policy_target']
         self.assertEqual(test_name, pt['name'])
 
+    def test_multiple_nodes_targets_stored_at_once(self):
+        context = n_context.get_admin_context()
+        self.driver.get_plumbing_info.return_value = {'provider': [{}],
+                                                      'consumer': [{}]}
+        with mock.patch.object(
+                model, 'set_service_targets',
+                wraps=model.set_service_targets) as set_targets:
+            provider, _, _ = self._create_simple_service_chain(3)
+        self.assertEqual(1, set_targets.call_count)
+
+        targets = model.get_service_targets(context.session)
+        self.assertEqual(6, len(targets))
+        self.assertEqual(set([1, 2, 3]), set(x.position for x in targets))
+
+        self.update_policy_target_group(
+            provider['id'], provided_policy_rule_sets={})
+        self.assertEqual(0, len(model.get_service_targets(context.session)))
+
     def test_ptg_delete(self):
         self.driver.get_plumbing_info.return_value = {'provider': [{}],
                                                       'consumer': [{}]}
@@ -0,0 +1,168 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import eventlet
+import mock
+from neutron.tests import base
+from oslo_config import cfg
+
+from gbpservice.neutron.services.servicechain.plugins.msc.drivers import (
+    oneconvergence_servicechain_driver as oc_driver)
+
+
+class TestServiceInsertionQueue(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestServiceInsertionQueue, self).setUp()
+        cfg.CONF.set_override('insertion_workers', 2,
+                              group='oneconvergence_servicechain')
+        cfg.CONF.set_override('stack_poll_interval', 0,
+                              group='oneconvergence_servicechain')
+        self.driver = oc_driver.OneconvergenceServiceChainDriver()
+        self.set_status = mock.patch.object(
+            self.driver, '_set_chain_insertion_status').start()
+        self.update_status = mock.patch.object(
+            self.driver, '_update_chain_insertion_status').start()
+        self.insert = mock.patch.object(
+            self.driver, '_perform_service_insertion').start()
+
+    def _pending(self, instance_id):
+        return oc_driver.PendingServiceChainInsertions(
+            mock.Mock(), [], instance_id, 'provider', 'consumer', 'cls')
+
+    def _drain(self):
+        for x in range(10):
+            eventlet.sleep(0)
+
+    def test_superseded_insertion_skipped(self):
+        self.insert.return_value = True
+        first = self._pending('sci1')
+        second = self._pending('sci1')
+        other = self._pending('sci2')
+        self.driver._enqueue_chain_insertion(first)
+        self.driver._enqueue_chain_insertion(second)
+        self.driver._enqueue_chain_insertion(other)
+        self.assertEqual(2, self.driver.get_insertion_stats()['queue_depth'])
+        self._drain()
+
+        self.assertEqual([mock.call(second), mock.call(other)],
+                         self.insert.call_args_list)
+        stats = self.driver.get_insertion_stats()
+        self.assertEqual(0, stats['queue_depth'])
+        self.assertEqual(2, stats['processed'])
+        self.assertEqual(1, stats['superseded'])
+        self.update_status.assert_any_call(mock.ANY, 'sci1',
+                                           self.driver.INSERTION_ACTIVE, None)
+
+    def test_insertion_polled_until_stacks_complete(self):
+        self.insert.side_effect = [False, False, True]
+        self.driver._enqueue_chain_insertion(self._pending('sci1'))
+        self._drain()
+
+        self.assertEqual(3, self.insert.call_count)
+        self.assertEqual(1, self.driver.get_insertion_stats()['processed'])
+
+    def test_failed_insertion_status(self):
+        self.insert.side_effect = Exception('boom')
+        self.driver._enqueue_chain_insertion(self._pending('sci1'))
+        self._drain()
+
+        self.assertEqual(1, self.driver.get_insertion_stats()['failed'])
+        self.update_status.assert_called_with(mock.ANY, 'sci1',
+                                              self.driver.INSERTION_ERROR,
+                                              'boom')
+
+    def test_stale_requeue_dropped(self):
+        # The stacks of the first insertion are still being created when the
+        # instance is updated, and the second insertion completes first
+        mock.patch.object(oc_driver.eventlet, 'spawn_after').start()
+        self.insert.side_effect = [False, True]
+        first = self._pending('sci1')
+        self.driver._enqueue_chain_insertion(first)
+        self._drain()
+        second = self._pending('sci1')
+        self.driver._enqueue_chain_insertion(second)
+        self._drain()
+        self.driver._requeue_chain_insertion(first)
+        self._drain()
+
+        self.assertEqual([mock.call(first), mock.call(second)],
+                         self.insert.call_args_list)
+        self.assertEqual(1, self.driver.get_insertion_stats()['superseded'])
+        self.update_status.assert_called_once_with(
+            mock.ANY, 'sci1', self.driver.INSERTION_ACTIVE, None)
+
+    def test_deleted_instance_not_processed(self):
+        mock.patch.object(oc_driver.eventlet, 'spawn_after').start()
+        self.insert.return_value = False
+        pending = self._pending('sci1')
+        self.driver._enqueue_chain_insertion(pending)
+        self._drain()
+        for method in ('_delete_chain_insertion_status', 'delete_nvsd_policy',
+                       '_delete_chain_policy_map', 'delete_nvsd_ep'):
+            mock.patch.object(self.driver, method).start()
+        mock.patch.object(oc_driver.simplechain_driver.SimpleChainDriver,
+                          'delete_servicechain_instance_postcommit').start()
+        self.driver.delete_servicechain_instance_postcommit(
+            mock.Mock(current={'id': 'sci1'}))
+        self.driver._requeue_chain_insertion(pending)
+        self._drain()
+
+        self.assertEqual(1, self.insert.call_count)
+        self.assertEqual(0, self.driver.get_insertion_stats()['queue_depth'])
+        self.assertFalse(self.update_status.called)
+
+
+class TestLBServicePort(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestLBServicePort, self).setUp()
+        for opt, value in (('service_controller_ip', '127.0.0.1'),
+                           ('service_controller_port', '8082'),
+                           ('request_timeout', '5')):
+            cfg.CONF.set_override(opt, value, 'NVSD_SERVICE_CONTROLLER')
+        self.context = mock.Mock(current={'id': 'sci1', 'name': 'chain',
+                                          'tenant_id': 'tenant'})
+        self.context._plugin_context = mock.Mock(tenant='tenant', user='user',
+                                                 tenant_id='tenant',
+                                                 is_admin=False)
+
+    def _create_lb_service_port(self):
+        driver = oc_driver.OneconvergenceServiceChainDriver()
+        mock.patch.object(driver, '_get_ptg',
+                          return_value={'subnets': ['subnet'],
+                                        'l2_policy_id': 'l2p'}).start()
+        mock.patch.object(driver, '_get_l2p',
+                          return_value={'network_id': 'net'}).start()
+        mock.patch.object(driver, '_create_port',
+                          return_value={'id': 'port'}).start()
+        add_map = mock.patch.object(driver,
+                                    '_add_chain_nvsd_vip_ep_map').start()
+        controller = driver.nvsd_api.nvsd_service_controller
+        do_request = mock.patch.object(controller, 'do_request').start()
+        do_request.return_value = mock.Mock(status_code=201)
+        do_request.return_value.json.return_value = {'id': 'ep'}
+
+        self.assertEqual('port',
+                         driver._create_lb_service_port(self.context, 'ptg'))
+        self.assertEqual('POST', do_request.call_args[0][0])
+        add_map.assert_called_once_with(mock.ANY, 'sci1', 'ep', 'port')
+
+    def test_create_lb_service_port(self):
+        self._create_lb_service_port()
+
+    def test_create_lb_service_port_async_dispatch(self):
+        # The endpoint ID is needed, the request can't be sent in background
+        cfg.CONF.set_override('async_dispatch', True,
+                              'NVSD_SERVICE_CONTROLLER')
+        self._create_lb_service_port()